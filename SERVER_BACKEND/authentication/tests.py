@@ -845,3 +845,36 @@ class ConfirmChangeForgottenPasswordViewTests(TestCase):
         self.assertTrue(other_user.check_password("OtherOldStrongPassword123!!"))
 
 
+
+
+# The same tests against the async views of the ASGI mode (settings.ASYNC_VIEWS, see car_notes_api/urls_async.py)
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncRegistrationWithActivationEmailTests(RegistrationWithActivationEmailTests):
+    """
+    RegistrationWithActivationEmailTests against AsyncRegisterWithSendingEmailView.
+    """
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncSessionAuthTests(SessionAuthTests):
+    """
+    SessionAuthTests against AsyncLoginView and AsyncLogoutView.
+    """
+
+    def test_is_authenticated(self):
+        """
+        Test that the check view returns the logged in user, and 401 after the logout
+        """
+        self.client.post(
+            reverse('login'),
+            data=json.dumps({'email': self.email, 'password': self.password}),
+            content_type='application/json')
+
+        response = self.client.get(reverse('is_authenticated'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["username"], self.username)
+
+        self.client.post(reverse('logout'))
+        response = self.client.get(reverse('is_authenticated'))
+        self.assertEqual(response.status_code, 401)
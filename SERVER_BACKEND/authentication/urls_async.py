@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .views_async import AsyncCheckAuthenticatedView, AsyncRegisterWithSendingEmailView, AsyncLoginView, AsyncLogoutView
+
+# Async versions of the auth endpoints of urls.py (same paths and names), used in the ASGI mode (see car_notes_api/urls_async.py).
+urlpatterns = [
+    path("is_authenticated/", AsyncCheckAuthenticatedView.as_view(), name="is_authenticated"),
+    path("register/", AsyncRegisterWithSendingEmailView.as_view(), name="register"),
+    path("login/", AsyncLoginView.as_view(), name="login"),
+    path("logout/", AsyncLogoutView.as_view(), name="logout"),
+]
@@ -101,6 +101,38 @@ class CheckAuthenticatedView(APIView):
 #         return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
 
 
+def send_account_activation_email(user):
+    """
+    Generates uid and a token and create the activation link using these values. 
+    Then an email is sent to the user with this activation link.
+    """
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    # token = account_activation_token.make_token(user)
+    token = generated_token.make_token(user)
+
+    # current_site = get_current_site(request)
+    # activation_link = f"{current_site}/activate/{uid}/{token}/" # if we also use Django for the frontend
+    activation_link = f"{FRONTEND_URL}/activate/{uid}/{token}/"
+
+    # send_mail(
+    #     subject="Activate Your Account",
+    #     message=f"Dear {user.username}, activate your account by clicking here: {activation_link}. If you want to receive a new link, register again with the same email but with a different username. Your data (id, username, password), will not change.",            
+    #     recipient_list=[user.email],
+    #     from_email=os.environ["EMAIL_FROM"]
+    # )
+
+    mail_subject = 'Activate your user account.'
+    message = render_to_string(template_name="authentication/template_activate_account.html", context={
+        'username': user.username,
+        'activation_link': activation_link,
+    })
+
+    email = EmailMessage(mail_subject, message, to=[user.email])
+    email.content_subtype = "html" # to render html tags in the template. Without this, the html tags will be shown as strings. 
+
+    email.send()
+
+
 @method_decorator(csrf_protect, name="dispatch")
 class RegisterWithSendingEmailView(APIView):
     """View to register a new user with email, username, password and password confirmation."""
@@ -108,34 +140,9 @@ class RegisterWithSendingEmailView(APIView):
 
     def __send_account_activation_email(self, user):
         """
-        Private method, which generates uid and a token and create the activation link using these values. 
-        Then an email is sent to the user with this activation link.
+        Private method, which sends the account activation email to the user (see send_account_activation_email).
         """
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-        # token = account_activation_token.make_token(user)
-        token = generated_token.make_token(user)
-
-        # current_site = get_current_site(request)
-        # activation_link = f"{current_site}/activate/{uid}/{token}/" # if we also use Django for the frontend
-        activation_link = f"{FRONTEND_URL}/activate/{uid}/{token}/"
-
-        # send_mail(
-        #     subject="Activate Your Account",
-        #     message=f"Dear {user.username}, activate your account by clicking here: {activation_link}. If you want to receive a new link, register again with the same email but with a different username. Your data (id, username, password), will not change.",            
-        #     recipient_list=[user.email],
-        #     from_email=os.environ["EMAIL_FROM"]
-        # )
-
-        mail_subject = 'Activate your user account.'
-        message = render_to_string(template_name="authentication/template_activate_account.html", context={
-            'username': user.username,
-            'activation_link': activation_link,
-        })
-
-        email = EmailMessage(mail_subject, message, to=[user.email])
-        email.content_subtype = "html" # to render html tags in the template. Without this, the html tags will be shown as strings. 
-
-        email.send()
+        send_account_activation_email(user)
 
     def post(self, request):
         """Method which runs when the user submits a POST request to register a new user with username and password"""
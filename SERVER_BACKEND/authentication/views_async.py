@@ -0,0 +1,127 @@
+from asgiref.sync import sync_to_async
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.db.models import prefetch_related_objects
+from django.views.decorators.csrf import csrf_protect
+from rest_framework import permissions
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.asyncApiView import AsyncAPIView, async_method_decorator
+from .serlalizers import GetUserSerializer, RegisterSerializer, LoginSerializer
+from .views import send_account_activation_email
+
+User = get_user_model()
+
+# ASYNC VIEWS (ASGI mode, see settings.ASYNC_VIEWS and car_notes_api/urls_async.py)
+# Same endpoints and responses as the views of views.py, with coroutine handlers (see utils/asyncApiView.py).
+# The activation email of the registration is sent in a thread of its own (thread_sensitive=False):
+# a slow SMTP server delays only that response, it blocks neither the event loop
+# nor the thread which runs the database queries of the other requests.
+
+
+async def serialize_user(user):
+    """
+    Return GetUserSerializer(user).data. The many-to-many fields (groups, user_permissions)
+    are loaded first, so that the serializer does not query the database on the event loop.
+    """
+    await sync_to_async(prefetch_related_objects)([user], "groups", "user_permissions")
+    return GetUserSerializer(user).data
+
+
+@async_method_decorator(csrf_protect, name="dispatch")
+class AsyncCheckAuthenticatedView(AsyncAPIView):
+    """
+    Async view to check if the current user is authenticated or not.
+    """
+
+    async def get(self, request):
+        """Method which runs when the user submits a GET request to check if the current user is authenticated or not"""
+        if bool(request.user and request.user.is_authenticated):
+            return Response({"user": await serialize_user(request.user)}, status=status.HTTP_200_OK)
+
+        return Response(status=status.HTTP_401_UNAUTHORIZED)
+
+
+@async_method_decorator(csrf_protect, name="dispatch")
+class AsyncLoginView(AsyncAPIView):
+    """Async view to log in a user with username and password"""
+
+    permission_classes = (permissions.AllowAny,)
+
+    async def post(self, request):
+        """Method which runs when the user submits a POST request to log in."""
+        context={"request": request}
+
+        serializer=LoginSerializer(data=request.data, context=context)
+
+        if serializer.is_valid():
+
+            email=serializer.validated_data["email"]
+            password=serializer.validated_data["password"]
+
+            # authenticate with email and password (see backends.py)
+            user = await auth.aauthenticate(username=email, password=password)
+
+            # Some possible reasons for error: wrong username or password or the user is inactive.
+            if user is None:
+                return Response({"detail": "Could not log in."}, status=status.HTTP_400_BAD_REQUEST)
+
+            await auth.alogin(request, user)
+            return Response({"user": await serialize_user(user)}, status=status.HTTP_200_OK)
+
+        return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncLogoutView(AsyncAPIView):
+    """Async view to log a user out."""
+    permission_classes=[permissions.IsAuthenticated]
+
+    async def post(self, request):
+        """Method which runs when the user submits a POST request to log out."""
+        await auth.alogout(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@async_method_decorator(csrf_protect, name="dispatch")
+class AsyncRegisterWithSendingEmailView(AsyncAPIView):
+    """Async view to register a new user with email, username, password and password confirmation."""
+    permission_classes=(permissions.AllowAny,)
+
+    async def __send_account_activation_email(self, user):
+        """
+        Private method which sends the activation email (see views.send_account_activation_email)
+        in a separate thread, without blocking the other requests.
+        """
+        await sync_to_async(send_account_activation_email, thread_sensitive=False)(user)
+
+    async def post(self, request):
+        """Method which runs when the user submits a POST request to register a new user with username and password"""
+
+        serializer=RegisterSerializer(data=request.data)
+
+        # the unique validators of the username / email fields query the database
+        if await sync_to_async(serializer.is_valid)():
+            validated_data = serializer.validated_data
+            email=validated_data["email"]
+            password=validated_data["password"]
+            username=validated_data["username"]
+
+            # If a user with the given email already exists, send the email again
+            # without changing the other user information (id, username, password).
+            user_with_email = await User.objects.filter(email=email).afirst()
+            if user_with_email:
+                await self.__send_account_activation_email(user_with_email)
+                return Response(f"Please check your email to activate your account.", status=status.HTTP_201_CREATED)
+
+            # Create the (inactive) user with the given email, username, password.
+            # The password hashing is slow on purpose, it runs in a thread.
+            user = await sync_to_async(User.objects.create_user)(
+                email=email, username=username, password=password, is_active=False
+            )
+
+            await self.__send_account_activation_email(user)
+
+            return Response(f"Please check your email to activate your account.", status=status.HTTP_201_CREATED)
+
+        return Response({"detail": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -97,11 +97,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware', # add CorsMiddleware
+    'utils.compressionMiddleware.CompressionMiddleware', # gzip compression of the responses (must be before the middlewares which change the response body)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.replicaRouter.ReadReplicaMiddleware', # reads of the safe requests from the read replicas (must be after AuthenticationMiddleware)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -111,7 +113,14 @@ AUTH_USER_MODEL = 'authentication.CustomUser'
 AUTHENTICATION_BACKENDS = ['authentication.backends.EmailOrUsernameBackend']
 
 
-ROOT_URLCONF = 'car_notes_api.urls'
+# ASYNC VIEWS (ASGI MODE)
+# Set the environment variable ASYNC_VIEWS=True when the app runs under an ASGI server (see the Dockerfile, SERVER_MODE=asgi):
+# the car list / detail views and the auth check / register / login / logout views are then served by their
+# async versions (see car_notes_api/urls_async.py), the other endpoints stay the same.
+# Under gunicorn's WSGI workers (the default) keep the sync views, they are faster there.
+ASYNC_VIEWS = os.environ.get("ASYNC_VIEWS", "False") == "True"
+
+ROOT_URLCONF = 'car_notes_api.urls_async' if ASYNC_VIEWS else 'car_notes_api.urls'
 
 TEMPLATES = [
     {
@@ -130,6 +139,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'car_notes_api.wsgi.application'
+ASGI_APPLICATION = 'car_notes_api.asgi.application'
 
 
 # Database
@@ -139,20 +149,119 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # PERSISTENT CONNECTIONS
+        # Every worker keeps its database connection open between the requests (up to DATABASE_CONN_MAX_AGE seconds),
+        # instead of opening a new connection (and running the SQLite pragmas) for every request.
+        # A connection which became unusable is replaced at the start of the next request (CONN_HEALTH_CHECKS).
+        # In the ASGI mode the sync database code runs in changing threads, and every thread would keep
+        # a connection of its own, so the connections are closed after every request there.
+        'CONN_MAX_AGE': 0 if ASYNC_VIEWS else int(os.environ.get("DATABASE_CONN_MAX_AGE", 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
-# change default django database to postgresql (this requires to install psycopg2: pip3 install psycopg2)
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.environ["DATABASE_NAME"],
-#         'HOST': os.environ["DATABASE_HOST"],
-#         'USER': os.environ["DATABASE_USER"],
-#         'PASSWORD': os.environ["DATABASE_PASSWORD"],
-#         'PORT': os.environ["DATABASE_PORT"],
-#     }
-# }
+# POSTGRESQL
+# Set the environment variable DATABASE_ENGINE=postgresql to use PostgreSQL instead of SQLite
+# (requires psycopg, see requirements.txt). The connection is read from the environment variables
+# DATABASE_NAME, DATABASE_HOST, DATABASE_PORT, DATABASE_USER and DATABASE_PASSWORD.
+# - POOLED CONNECTIONS: every worker keeps its connection open between the requests (CONN_MAX_AGE, see above),
+#   so a request does not pay for a new PostgreSQL connection (a new server process). With many workers,
+#   or in the ASGI mode (one connection per request), put PgBouncer between the workers and PostgreSQL
+#   and point DATABASE_HOST / DATABASE_PORT to it.
+# - SERVER-SIDE CURSORS: the streaming admin list (cars/streaming.py) reads the cars with queryset.iterator(),
+#   which uses a server-side cursor on PostgreSQL: the rows are fetched chunk by chunk instead of all at once.
+#   PgBouncer in TRANSACTION pooling mode cannot keep a cursor between two transactions:
+#   set DATABASE_PGBOUNCER_TRANSACTION_POOLING=True there (the cursors are then client-side).
+# - TRIGRAM INDEXES: the brand / model / motor "icontains" filters use GIN indexes of the pg_trgm extension,
+#   created after "migrate" (see cars/search.py).
+# The car shards are the databases <DATABASE_NAME>_cars_shard_<n> of the same server (create them first).
+# Compare both databases with: python3 manage.py benchmark_database_backends
+DATABASE_ENGINE = os.environ.get("DATABASE_ENGINE", "sqlite")
+
+if DATABASE_ENGINE == "postgresql":
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get("DATABASE_NAME", "car_notes"),
+        'HOST': os.environ.get("DATABASE_HOST", "localhost"),
+        'PORT': os.environ.get("DATABASE_PORT", "5432"),
+        'USER': os.environ.get("DATABASE_USER", "postgres"),
+        'PASSWORD': os.environ.get("DATABASE_PASSWORD", ""),
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get("DATABASE_PGBOUNCER_TRANSACTION_POOLING", "False") == "True",
+        'OPTIONS': {
+            # fail fast when the server is not reachable, instead of blocking a worker
+            'connect_timeout': int(os.environ.get("DATABASE_CONNECT_TIMEOUT", 5)),
+        },
+    }
+
+# CAR SHARDS (see cars/sharding.py)
+# The cars of every user are stored on one of CAR_SHARD_COUNT databases, chosen by a hash of the user id.
+# The first shard is the primary database ("default"), the others are SQLite files db_cars_shard_<n>.sqlite3
+# (PostgreSQL: the databases <DATABASE_NAME>_cars_shard_<n>)
+# (migrate each of them: python3 manage.py migrate --database=cars_shard_1). Set the environment variable
+# CAR_SHARD_COUNT to use more than one shard. (The sharding tests declare a second shard themselves, see cars/tests.py.)
+CAR_SHARD_COUNT = int(os.environ.get("CAR_SHARD_COUNT", 1))
+CAR_SHARD_DATABASES = [f'cars_shard_{number}' for number in range(1, CAR_SHARD_COUNT)]
+CAR_SHARDS = ['default', *CAR_SHARD_DATABASES]
+
+for alias in CAR_SHARD_DATABASES:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': f"{DATABASES['default']['NAME']}_{alias}" if DATABASE_ENGINE == "postgresql" else BASE_DIR / f'db_{alias}.sqlite3',
+    }
+
+# READ REPLICAS (see utils/replicaRouter.py)
+# The reads of the GET requests of DATABASE_REPLICA_PATHS (car lists, filter options, suggestions, auth check)
+# go to a replica, everything else to the primary ("default"). After a write, the user reads from the primary
+# for DATABASE_REPLICA_STICKY_SECONDS (read-your-writes). The sticky marks are stored in the cache
+# DATABASE_REPLICA_CACHE_ALIAS, which must be shared by all the workers (Redis, see CACHES below).
+# Local testing: set the environment variable DATABASE_REPLICA=True, and keep the replica file in sync
+# with "python3 manage.py sync_sqlite_replicas --interval 1" (SQLite online backup API).
+DATABASE_REPLICA = os.environ.get("DATABASE_REPLICA", "False") == "True"
+DATABASE_REPLICAS = []
+
+if DATABASE_REPLICA:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ.get(
+            "DATABASE_REPLICA_NAME",
+            DATABASES['default']['NAME'] if DATABASE_ENGINE == "postgresql" else BASE_DIR / 'db_replica.sqlite3',
+        ),
+        # PostgreSQL: the hot standby server (streaming replication)
+        'HOST': os.environ.get("DATABASE_REPLICA_HOST", DATABASES['default'].get('HOST', '')),
+        # the tests use the test database of the primary
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+# the shard router decides first for the cars (see cars/sharding.py)
+DATABASE_ROUTERS = ['cars.sharding.CarShardRouter', 'utils.replicaRouter.ReadReplicaRouter']
+DATABASE_REPLICA_PATHS = ("/api/cars/", "/api/auth/is_authenticated/")
+DATABASE_REPLICA_STICKY_SECONDS = 10
+DATABASE_REPLICA_CACHE_ALIAS = "default"
+
+# SQLITE TUNING (see utils/sqliteTuning.py)
+# Pragmas run on every new SQLite connection: WAL journal (readers and the writer don't block each other),
+# no fsync on every commit (synchronous=NORMAL, safe with WAL), bigger page cache, memory mapped reads,
+# temporary data in memory, and up to 5 seconds of waiting when another worker is writing.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,  # KiB (20 MB)
+    "mmap_size": 128 * 1024 * 1024,  # bytes (128 MB)
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,  # milliseconds
+}
+
+# Write transactions (create / update / delete of cars) which fail with "database is locked"
+# are rolled back and run again up to DATABASE_LOCKED_RETRIES times, after a growing random delay
+# (starting at DATABASE_LOCKED_RETRY_DELAY seconds, at most DATABASE_LOCKED_RETRY_MAX_DELAY seconds).
+DATABASE_LOCKED_RETRIES = 5
+# databases whose writes are in the retried transaction (the primary and the car shards)
+DATABASE_LOCKED_RETRY_DATABASES = CAR_SHARDS
+DATABASE_LOCKED_RETRY_DELAY = 0.05
+DATABASE_LOCKED_RETRY_MAX_DELAY = 1.0
 
 
 
@@ -223,6 +332,32 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 #     # "EXCEPTION_HANDLER": "utils.customExceptionHandler.custom_exception_handler"
 # }
 
+# RESPONSE COMPRESSION SETTINGS (see utils/compressionMiddleware.py)
+
+COMPRESSION_MIN_SIZE = 1024 # bytes, smaller responses are sent uncompressed
+COMPRESSION_CONTENT_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/plain",
+)
+COMPRESSION_EXCLUDED_PATHS = ("/api/auth/",) # small responses, compressing them only costs CPU
+
+# JSON rendering / parsing with orjson (if installed, else the stdlib json module). See utils/fastJson.py.
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        "utils.fastJson.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "utils.fastJson.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+}
+
 # EMAIL SETTINGS
 
 EMAIL_BACKEND = os.environ["EMAIL_BACKEND"] 
@@ -235,6 +370,43 @@ EMAIL_FROM = os.environ["EMAIL_FROM"]
 PASSWORD_RESET_TIMEOUT = 14400 # PASSWORD_RESET_TIMOUT sts how long the link sent to an email will be valid. Here it is 14400 seconds = 4hours.
 
 
+# CAR NOTES CACHE SETTINGS
+
+# Cache used for the per-user versioned caching of the car notes (pagination counts, list pages, car details). See cars/caching.py.
+# Without a CACHES setting, Django uses the local-memory cache (one cache per process).
+# With several gunicorn workers use a shared cache (Redis, see below), so that all workers see the invalidations.
+CARS_CACHE_ALIAS = "default"
+CARS_CACHE_TIMEOUT = 60 * 60 # cached values expire after 1 hour
+
+# CAR NOTES BULK SETTINGS
+
+# Bulk endpoint (/api/cars/bulk/). See cars/bulk.py.
+CARS_BULK_BATCH_SIZE = 500 # cars inserted per INSERT statement
+CARS_BULK_MAX_ITEMS = 5000 # maximum number of cars per request
+
+# CAR NOTES SUGGESTIONS SETTINGS
+
+# Autocomplete endpoint (/api/cars/suggest/). See cars/suggest.py.
+CARS_SUGGEST_LIMIT = 10 # suggestions returned by default
+CARS_SUGGEST_MAX_LIMIT = 50 # maximum value of ?limit=
+CARS_SUGGEST_USERS_CACHE_SIZE = 1024 # users whose suggestions are kept in memory by every worker process
+
+# CAR NOTES ARCHIVE SETTINGS
+
+# Hot / cold storage of the car notes. See cars/archive.py.
+# Run "python3 manage.py archive_cars" periodically (e.g. once a night, from cron):
+# it moves the cars not updated for CARS_ARCHIVE_AFTER_DAYS days to the archive table.
+CARS_ARCHIVE_AFTER_DAYS = int(os.environ.get("CARS_ARCHIVE_AFTER_DAYS", 365))
+CARS_ARCHIVE_BATCH_SIZE = 1000 # cars moved per transaction
+
+# CAR NOTES SOFT DELETE SETTINGS
+
+# Deleting a car only marks it as deleted, it can be restored during CARS_UNDO_DELETE_SECONDS. See cars/deletion.py.
+# Run "python3 manage.py purge_deleted_cars" periodically (e.g. every 5 minutes, from cron):
+# it removes the deleted cars whose undo window is over.
+CARS_UNDO_DELETE_SECONDS = 15 * 60 # 15 minutes
+CARS_PURGE_BATCH_SIZE = 1000 # cars deleted per transaction
+
 # CACHING SETTINGS (HERE REDIS CACHE) # https://django-redis-cache.readthedocs.io/en/latest/advanced_configuration.html#password
 
 
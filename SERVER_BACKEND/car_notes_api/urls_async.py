@@ -0,0 +1,14 @@
+"""
+URL configuration of the ASGI mode (settings.ASYNC_VIEWS = True).
+
+The car and auth endpoints which have an async version (cars/urls_async.py, authentication/urls_async.py)
+are matched first, all the other URLs are the same as in urls.py.
+"""
+from django.urls import path, include
+
+from .urls import urlpatterns as sync_urlpatterns, handler500
+
+urlpatterns = [
+    path("api/cars/", include("cars.urls_async")),
+    path("api/auth/", include("authentication.urls_async")),
+] + sync_urlpatterns
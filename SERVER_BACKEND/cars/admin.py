@@ -2,4 +2,10 @@ from django.contrib import admin
 from .models import Car
 
 # Register your models here.
-admin.site.register(Car)
+
+class CarAdmin(admin.ModelAdmin):
+    # the brand / motor references and the shadow columns are set by Car.save() from the strings,
+    # deletedAt is set by the soft delete (see deletion.py)
+    exclude = ["brandRef", "motorRef", "brandFolded", "modelFolded", "motorFolded", "deletedAt"]
+
+admin.site.register(Car, CarAdmin)
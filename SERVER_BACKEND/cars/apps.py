@@ -1,6 +1,35 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+def create_car_search_index(using, **kwargs):
+    """
+    Create (or repair) the full-text search index of the cars after every "migrate".
+    """
+    from .search import create_search_index
+    create_search_index(using=using)
+
+
+def seed_car_shard_id_sequence(using, **kwargs):
+    """
+    Start the car ids of the shard "using" at the first id of the shard after every "migrate" (see sharding.py).
+    """
+    from .sharding import seed_car_id_sequence
+    seed_car_id_sequence(using)
 
 
 class CarsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cars'
+
+    def ready(self):
+        post_migrate.connect(create_car_search_index, sender=self)
+        post_migrate.connect(seed_car_shard_id_sequence, sender=self)
+
+        # WAL mode and the other pragmas on every new SQLite connection (see utils/sqliteTuning.py)
+        from utils.sqliteTuning import configure_sqlite_connection
+        connection_created.connect(configure_sqlite_connection)
+
+        # connect the signal receivers (cache invalidation)
+        from . import signals
@@ -0,0 +1,152 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Car, ArchivedCar
+from .signals import invalidate_user_cars_cache
+from .sharding import car_shard_for_user
+
+# Hot / cold storage of the car notes.
+#
+# The users mostly look at their newest notes, but every list query and count of a user reads the whole history
+# of the user in cars_car. The cars which were not updated for CARS_ARCHIVE_AFTER_DAYS days are moved
+# (by the "archive_cars" management command, run periodically) to the archive table (ArchivedCar, see models.py),
+# so the cars_car table and its indexes only hold the active (hot) notes.
+#
+# - The default list, count and filter queries only read the hot table.
+# - ?include_archived=1 lists the hot cars FOLLOWED by the archived cars (both ordered by createdAt).
+#   The archive is read lazily: only by the pages which reach past the last hot car (see pagination.py).
+# - The detail of an archived car is read from the archive. Updating or deleting an archived car
+#   (detail and bulk endpoints) first moves it back to the hot table (restore_archived_cars): it is active again.
+#
+# A car keeps its id in the archive. The cars are moved with "INSERT INTO ... SELECT" + DELETE in one transaction
+# per batch of CARS_ARCHIVE_BATCH_SIZE cars, so the job never holds the (SQLite) write lock for long.
+# Archived cars still exist: they keep their counts in the materialized filter options (see filter_options.py).
+
+# cars not updated for this many days are archived
+CARS_ARCHIVE_AFTER_DAYS = getattr(settings, "CARS_ARCHIVE_AFTER_DAYS", 365)
+
+# number of cars moved per transaction
+CARS_ARCHIVE_BATCH_SIZE = getattr(settings, "CARS_ARCHIVE_BATCH_SIZE", 1000)
+
+INCLUDE_ARCHIVED_QUERY_PARAM = "include_archived"
+
+
+def include_archived(params):
+    """
+    True if the query parameters ask for the archived cars as well (?include_archived=1 or ?include_archived=true).
+    """
+    return params.get(INCLUDE_ARCHIVED_QUERY_PARAM, "").lower() in ("1", "true")
+
+
+def archive_cutoff(days=None):
+    """
+    Return the datetime before which the cars (their last update) are archived.
+    """
+    return timezone.now() - timedelta(days=CARS_ARCHIVE_AFTER_DAYS if days is None else days)
+
+
+def _move_cars(source_model, target_model, ids, using, **extra_columns):
+    """
+    Copy the rows with the given ids from the table of source_model to the table of target_model
+    (one "INSERT INTO target (...) SELECT ... FROM source" statement), then delete them from the source.
+    The columns of Car which the archive also has are copied (not deletedAt: soft deleted cars are never archived,
+    see deletion.py). extra_columns: {column: value} of the target only (e.g. archivedAt).
+    """
+    connection = connections[using]
+    quote_name = connection.ops.quote_name
+
+    archived_columns = {field.column for field in ArchivedCar._meta.concrete_fields}
+    columns = ", ".join(
+        quote_name(field.column) for field in Car._meta.concrete_fields if field.column in archived_columns
+    )
+    target_columns = "".join(f", {quote_name(column)}" for column in extra_columns)
+    placeholders = ", ".join(["%s"] * len(ids))
+
+    source_table = quote_name(source_model._meta.db_table)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote_name(target_model._meta.db_table)} ({columns}{target_columns}) "
+            f"SELECT {columns}{', %s' * len(extra_columns)} FROM {source_table} "
+            f"WHERE {quote_name('id')} IN ({placeholders})",
+            [*extra_columns.values(), *ids],
+        )
+
+        # no other table references the cars, and the moved cars must not send the delete signals
+        # (they still exist): delete the rows directly (the search index is updated by its triggers, see search.py)
+        cursor.execute(f"DELETE FROM {source_table} WHERE {quote_name('id')} IN ({placeholders})", ids)
+
+
+def archive_cars_batch(cutoff, batch_size=CARS_ARCHIVE_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Move at most batch_size cars of the database (shard) "using" which were not updated since cutoff
+    to the archive, in one transaction. Returns the number of archived cars.
+    """
+    with transaction.atomic(using=using):
+        # the oldest cars first (index on updatedAt, id), locked until the end of the transaction
+        # (on databases which support it), so a concurrent update is not lost
+        rows = list(
+            Car.objects
+            .using(using)
+            .select_for_update()
+            .filter(updatedAt__lt=cutoff)
+            .order_by("updatedAt", "id")
+            .values_list("id", "user_id")[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        archived_at = connections[using].ops.adapt_datetimefield_value(timezone.now())
+        _move_cars(Car, ArchivedCar, [car_id for car_id, user_id in rows], using, archivedAt=archived_at)
+
+        # the lists and counts of the users change (their cars are not hot anymore)
+        for user_id in {user_id for car_id, user_id in rows}:
+            invalidate_user_cars_cache(user_id, using=using)
+
+    return len(rows)
+
+
+def archive_cars(cutoff=None, batch_size=CARS_ARCHIVE_BATCH_SIZE, using=DEFAULT_DB_ALIAS, pause=0):
+    """
+    Archive all the cars of the database (shard) "using" which were not updated since cutoff
+    (default: CARS_ARCHIVE_AFTER_DAYS days ago), batch after batch (see archive_cars_batch).
+    pause: seconds to wait between two batches (lets the writes of the requests through).
+    Returns the number of archived cars.
+    """
+    cutoff = archive_cutoff() if cutoff is None else cutoff
+    total = 0
+
+    while True:
+        archived = archive_cars_batch(cutoff, batch_size=batch_size, using=using)
+        total += archived
+        if archived < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
+
+
+def restore_archived_cars(user_id, ids):
+    """
+    Move the archived cars of the user with the given ids back to the hot table (they keep their ids),
+    in one transaction on the shard of the user. Returns the ids of the restored cars.
+    """
+    shard = car_shard_for_user(user_id)
+
+    with transaction.atomic(using=shard):
+        restored_ids = list(
+            ArchivedCar.objects
+            .using(shard)
+            .select_for_update()
+            .filter(user_id=user_id, id__in=ids)
+            .values_list("id", flat=True)
+        )
+
+        if restored_ids:
+            _move_cars(ArchivedCar, Car, restored_ids, shard)
+            invalidate_user_cars_cache(user_id, using=shard)
+
+    return restored_ids
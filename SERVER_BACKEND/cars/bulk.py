@@ -0,0 +1,194 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Car, Brand, Motor, fold
+from .serializers import CreateUpdateCarSerializer
+from .signals import invalidate_user_cars_cache
+from .filter_options import apply_filter_option_changes
+from .sharding import car_shard_for_user
+from .archive import restore_archived_cars
+from .pagination import MAX_CAR_ID
+
+# Bulk operations on the car notes of a user (see CarBulkApiView in views_api_class_based_views.py).
+#
+# Importing many cars one "POST /api/cars/" at a time costs one request, one transaction
+# and one INSERT per car. The bulk endpoint validates all the cars of the request, then inserts
+# the valid ones with bulk_create (one INSERT per batch) inside ONE transaction.
+#
+# In the same way, updating / deleting a selection of cars costs (independent of the number of cars):
+# one SELECT of the matching cars (to know the ids which do not exist and the old brands / motors)
+# and one "UPDATE ... WHERE user_id = ? AND id IN (...)" (a delete only marks the cars as deleted, see deletion.py).
+#
+# Bulk operations do NOT send the post_save / post_delete signals, so the cache invalidation and the
+# filter options update (normally done in signals.py) are done here, once for the whole request.
+#
+# All the cars of a user are on the shard of the user (see sharding.py): every query and transaction runs there.
+
+# number of cars inserted per INSERT statement
+CARS_BULK_BATCH_SIZE = getattr(settings, "CARS_BULK_BATCH_SIZE", 500)
+
+# maximum number of cars accepted in one request
+CARS_BULK_MAX_ITEMS = getattr(settings, "CARS_BULK_MAX_ITEMS", 5000)
+
+
+def validate_bulk_items(items, context=None):
+    """
+    Validate (and sanitize) every item with CreateUpdateCarSerializer.
+    Invalid items do not stop the validation of the others.
+
+    Returns a (valid_items, errors) tuple:
+    - valid_items: list of (index, validated_data)
+    - errors: list of {"index": index, "detail": {field: [messages]}}
+    """
+    # the child of the list serializer is a CreateUpdateCarSerializer, reused for all the items
+    child = CreateUpdateCarSerializer(many=True, context=context or {}).child
+
+    valid_items = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            valid_items.append((index, child.run_validation(item)))
+        except ValidationError as exc:
+            errors.append({"index": index, "detail": exc.detail})
+
+    return valid_items, errors
+
+
+def bulk_create_cars(user, validated_items, batch_size=CARS_BULK_BATCH_SIZE):
+    """
+    Insert the validated cars for the user, batch_size cars per INSERT, in one transaction.
+    Returns the created cars (with their ids).
+    """
+    if not validated_items:
+        return []
+
+    cars = [Car(user=user, **validated_data) for validated_data in validated_items]
+    shard = car_shard_for_user(user.id)
+
+    with transaction.atomic(using=shard):
+        cars = Car.objects.db_manager(shard).bulk_create(cars, batch_size=batch_size)
+
+        invalidate_user_cars_cache(user.id, using=shard)
+        apply_filter_option_changes(added=[(car.brand, car.motor) for car in cars], using=shard)
+
+    return cars
+
+
+def parse_bulk_ids(ids):
+    """
+    Validate the list of car ids sent to the bulk update / delete endpoint.
+    Returns the ids as integers (duplicates removed, order kept).
+    Raises a ValidationError if ids is not a non-empty list of integers between 0 and MAX_CAR_ID.
+    """
+    if not isinstance(ids, list) or not ids:
+        raise ValidationError("Expected a non-empty list of car ids.")
+
+    if len(ids) > CARS_BULK_MAX_ITEMS:
+        raise ValidationError(f"Too many car ids, at most {CARS_BULK_MAX_ITEMS} can be changed at once.")
+
+    # bool is a subclass of int, but true / false are not ids
+    if not all(isinstance(car_id, int) and not isinstance(car_id, bool) for car_id in ids):
+        raise ValidationError("Car ids must be integers.")
+
+    # the car ids are 64-bit signed integers: a larger id would not even fit in the query parameters
+    if not all(0 <= car_id <= MAX_CAR_ID for car_id in ids):
+        raise ValidationError(f"Car ids must be between 0 and {MAX_CAR_ID}.")
+
+    return list(dict.fromkeys(ids))
+
+
+def _select_user_cars(user, ids, shard):
+    """
+    Return the (id, brand, motor) of the cars of the user with the given ids (one query),
+    in the order of the ids.
+    The rows are locked until the end of the transaction (on databases which support it).
+    The archived cars among the ids are moved back to the hot cars first (they are changed, see archive.py):
+    the archive is only queried if some ids are not hot.
+    """
+    def select():
+        # locked in id order: concurrent bulk requests on the same cars wait for each other instead of deadlocking
+        return list(
+            Car.objects
+            .using(shard)
+            .select_for_update()
+            .filter(user=user, id__in=ids)
+            .order_by("id")
+            .values_list("id", "brand", "motor")
+        )
+
+    matched = select()
+    missing_ids = _not_found(ids, [car_id for car_id, *values in matched])
+    if missing_ids and restore_archived_cars(user.id, missing_ids):
+        matched = select()
+
+    # the order of the database rows is not defined: answer in the order of the request, like the not found ids
+    positions = {car_id: position for position, car_id in enumerate(ids)}
+    return sorted(matched, key=lambda row: positions[row[0]])
+
+
+def bulk_update_cars(user, ids, changes):
+    """
+    Apply the same (validated) changes to all the cars of the user with the given ids,
+    with ONE "UPDATE ... WHERE user_id = ? AND id IN (...)" statement.
+    Returns a (updated_ids, not_found_ids) tuple.
+    """
+    shard = car_shard_for_user(user.id)
+
+    with transaction.atomic(using=shard):
+        matched = _select_user_cars(user, ids, shard)
+        updated_ids = [car_id for car_id, *values in matched]
+
+        if updated_ids:
+            # queryset.update() does not call save(): set the brand / motor references and the shadow columns (see models.py)
+            references = {}
+            if "brand" in changes:
+                references["brandRef_id"] = Brand.objects.intern(changes["brand"], using=shard)
+            if "motor" in changes:
+                references["motorRef_id"] = Motor.objects.intern(changes["motor"], using=shard)
+            for field, folded_field in Car.FOLDED_FIELDS.items():
+                if field in changes:
+                    references[folded_field] = fold(changes[field])
+
+            # queryset.update() does not set the auto_now fields
+            Car.objects.using(shard).filter(user=user, id__in=updated_ids).update(
+                **changes, **references, updatedAt=timezone.now()
+            )
+
+            invalidate_user_cars_cache(user.id, using=shard)
+            apply_filter_option_changes(
+                added=[(changes.get("brand", brand), changes.get("motor", motor)) for car_id, brand, motor in matched],
+                removed=[tuple(values) for car_id, *values in matched],
+                using=shard,
+            )
+
+    return updated_ids, _not_found(ids, updated_ids)
+
+
+def bulk_delete_cars(user, ids):
+    """
+    Soft delete all the cars of the user with the given ids, with ONE "UPDATE ... WHERE user_id = ? AND id IN (...)"
+    statement (see deletion.py).
+    Returns a (deleted_ids, not_found_ids) tuple.
+    """
+    shard = car_shard_for_user(user.id)
+
+    with transaction.atomic(using=shard):
+        matched = _select_user_cars(user, ids, shard)
+        deleted_ids = [car_id for car_id, *values in matched]
+
+        if deleted_ids:
+            # soft delete, like the detail endpoint (see deletion.py): the cars are only marked as deleted,
+            # the purge job deletes the rows later
+            Car.objects.using(shard).filter(user=user, id__in=deleted_ids).update(deletedAt=timezone.now())
+
+            invalidate_user_cars_cache(user.id, using=shard)
+            apply_filter_option_changes(removed=[tuple(values) for car_id, *values in matched], using=shard)
+
+    return deleted_ids, _not_found(ids, deleted_ids)
+
+
+def _not_found(ids, matched_ids):
+    matched_ids = set(matched_ids)
+    return [car_id for car_id in ids if car_id not in matched_ids]
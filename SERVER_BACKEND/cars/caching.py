@@ -0,0 +1,221 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from utils.replicaRouter import mark_sticky, reads_from_replica, within_replication_delay
+
+from .filters import split_filter_values, MATCH_FILTER_PARAMS
+
+# Per-user versioned caching of car data.
+#
+# Every user has a "data version" number stored in the cache. The version is part of the key
+# of every cached value which depends on the car notes of that user (counts, pages, ...).
+# When the user creates, updates or deletes a car, the version is incremented (see signals.py),
+# so all cached values of that user are invalidated at once in O(1),
+# without scanning or deleting keys. The old values simply expire.
+#
+# Works with every Django cache backend (local-memory, Redis, ...).
+# Note: the local-memory cache is per process. With several gunicorn workers,
+# use a shared cache (Redis, see settings.py) so that all workers see the same versions.
+#
+# With read replicas (see utils/replicaRouter.py), a change also sends the reads of the user to the primary for the
+# replication delay, and a value read from a replica during that delay is not cached: a lagging replica would
+# store the old data under the new version.
+
+CARS_CACHE_ALIAS = getattr(settings, "CARS_CACHE_ALIAS", "default")
+
+# How long the cached values are kept (seconds). Old versions are never read again, they just expire.
+CARS_CACHE_TIMEOUT = getattr(settings, "CARS_CACHE_TIMEOUT", 60 * 60)
+
+
+def get_cache():
+    return caches[CARS_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"cars:version:{user_id}"
+
+
+def _last_modified_key(user_id):
+    return f"cars:last_modified:{user_id}"
+
+
+def _new_version():
+    # Start from the current time (not from 1), so that a version key which was evicted from the cache
+    # never restarts at a number which is still used by older cached values.
+    return time.time_ns()
+
+
+def get_user_data_version(user_id):
+    """
+    Return the current data version of the user.
+    """
+    cache = get_cache()
+    key = _version_key(user_id)
+
+    version = cache.get(key)
+    if version is None:
+        # add() does nothing if another process has just set the version
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user_data_version(user_id):
+    """
+    Increment the data version of the user --> invalidates all cached values of the user.
+    """
+    cache = get_cache()
+    key = _version_key(user_id)
+
+    try:
+        cache.incr(key)
+    except ValueError:
+        # the key does not exist (never set or evicted)
+        cache.set(key, _new_version(), timeout=None)
+
+    # remember when the data of the user changed (used for the Last-Modified header)
+    cache.set(_last_modified_key(user_id), time.time(), timeout=None)
+
+    # read-your-writes for the owner of the cars, also when someone else changed them (admin, archive job, ...)
+    mark_sticky(user_id=user_id)
+
+
+def user_data_may_be_stale(user_id):
+    """
+    True if the current request reads from a read replica which may not have the last change
+    of the cars of the user yet: what it reads must not be cached under the current data version.
+    """
+    return reads_from_replica() and within_replication_delay(get_cache().get(_last_modified_key(user_id)))
+
+
+def get_user_last_modified(user_id):
+    """
+    Return the (aware) datetime of the last change of the cars of the user.
+    If it is unknown (never set or evicted from the cache), "now" is used:
+    clients then get a full response once, which is always safe.
+    """
+    cache = get_cache()
+    key = _last_modified_key(user_id)
+
+    timestamp = cache.get(key)
+    if timestamp is None:
+        cache.add(key, time.time(), timeout=None)
+        timestamp = cache.get(key)
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+def make_user_etag(user_id, *parts):
+    """
+    Return a strong ETag for a response which depends only on the cars of the user and the given parts
+    (for example the normalized query parameters). It changes whenever the data version of the user changes,
+    so it can be computed without running any database query.
+    """
+    version = get_user_data_version(user_id)
+    digest = hashlib.sha1("\n".join(str(part) for part in (user_id, version, *parts)).encode()).hexdigest()
+    return f'"{digest}"'
+
+# the query parameters normalized by normalize_filter_params
+FILTER_QUERY_PARAMS = ("brand", "motor", "q") + MATCH_FILTER_PARAMS
+
+
+def normalize_filter_params(params):
+    """
+    Return a canonical string of the brand, motor and q filters,
+    so that equivalent filters share the same cache entries.
+    Example: brand=" Porsche-audi" and brand="Audi-Porsche" --> "brand=audi|porsche;motor=;q="
+    """
+    def normalize(values):
+        return "|".join(sorted({value.lower() for value in values}))
+
+    return ";".join([
+        "brand=" + normalize(split_filter_values(params.get("brand"))),
+        "motor=" + normalize(split_filter_values(params.get("motor"))),
+        "q=" + normalize(split_filter_values(params.get("q"), separator=None)),
+    ] + [
+        # exact / prefix filters, only if present (keeps the keys of the other filters unchanged)
+        f"{param}=" + normalize(split_filter_values(params.get(param)))
+        for param in MATCH_FILTER_PARAMS
+        if params.get(param)
+    ])
+
+
+def normalize_query_params(params):
+    """
+    Return a canonical string of all the query parameters (normalized filters + the other parameters sorted),
+    so that the same request with the parameters in a different order shares the same cache entry.
+    Example: "?page=2&brand=Audi" and "?brand=audi&page=2" --> same string
+    """
+    other_params = sorted(
+        (key, value)
+        for key, values in params.lists()
+        for value in values
+        if key not in FILTER_QUERY_PARAMS
+    )
+    return normalize_filter_params(params) + ";" + "&".join(f"{key}={value}" for key, value in other_params)
+
+
+def make_user_cache_key(prefix, user_id, *parts):
+    """
+    Build a cache key which is invalidated when the data version of the user changes.
+    The variable parts are hashed to keep the key short (some backends limit the key length).
+    """
+    version = get_user_data_version(user_id)
+    digest = hashlib.sha1("\n".join(str(part) for part in parts).encode()).hexdigest()
+    return f"cars:{prefix}:{user_id}:{version}:{digest}"
+
+
+def get_or_set_user_cached(prefix, user_id, parts, build):
+    """
+    Return the cached value of the user for the given key parts.
+    On a cache miss, build() is called and its result is cached (unless it may come from a lagging replica).
+    Used by the views to cache whole (serialized) responses.
+    """
+    cache = get_cache()
+    key = make_user_cache_key(prefix, user_id, *parts)
+
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        if not user_data_may_be_stale(user_id):
+            cache.set(key, value, timeout=CARS_CACHE_TIMEOUT)
+    return value
+
+
+async def aget_or_set_user_cached(prefix, user_id, parts, build):
+    """
+    Async version of get_or_set_user_cached, used by the async views: build is a coroutine function.
+    The cache itself is read synchronously (local memory or one Redis round trip, no database).
+    """
+    cache = get_cache()
+    key = make_user_cache_key(prefix, user_id, *parts)
+
+    value = cache.get(key)
+    if value is None:
+        value = await build()
+        if not user_data_may_be_stale(user_id):
+            cache.set(key, value, timeout=CARS_CACHE_TIMEOUT)
+    return value
+
+
+def get_cached_count(user_id, params, count, prefix="count"):
+    """
+    Return the number of cars of the user matching the filters in params.
+    count is a function which runs the COUNT(*) query, it is only called on a cache miss.
+    prefix: "count" for the (hot) cars, "archived_count" for the archived cars (see archive.py).
+    """
+    return get_or_set_user_cached(
+        prefix=prefix, user_id=user_id, parts=[normalize_filter_params(params)], build=count
+    )
+
+
+async def aget_cached_count(user_id, params, count, prefix="count"):
+    """
+    Async version of get_cached_count: count is a coroutine function (for example queryset.acount).
+    """
+    return await aget_or_set_user_cached(
+        prefix=prefix, user_id=user_id, parts=[normalize_filter_params(params)], build=count
+    )
@@ -0,0 +1,161 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Car, ArchivedCar
+from .signals import invalidate_user_cars_cache
+from .filter_options import apply_filter_option_changes
+from .sharding import car_shard_for_id, car_shard_for_user
+from .archive import restore_archived_cars
+
+# Soft delete of the car notes.
+#
+# car.delete() runs Django's deletion collector inside the request: it loads the car, collects the related rows,
+# sends the delete signals and deletes the rows, while holding the (SQLite) write lock.
+# The delete endpoints only mark the car as deleted instead, with ONE "UPDATE cars_car SET deletedAt = ? WHERE id = ?"
+# (after a primary key lookup of its brand and motor, locked until the end of the transaction):
+# - the default manager (Car.objects) excludes the soft deleted cars (tombstones), so they disappear at once
+#   from the lists, details, counts and filters; Car.all_objects still returns them
+# - during the undo window (CARS_UNDO_DELETE_SECONDS) the user can restore the car (POST /api/cars/<id>/restore/)
+# - the "purge_deleted_cars" management command, run periodically, hard deletes the tombstones older than the undo
+#   window, CARS_PURGE_BATCH_SIZE cars per transaction (one DELETE each), found with the partial index
+#   of the tombstones (see models.py)
+#
+# The materialized filter options (and so the public filter options endpoint) only count the cars which are not
+# deleted: the soft delete removes the car from them and the undo adds it back, in the transaction of the UPDATE.
+# The purge does not change them (and the hard delete of a tombstone, e.g. with its user, neither: see signals.py).
+
+# seconds during which a deleted car can be restored (the purge job keeps the tombstones at least this long)
+CARS_UNDO_DELETE_SECONDS = getattr(settings, "CARS_UNDO_DELETE_SECONDS", 15 * 60)
+
+# number of tombstones deleted per transaction
+CARS_PURGE_BATCH_SIZE = getattr(settings, "CARS_PURGE_BATCH_SIZE", 1000)
+
+
+def undo_cutoff(seconds=None):
+    """
+    Return the datetime before which the deleted cars can no longer be restored (and may be purged).
+    """
+    return timezone.now() - timedelta(seconds=CARS_UNDO_DELETE_SECONDS if seconds is None else seconds)
+
+
+def _set_deleted_at(queryset, using, deleted_at):
+    """
+    Set the deletedAt of the car of the queryset (one UPDATE by id), in one transaction on the database (shard) "using",
+    and update the filter options and the cached data of its user:
+    deleted_at=<now> soft deletes the car (removed from the filter options), None restores it (added back).
+    Returns the id of the user of the car, None if the queryset matches no car.
+    """
+    with transaction.atomic(using=using):
+        # locked until the end of the transaction (on databases which support it), so the counts match the car
+        row = queryset.using(using).select_for_update().values_list("id", "user_id", "brand", "motor").first()
+        if row is None:
+            return None
+
+        car_id, user_id, *values = row
+        Car.all_objects.using(using).filter(id=car_id).update(deletedAt=deleted_at)
+
+        if deleted_at is None:
+            apply_filter_option_changes(added=[tuple(values)], using=using)
+        else:
+            apply_filter_option_changes(removed=[tuple(values)], using=using)
+        invalidate_user_cars_cache(user_id, using=using)
+
+    return user_id
+
+
+def soft_delete_user_car(user, car_id):
+    """
+    Soft delete the car of the user with the given id (one UPDATE on the shard of the user).
+    An archived car is moved back to the hot table first (see archive.py).
+    Returns False if the user has no such car.
+    """
+    shard = car_shard_for_user(user.id)
+    cars = Car.objects.filter(user_id=user.id, id=car_id)
+
+    if _set_deleted_at(cars, shard, timezone.now()) is None:
+        if not restore_archived_cars(user.id, [car_id]) or _set_deleted_at(cars, shard, timezone.now()) is None:
+            return False
+
+    return True
+
+
+def soft_delete_car(car_id):
+    """
+    Soft delete the car with the given id, of any user (admin). The id tells the shard of the car (see sharding.py).
+    Returns False if there is no such car.
+    """
+    shard = car_shard_for_id(car_id)
+    if shard is None:
+        return False
+
+    cars = Car.objects.filter(id=car_id)
+    if _set_deleted_at(cars, shard, timezone.now()) is None:
+        user_id = ArchivedCar.objects.using(shard).filter(id=car_id).values_list("user_id", flat=True).first()
+        if user_id is None or not restore_archived_cars(user_id, [car_id]):
+            return False
+        return _set_deleted_at(cars, shard, timezone.now()) is not None
+
+    return True
+
+
+def undo_delete_user_car(user, car_id):
+    """
+    Restore the soft deleted car of the user with the given id (one UPDATE),
+    if it was deleted less than CARS_UNDO_DELETE_SECONDS ago. Returns False if there is no such car.
+    """
+    cars = Car.all_objects.filter(user_id=user.id, id=car_id, deletedAt__isnull=False, deletedAt__gte=undo_cutoff())
+    return _set_deleted_at(cars, car_shard_for_user(user.id), None) is not None
+
+
+def purge_deleted_cars_batch(cutoff, batch_size=CARS_PURGE_BATCH_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Hard delete at most batch_size cars of the database (shard) "using" which were soft deleted before cutoff,
+    in one transaction. Returns the number of deleted cars.
+    """
+    with transaction.atomic(using=using):
+        # the oldest tombstones first (partial index on deletedAt, id of the tombstones)
+        ids = list(
+            Car.all_objects
+            .using(using)
+            .select_for_update()
+            .filter(deletedAt__isnull=False, deletedAt__lt=cutoff)
+            .order_by("deletedAt", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+
+        # no other table references the cars: delete the rows directly, without the deletion collector
+        # and the delete signals (the search index is updated by its triggers, see search.py)
+        connection = connections[using]
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {quote_name(Car._meta.db_table)} WHERE {quote_name('id')} IN ({', '.join(['%s'] * len(ids))})",
+                ids,
+            )
+
+    return len(ids)
+
+
+def purge_deleted_cars(cutoff=None, batch_size=CARS_PURGE_BATCH_SIZE, using=DEFAULT_DB_ALIAS, pause=0):
+    """
+    Hard delete all the cars of the database (shard) "using" which were soft deleted before cutoff
+    (default: CARS_UNDO_DELETE_SECONDS ago), batch after batch (see purge_deleted_cars_batch).
+    pause: seconds to wait between two batches (lets the writes of the requests through).
+    Returns the number of deleted cars.
+    """
+    cutoff = undo_cutoff() if cutoff is None else cutoff
+    total = 0
+
+    while True:
+        purged = purge_deleted_cars_batch(cutoff, batch_size=batch_size, using=using)
+        total += purged
+        if purged < batch_size:
+            return total
+        if pause:
+            time.sleep(pause)
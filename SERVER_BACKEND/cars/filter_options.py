@@ -0,0 +1,170 @@
+import threading
+import time
+from collections import Counter
+
+from django.db import DEFAULT_DB_ALIAS, transaction, IntegrityError
+from django.db.models import Count, F, Max, Subquery, Value
+from django.db.models.functions import Greatest
+
+from .models import Car, ArchivedCar, CarFilterOption
+from .sharding import CAR_SHARDS, for_each_shard, shard_db
+
+# Materialized filter options (distinct car brands and motors).
+#
+# The CarFilterOption table keeps one row per distinct brand / motor with the number of cars using it.
+# It is updated incrementally when cars are created, updated or deleted:
+# - single cars: by the signal receivers in signals.py
+# - bulk operations: by the views, which call apply_filter_option_changes themselves
+#
+# Every change stamps the changed rows with a new, increasing version number.
+# Each worker process keeps a copy of the options in memory, together with the version it was loaded at.
+# On every request it only reads the highest version (one index lookup) and reloads the small table
+# if another worker has changed it. This way all workers converge on the same options,
+# without a shared cache and without scanning the cars table.
+#
+# The concurrent changes are not serialized (no lock besides the rows they change), so a change can commit after
+# a worker has loaded a higher version of another change: its rows would stay hidden behind that version.
+# So after its commit, every change stamps its rows again with "UPDATE ... SET version = MAX(version) + 1",
+# computed by the statement itself: it starts after the commit, so it sees every version a worker could have
+# loaded before the change was visible, and the highest version always moves past it.
+# The cost is one more small UPDATE per change, outside the transaction of the cars.
+#
+# With several shards (see sharding.py), every shard has its own table for its own cars:
+# get_filter_options reads the options of all the shards in parallel and merges them.
+
+
+def _next_version(using):
+    """
+    Return a version number higher than all the versions in the table.
+    Based on the current time, so that versions are never reused (not even after the table was rebuilt).
+    """
+    current = CarFilterOption.objects.using(using).aggregate(version=Max("version"))["version"] or 0
+    return max(current + 1, time.time_ns() // 1000)
+
+
+def _stamp_committed_version(version, using):
+    """
+    After the commit of a change: stamp its rows (still at the version of the change) with a version higher than
+    all the committed versions, computed by the UPDATE statement itself (MAX(version) + 1, see the top of the module).
+    """
+    highest = CarFilterOption.objects.using(using).order_by("-version").values("version")[:1]
+    CarFilterOption.objects.using(using).filter(version=version).update(
+        version=Greatest(Subquery(highest) + 1, Value(time.time_ns() // 1000))
+    )
+
+
+def apply_filter_option_changes(added=(), removed=(), using=DEFAULT_DB_ALIAS):
+    """
+    Update the reference counts of the filter options.
+    added / removed: iterables of (brand, motor) tuples of the cars which were created / deleted.
+    An updated car is a removed (old brand, old motor) plus an added (new brand, new motor).
+    using: the database (shard) of the cars.
+    """
+    deltas = Counter()
+    for values in added:
+        for kind, value in zip(CarFilterOption.KINDS, values):
+            deltas[(kind, value)] += 1
+    for values in removed:
+        for kind, value in zip(CarFilterOption.KINDS, values):
+            deltas[(kind, value)] -= 1
+
+    # unchanged values (e.g. the brand of an updated car, if only the motor changed) cost nothing
+    deltas = {option: delta for option, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    options = CarFilterOption.objects.using(using)
+
+    with transaction.atomic(using=using):
+        version = _next_version(using)
+        transaction.on_commit(lambda: _stamp_committed_version(version, using), using=using)
+
+        for (kind, value), delta in deltas.items():
+            updated = (
+                options
+                .filter(kind=kind, value=value)
+                .update(count=F("count") + delta, version=version)
+            )
+
+            if not updated and delta > 0:
+                try:
+                    # savepoint, so that a concurrent insert of the same value does not break the transaction
+                    with transaction.atomic(using=using):
+                        options.create(kind=kind, value=value, count=delta, version=version)
+                except IntegrityError:
+                    options.filter(kind=kind, value=value).update(
+                        count=F("count") + delta, version=version
+                    )
+
+
+def rebuild_filter_options(using=DEFAULT_DB_ALIAS):
+    """
+    Recompute the whole table of the database (shard) "using" from its cars table and its archived cars
+    (one GROUP BY query per kind and table, see archive.py). The soft deleted cars are not counted (see deletion.py).
+    Only needed to repair the table, see the "rebuild_car_filter_options" management command.
+    """
+    with transaction.atomic(using=using):
+        version = _next_version(using)
+        transaction.on_commit(lambda: _stamp_committed_version(version, using), using=using)
+        counts = {kind: Counter() for kind in CarFilterOption.KINDS}
+        for manager in (Car.objects, ArchivedCar.objects):
+            for kind in CarFilterOption.KINDS:
+                counts[kind].update(dict(manager.using(using).values_list(kind).annotate(count=Count("id")).order_by()))
+
+        CarFilterOption.objects.using(using).all().delete()
+        CarFilterOption.objects.using(using).bulk_create([
+            CarFilterOption(kind=kind, value=value, count=count, version=version)
+            for kind in CarFilterOption.KINDS
+            for value, count in counts[kind].items()
+        ])
+
+
+# in-process copies of the options, per database: {using: (version, {"brands": [...], "motors": [...]})}
+_cached_options = {}
+_cached_options_lock = threading.Lock()
+
+
+def get_filter_options():
+    """
+    Return the distinct brands and motors (sorted), used by at least one car:
+    {"brands": [...], "motors": [...]}
+    """
+    if len(CAR_SHARDS) == 1:
+        return get_shard_filter_options(shard_db(CAR_SHARDS[0]))
+
+    shard_options = for_each_shard(lambda alias: get_shard_filter_options(shard_db(alias)))
+    return {
+        key: sorted(set().union(*(options[key] for options in shard_options)))
+        for key in ("brands", "motors")
+    }
+
+
+def get_shard_filter_options(using=None):
+    """
+    Return the filter options of one database (shard), from the in-process copy if the table did not change.
+    using None: the database chosen by the router.
+    """
+    queryset = CarFilterOption.objects.using(using)
+
+    # the version first, then the rows, from the same database (one replica per request, see utils/replicaRouter.py):
+    # the rows are at least as new as the version, a newer change is loaded by the next request
+    version = queryset.aggregate(version=Max("version"))["version"]
+
+    cached_version, options = _cached_options.get(using, (None, None))
+    if options is not None and cached_version == version:
+        return options
+
+    with _cached_options_lock:
+        rows = list(
+            queryset
+            .filter(kind__in=[CarFilterOption.BRAND, CarFilterOption.MOTOR], count__gt=0)
+            .order_by("value")
+            .values_list("kind", "value")
+        )
+        options = {
+            "brands": [value for kind, value in rows if kind == CarFilterOption.BRAND],
+            "motors": [value for kind, value in rows if kind == CarFilterOption.MOTOR],
+        }
+        _cached_options[using] = (version, options)
+
+    return options
@@ -0,0 +1,239 @@
+from django.db import router
+from django.db.models import Q, Count
+
+from .models import Car, Brand, Motor, fold
+from .search import search_index_available, asearch_index_available, can_use_index, match_all_terms, matching_car_ids
+
+# Query parameters used to filter the car lists.
+# - brand: one or more brand names separated by "-" (OR logic within brand).
+#         Example: "Volkswagen-Hyundai-Aston Martin"
+# - motor: one or more motor types separated by "-" (OR logic within motor).
+#         Example: "Diesel-Electric"
+# - q: free text search, the words are separated by white spaces (AND logic).
+#         Every word must be contained in the brand, the model or the motor of the car.
+#         Example: "audi diesel"
+# - brand_exact, model_exact, motor_exact: one or more values separated by "-" (OR logic),
+#         the field must be EQUAL to one of them (case-insensitive).
+#         Example: model_exact="a4-a6"
+# - brand_prefix, model_prefix, motor_prefix: one or more values separated by "-" (OR logic),
+#         the field must START WITH one of them (case-insensitive).
+#         Example: brand_prefix="vol" --> Volkswagen, Volvo
+#
+# The exact and prefix filters compare the case-folded shadow columns (brandFolded, ..., see models.py),
+# which have an index: "= value" and the range "folded >= prefix AND folded < next prefix"
+# are index lookups, while "LIKE 'prefix%'" (istartswith) is case-insensitive on SQLite and cannot use the index.
+
+# the exact / prefix filter query parameters: "brand_exact", "brand_prefix", "model_exact", ...
+MATCH_FILTER_PARAMS = tuple(
+    f"{field}_{mode}" for field in Car.FOLDED_FIELDS for mode in ("exact", "prefix")
+)
+
+
+def split_filter_values(value, separator="-"):
+    """
+    Split a filter query parameter into its values.
+    Removes white spaces around the values and empty values.
+    Example: "  Audi  -   Porsche  -" --> ["Audi", "Porsche"]
+    """
+    if not value:
+        return []
+    values = (filter_value.strip() for filter_value in value.split(separator))
+    return [filter_value for filter_value in values if filter_value]
+
+
+def prefix_upper_bound(prefix):
+    """
+    Return the smallest string which is greater than all the strings starting with prefix,
+    or None if there is none. Example: "vol" --> "vom"
+    "folded >= prefix AND folded < upper bound" is then the same as "folded starts with prefix",
+    but as a range it can use the index (the strings are compared character by character by code point).
+    """
+    for index in range(len(prefix) - 1, -1, -1):
+        code_point = ord(prefix[index]) + 1
+        if 0xD800 <= code_point <= 0xDFFF:
+            # surrogates are not valid characters
+            code_point = 0xE000
+        if code_point <= 0x10FFFF:
+            return prefix[:index] + chr(code_point)
+    return None
+
+
+def build_match_filters(params):
+    """
+    Build the Q object for the exact and prefix filters (brand_exact, brand_prefix, model_exact, ...).
+    """
+    queries = Q()
+
+    for field, folded_field in Car.FOLDED_FIELDS.items():
+        exact_values = [fold(value) for value in split_filter_values(params.get(f"{field}_exact"))]
+        if exact_values:
+            # OR logic: one index lookup per value
+            queries &= Q(**{f"{folded_field}__in": exact_values})
+
+        prefixes = [fold(value) for value in split_filter_values(params.get(f"{field}_prefix"))]
+        if prefixes:
+            prefix_queries = Q()
+            for prefix in prefixes:
+                prefix_query = Q(**{f"{folded_field}__gte": prefix})
+                upper_bound = prefix_upper_bound(prefix)
+                if upper_bound is not None:
+                    prefix_query &= Q(**{f"{folded_field}__lt": upper_bound})
+                # the range makes it an index lookup, startswith keeps the result exact
+                # on databases which compare the strings with a locale collation
+                prefix_queries |= prefix_query & Q(**{f"{folded_field}__startswith": prefix})
+            queries &= prefix_queries
+
+    return queries
+
+
+def build_car_filters(params, using=None, archived=False):
+    """
+    Build the Q object for the brand, motor and q query parameters.
+
+    Filtering logic:
+    - brand group, motor group and q are each optional.
+    - If more of them are provided, results must satisfy ALL of them (AND logic).
+    - Filtering is a case-insensitive substring match (icontains).
+    - The brand / motor values are first resolved to the ids of the matching rows of the small
+      Brand / Motor lookup tables (see models.py), once per request.
+      The cars are then filtered by these integer ids, instead of comparing the strings of every car.
+    - If the database has a full-text search index (see search.py),
+      the q terms are looked up in the index instead of scanning the table with LIKE '%value%'.
+
+    The exact and prefix filters (brand_exact, brand_prefix, ...) are added as well, see build_match_filters.
+
+    The Q object does NOT restrict the cars to a user, the views combine it with Q(user=...).
+    The lookup tables are read from the database "using", by default the database the cars are read from
+    (a read replica, see utils/replicaRouter.py).
+
+    archived: filters for the archived cars (ArchivedCar has the same columns, see archive.py).
+    The search index only covers the hot cars, so the q terms always use "icontains" there.
+    """
+    using = using or router.db_for_read(Car)
+    brand_values = split_filter_values(params.get("brand"))
+    motor_values = split_filter_values(params.get("motor"))
+
+    # OR logic: the ids of all the brands / motors containing one of the values (substring match, case-insensitive)
+    return _build_car_filters(
+        params,
+        use_index=not archived and search_index_available(using),
+        brand_ids=Brand.objects.matching_ids(brand_values, using=using) if brand_values else None,
+        motor_ids=Motor.objects.matching_ids(motor_values, using=using) if motor_values else None,
+    )
+
+
+async def abuild_car_filters(params, using=None, archived=False):
+    """
+    Async version of build_car_filters (the lookup tables are read with the async ORM).
+    """
+    using = using or router.db_for_read(Car)
+    brand_values = split_filter_values(params.get("brand"))
+    motor_values = split_filter_values(params.get("motor"))
+
+    return _build_car_filters(
+        params,
+        use_index=not archived and await asearch_index_available(using),
+        brand_ids=await Brand.objects.amatching_ids(brand_values, using=using) if brand_values else None,
+        motor_ids=await Motor.objects.amatching_ids(motor_values, using=using) if motor_values else None,
+    )
+
+
+def _build_car_filters(params, use_index, brand_ids, motor_ids):
+    """
+    Build the Q object of build_car_filters from the ids of the matching brands / motors
+    (None if the group is not filtered).
+    """
+    search_terms = split_filter_values(params.get("q"), separator=None)
+
+    # FTS5 expressions of the groups which can be looked up in the index
+    match_expressions = []
+
+    brand_queries = Q()
+    if brand_ids is not None:
+        brand_queries = Q(brandRef_id__in=brand_ids)
+
+    motor_queries = Q()
+    if motor_ids is not None:
+        motor_queries = Q(motorRef_id__in=motor_ids)
+
+    search_queries = Q()
+    indexed_terms = [term for term in search_terms if use_index and can_use_index([term])]
+    if indexed_terms:
+        match_expressions.append(match_all_terms(indexed_terms))
+    for term in search_terms:
+        if term not in indexed_terms:
+            # AND between the terms, OR between the columns
+            search_queries &= Q(brand__icontains=term) | Q(model__icontains=term) | Q(motor__icontains=term)
+
+    index_queries = Q()
+    if match_expressions:
+        # one index lookup for all groups: (brand group) AND (motor group) AND (q terms)
+        index_queries = Q(id__in=matching_car_ids(" AND ".join(match_expressions)))
+
+    # If one of the groups is empty, it is ignored.
+    # For example, if all groups are empty, the Q object matches all cars.
+    return index_queries & brand_queries & motor_queries & search_queries & build_match_filters(params)
+
+
+# Fields for which the list view can return facet counts (?facets=brand,motor)
+FACET_FIELDS = ("brand", "motor")
+
+
+def parse_facet_fields(value):
+    """
+    Return the valid facet fields of the facets query parameter, in a canonical order.
+    Unknown fields are ignored.
+    Example: "motor, brand,color" --> ["brand", "motor"]
+    """
+    requested = set(split_filter_values(value, separator=","))
+    return [field for field in FACET_FIELDS if field in requested]
+
+
+def compute_facets(queryset, fields):
+    """
+    Count the cars of the queryset per value of each of the given fields, with ONE grouped query:
+    SELECT brand, motor, COUNT(id) FROM ... GROUP BY brand, motor
+    The per-field counts are then summed up in Python (the groups are few, the rows can be many).
+    queryset may also be a list of querysets (e.g. the hot and the archived cars): their counts are added up.
+
+    Returns {"brand": [{"value": "Audi", "count": 12}, ...], "motor": [...]},
+    each list ordered by count (descending) and value.
+    """
+    if not fields:
+        return {}
+
+    querysets = queryset if isinstance(queryset, list) else [queryset]
+    return _facets_from_groups([group for queryset in querysets for group in _facet_groups(queryset, fields)], fields)
+
+
+async def acompute_facets(queryset, fields):
+    """
+    Async version of compute_facets.
+    """
+    if not fields:
+        return {}
+
+    querysets = queryset if isinstance(queryset, list) else [queryset]
+    return _facets_from_groups(
+        [group for queryset in querysets async for group in _facet_groups(queryset, fields)], fields
+    )
+
+
+def _facet_groups(queryset, fields):
+    return queryset.order_by().values_list(*fields).annotate(count=Count("id"))
+
+
+def _facets_from_groups(groups, fields):
+    counts = {field: {} for field in fields}
+
+    for *values, count in groups:
+        for field, value in zip(fields, values):
+            counts[field][value] = counts[field].get(value, 0) + count
+
+    return {
+        field: [
+            {"value": value, "count": count}
+            for value, count in sorted(field_counts.items(), key=lambda item: (-item[1], item[0]))
+        ]
+        for field, field_counts in counts.items()
+    }
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from cars.archive import CARS_ARCHIVE_AFTER_DAYS, CARS_ARCHIVE_BATCH_SIZE, archive_cutoff, archive_cars
+from cars.sharding import CAR_SHARDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the car notes which were not updated for a long time (settings.CARS_ARCHIVE_AFTER_DAYS) "
+        "from the hot cars table to the archive, on every shard, in batches of one transaction each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=CARS_ARCHIVE_AFTER_DAYS, help="Archive the cars not updated for this many days.")
+        parser.add_argument("--batch-size", type=int, default=CARS_ARCHIVE_BATCH_SIZE, help="Cars moved per transaction.")
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to wait between two batches.")
+
+    def handle(self, *args, **options):
+        # the same cutoff for all the shards
+        cutoff = archive_cutoff(options["days"])
+
+        total = 0
+        for alias in CAR_SHARDS:
+            archived = archive_cars(cutoff, batch_size=options["batch_size"], using=alias, pause=options["pause"])
+            self.stdout.write(f"{alias}: {archived} car(s) archived")
+            total += archived
+
+        self.stdout.write(self.style.SUCCESS(f"{total} car(s) not updated since {cutoff:%Y-%m-%d %H:%M} archived."))
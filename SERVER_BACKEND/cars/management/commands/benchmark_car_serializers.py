@@ -0,0 +1,78 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from cars.models import Car
+from cars.serializers import GetCarSerializer, FastCarReadSerializer
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare GetCarSerializer with FastCarReadSerializer (read + serialize + render JSON) "
+        "on temporary cars. The cars are created in a transaction which is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[9, 1000, 100000], help="Numbers of cars.")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per size, the best run is reported.")
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        fast_serializer = FastCarReadSerializer()
+
+        def model_serializer(queryset):
+            return renderer.render(GetCarSerializer(queryset, many=True).data)
+
+        def fast(queryset):
+            return renderer.render(fast_serializer.serialize(queryset))
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username="benchmark_car_serializers", password=None)
+                created = 0
+
+                for size in sorted(options["sizes"]):
+                    Car.objects.bulk_create(
+                        [
+                            Car(user=user, brand=f"Brand {i % 50}", model=f"Model {i}", motor=f"Motor {i % 5}")
+                            for i in range(created, size)
+                        ],
+                        batch_size=1000,
+                    )
+                    created = max(created, size)
+
+                    queryset = Car.objects.filter(user=user).order_by("-createdAt", "-id")[:size]
+
+                    if model_serializer(queryset) != fast(queryset):
+                        raise CommandError(f"The serializers return different JSON for {size} cars.")
+
+                    model_time = self._best_time(model_serializer, queryset, options["repeat"])
+                    fast_time = self._best_time(fast, queryset, options["repeat"])
+
+                    self.stdout.write(
+                        f"{size:>8} cars: GetCarSerializer {model_time * 1000:10.2f} ms"
+                        f" | FastCarReadSerializer {fast_time * 1000:10.2f} ms"
+                        f" | x{model_time / fast_time:.1f}"
+                    )
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    @staticmethod
+    def _best_time(function, queryset, repeat):
+        times = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            function(queryset)
+            times.append(time.perf_counter() - start)
+        return min(times)
@@ -0,0 +1,61 @@
+import random
+import string
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars.models import fold
+from cars.suggest import PrefixIndex
+
+
+def scan_top(counts, prefix, limit):
+    """
+    Linear scan of all the values (what a query without index does for every keystroke).
+    """
+    folded_prefix = fold(prefix)
+    matches = [(value, count) for value, count in counts.items() if fold(value).startswith(folded_prefix)]
+    return sorted(matches, key=lambda item: (-item[1], fold(item[0]), item[0]))[:limit]
+
+
+class Command(BaseCommand):
+    help = "Measure the autocomplete lookups of the in-memory prefix index (cars/suggest.py) against a linear scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--values", type=int, default=100000, help="Number of distinct values in the index.")
+        parser.add_argument("--lookups", type=int, default=1000, help="Number of prefixes looked up.")
+        parser.add_argument("--limit", type=int, default=10, help="Suggestions per lookup.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        counts = {
+            "".join(rng.choices(string.ascii_letters + " ", k=rng.randint(3, 20))): rng.randint(1, 1000)
+            for _ in range(options["values"])
+        }
+        # prefixes of 1 to 4 characters, like a user typing in the filter box
+        prefixes = [value[:rng.randint(1, 4)] for value in rng.sample(list(counts), min(options["lookups"], len(counts)))]
+
+        start = time.perf_counter()
+        index = PrefixIndex(counts)
+        build = time.perf_counter() - start
+        self.stdout.write(f"{len(index)} values, index built in {build * 1000:.1f} ms")
+
+        def lookups():
+            start = time.perf_counter()
+            for prefix in prefixes:
+                index.top(prefix, options["limit"])
+            return (time.perf_counter() - start) / len(prefixes)
+
+        # first pass: every distinct prefix is computed once (the short ones repeat), then all the results are remembered
+        indexed = lookups()
+        remembered = lookups()
+
+        # the scan is slow, a few lookups are enough
+        sample = prefixes[:20]
+        start = time.perf_counter()
+        for prefix in sample:
+            scan_top(counts, prefix, options["limit"])
+        scanned = (time.perf_counter() - start) / len(sample)
+
+        self.stdout.write(f"  prefix index              {indexed * 1000:9.4f} ms / lookup | x{scanned / indexed:.0f}")
+        self.stdout.write(f"  prefix index (remembered) {remembered * 1000:9.4f} ms / lookup | x{scanned / remembered:.0f}")
+        self.stdout.write(f"  linear scan               {scanned * 1000:9.4f} ms / lookup")
@@ -0,0 +1,201 @@
+import os
+import random
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from cars.filters import build_car_filters
+from cars.models import Car
+from cars.pagination import CURSOR_ORDERING
+from cars.search import TRIGRAM_INDEXES
+
+# The same workload (bulk insert, pages of a user, substring searches over all the cars, streaming of all the cars)
+# runs against a temporary SQLite file and a temporary, locally started PostgreSQL server.
+# Both databases are migrated like the real ones, so they get the same indexes: the FTS5 index on SQLite,
+# the pg_trgm GIN indexes on PostgreSQL (see cars/search.py), and the same connection settings
+# (SQLite pragmas of utils/sqliteTuning.py, server-side cursors for the streaming on PostgreSQL).
+
+BRANDS = ["Audi", "BMW", "Mercedes-Benz", "Volkswagen", "Volvo", "Porsche", "Toyota", "Hyundai", "Aston Martin", "Renault"]
+MOTORS = ["Diesel", "Petrol", "Electric", "Hybrid"]
+
+# columns read by the list views
+COLUMNS = ("id", "brand", "model", "motor", "createdAt")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def local_postgres(bin_dir):
+    """
+    Start a throwaway PostgreSQL server (new cluster in a temporary directory, Unix socket only)
+    and yield its Django database settings. The server and its files are removed afterwards.
+    """
+    directory = tempfile.mkdtemp(prefix="car_notes_postgres_")
+    data = os.path.join(directory, "data")
+    port = free_port()
+    pg_ctl = os.path.join(bin_dir, "pg_ctl")
+
+    try:
+        subprocess.run(
+            [os.path.join(bin_dir, "initdb"), "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8", "--locale=C"],
+            check=True, capture_output=True,
+        )
+        subprocess.run(
+            [pg_ctl, "-D", data, "-l", os.path.join(directory, "server.log"), "-w",
+             "-o", f"-p {port} -k {directory} -c listen_addresses=''", "start"],
+            check=True, capture_output=True,
+        )
+        yield {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": "postgres",
+            "USER": "postgres",
+            "HOST": directory,
+            "PORT": str(port),
+        }
+    finally:
+        subprocess.run([pg_ctl, "-D", data, "-m", "fast", "stop"], capture_output=True)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def benchmark_database(alias, settings_dict):
+    """
+    Declare the database alias for the duration of the benchmark and migrate it.
+    """
+    connections.settings[alias] = connections.configure_settings({**connections.settings, alias: settings_dict})[alias]
+    try:
+        call_command("migrate", database=alias, verbosity=0)
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+def has_trigram_indexes(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM pg_indexes WHERE indexname = ANY(%s)", [list(TRIGRAM_INDEXES)])
+        return cursor.fetchone()[0] == len(TRIGRAM_INDEXES)
+
+
+def run_workload(alias, cars, users, queries, chunk_size):
+    """
+    Run the workload on the database alias. Returns [(phase, operations, seconds)].
+    """
+    rng = random.Random(0)
+    results = []
+
+    def timed(phase, operations, func):
+        start = time.perf_counter()
+        func()
+        results.append((phase, operations, time.perf_counter() - start))
+
+    def insert():
+        with transaction.atomic(using=alias):
+            Car.objects.db_manager(alias).bulk_create(
+                [
+                    Car(
+                        user_id=rng.randint(1, users),
+                        brand=rng.choice(BRANDS),
+                        model=f"Model {rng.randint(1, 9999)}",
+                        motor=rng.choice(MOTORS),
+                    )
+                    for _ in range(cars)
+                ],
+                batch_size=1000,
+            )
+        # fresh statistics for the query planners
+        with connections[alias].cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    timed("bulk insert", cars, insert)
+
+    cars_queryset = Car.objects.using(alias).order_by(*CURSOR_ORDERING).values_list(*COLUMNS)
+
+    def pages():
+        for _ in range(queries):
+            list(cars_queryset.filter(user_id=rng.randint(1, users))[:9])
+
+    timed("user pages", queries, pages)
+
+    def searches():
+        # q filter: brand, model or motor contains the term (FTS5 / trigram index, see cars/search.py)
+        for _ in range(queries):
+            car_filters = build_car_filters({"q": str(rng.randint(100, 999))}, using=alias)
+            list(cars_queryset.filter(car_filters)[:9])
+
+    timed("substring search", queries, searches)
+
+    def stream():
+        # server-side cursor on PostgreSQL, see cars/streaming.py
+        for _ in cars_queryset.iterator(chunk_size=chunk_size):
+            pass
+
+    timed("stream all", cars, stream)
+
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the same workload against a temporary SQLite database and a locally started, temporary PostgreSQL server "
+        "(bulk insert, pages of a user, substring searches, streaming of all the cars). "
+        "Needs the PostgreSQL server binaries (initdb, pg_ctl) and must not run as root (PostgreSQL refuses it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cars", type=int, default=100000, help="Number of cars inserted.")
+        parser.add_argument("--users", type=int, default=1000, help="Number of users owning the cars.")
+        parser.add_argument("--queries", type=int, default=200, help="Number of page / search queries.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows fetched at once by the streaming.")
+        parser.add_argument(
+            "--postgres-bin", default=None,
+            help="Directory of the PostgreSQL binaries (default: the directory of initdb on the PATH).",
+        )
+
+    def handle(self, *args, **options):
+        bin_dir = options["postgres_bin"]
+        if bin_dir is None:
+            initdb = shutil.which("initdb")
+            if initdb is None:
+                raise CommandError("initdb was not found on the PATH, pass the PostgreSQL binaries with --postgres-bin.")
+            bin_dir = os.path.dirname(initdb)
+
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            raise CommandError("PostgreSQL does not run as root, run the benchmark as another user.")
+
+        workload = (options["cars"], options["users"], options["queries"], options["chunk_size"])
+        self.stdout.write(f"{options['cars']} cars of {options['users']} users, {options['queries']} queries per read phase")
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            sqlite_settings = {"ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(directory, "benchmark.sqlite3")}
+            with benchmark_database("benchmark_sqlite", sqlite_settings) as alias:
+                results["sqlite"] = run_workload(alias, *workload)
+
+        with local_postgres(bin_dir) as postgres_settings:
+            with benchmark_database("benchmark_postgresql", postgres_settings) as alias:
+                if not has_trigram_indexes(alias):
+                    self.stdout.write(self.style.WARNING(
+                        "pg_trgm is not available on this server: the substring searches scan the table"
+                    ))
+                results["postgresql"] = run_workload(alias, *workload)
+
+        for label, phases in results.items():
+            self.stdout.write(f"  {label}")
+            for phase, operations, seconds in phases:
+                self.stdout.write(
+                    f"    {phase:17} {seconds * 1000:9.1f} ms | {operations / seconds:10.0f} ops/s | "
+                    f"{seconds / operations * 1000:8.3f} ms / op"
+                )
@@ -0,0 +1,93 @@
+import time
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from cars.models import Car
+from cars.serializers import GetCarSerializer
+from utils.fastJson import FastJSONRenderer, FastJSONParser, orjson
+
+User = get_user_model()
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DRF's JSONRenderer / JSONParser with FastJSONRenderer / FastJSONParser (utils/fastJson.py) "
+        "on the car list payload (one page) and the admin list payload (all cars). "
+        "The cars are created in a transaction which is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--cars", type=int, default=10000, help="Number of cars of the admin list.")
+        parser.add_argument("--repeat", type=int, default=20, help="Runs per payload, the best run is reported.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"orjson: {'installed' if orjson is not None else 'not installed (stdlib fallback)'}")
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username="benchmark_json_renderers", password=None)
+                Car.objects.bulk_create(
+                    [
+                        Car(user=user, brand=f"Brand {i % 50}", model=f"Model {i}", motor=f"Motor {i % 5}")
+                        for i in range(options["cars"])
+                    ],
+                    batch_size=1000,
+                )
+                cars = Car.objects.order_by("-createdAt", "-id")
+
+                payloads = {
+                    # same shape as the response of GET /api/cars/?page=1
+                    "car list page": {
+                        "count": options["cars"],
+                        "pages": -(-options["cars"] // 9),
+                        "data": GetCarSerializer(cars[:9], many=True).data,
+                        "page": 1,
+                        "page_size": 9,
+                    },
+                    # same shape as the response of GET /api/cars/admin/
+                    "admin list": GetCarSerializer(cars, many=True).data,
+                }
+
+                for name, payload in payloads.items():
+                    self._compare(name, payload, options["repeat"])
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _compare(self, name, payload, repeat):
+        drf_json = JSONRenderer().render(payload)
+        fast_json = FastJSONRenderer().render(payload)
+        if drf_json != fast_json:
+            raise CommandError(f"The renderers return different JSON for the {name}.")
+
+        render_drf = self._best_time(lambda: JSONRenderer().render(payload), repeat)
+        render_fast = self._best_time(lambda: FastJSONRenderer().render(payload), repeat)
+        parse_drf = self._best_time(lambda: JSONParser().parse(BytesIO(drf_json)), repeat)
+        parse_fast = self._best_time(lambda: FastJSONParser().parse(BytesIO(drf_json)), repeat)
+
+        self.stdout.write(
+            f"{name} ({len(drf_json)} bytes):\n"
+            f"  render: JSONRenderer {render_drf * 1000:9.3f} ms | FastJSONRenderer {render_fast * 1000:9.3f} ms"
+            f" | x{render_drf / render_fast:.1f}\n"
+            f"  parse:  JSONParser   {parse_drf * 1000:9.3f} ms | FastJSONParser   {parse_fast * 1000:9.3f} ms"
+            f" | x{parse_drf / parse_fast:.1f}"
+        )
+
+    @staticmethod
+    def _best_time(function, repeat):
+        times = []
+        for _ in range(max(repeat, 1)):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+        return min(times)
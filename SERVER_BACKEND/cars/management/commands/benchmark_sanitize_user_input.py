@@ -0,0 +1,76 @@
+import copy
+import time
+from unittest import mock
+
+import nh3
+from django.core.management.base import BaseCommand
+
+from cars.bulk import validate_bulk_items
+from utils.sanitizeUserInput import sanitize_user_input, sanitize_user_inputs, _clean_cached
+
+BRANDS = ["Audi", "BMW", "Volkswagen", "Aston Martin", "Škoda", "Mercedes-Benz", "Porsche", "Hyundai"]
+MOTORS = ["Diesel", "Petrol", "Electric", "Hybrid", "Gas"]
+
+
+def sanitize_every_string(data):
+    """
+    The previous sanitize_user_input: nh3.clean on every string value.
+    """
+    for key in data:
+        if type(data[key]) == str:
+            data[key] = nh3.clean(data[key])
+    return data
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sanitization of car payloads with nh3.clean on every string (previous behavior) "
+        "with the fast path / memoized sanitize_user_input, alone and in the validation of a bulk import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--payloads", type=int, default=10000, help="Number of car payloads.")
+        parser.add_argument("--markup-every", type=int, default=100, help="One payload out of N contains HTML (10 distinct values).")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per case, the best run is reported.")
+
+    def handle(self, *args, **options):
+        payloads = [
+            {
+                "brand": BRANDS[i % len(BRANDS)],
+                "model": f"Model {i % 500}" if i % options["markup_every"] else f"<b>Model</b> {i % 10} <script>x</script>",
+                "motor": MOTORS[i % len(MOTORS)],
+            }
+            for i in range(options["payloads"])
+        ]
+
+        def run(function):
+            # every run sanitizes fresh copies (the functions change the payloads in place)
+            copies = copy.deepcopy(payloads)
+            _clean_cached.cache_clear()
+            start = time.perf_counter()
+            function(copies)
+            return time.perf_counter() - start
+
+        def best(function):
+            return min(run(function) for _ in range(max(options["repeat"], 1)))
+
+        cases = {
+            "nh3.clean on every string": lambda items: [sanitize_every_string(data) for data in items],
+            "sanitize_user_input (fast path)": lambda items: [sanitize_user_input(data) for data in items],
+            "sanitize_user_inputs (fast path + memo)": sanitize_user_inputs,
+        }
+
+        self.stdout.write(f"{len(payloads)} car payloads:")
+        baseline = None
+        for name, function in cases.items():
+            elapsed = best(function)
+            baseline = baseline or elapsed
+            self.stdout.write(f"  {name:<42} {elapsed * 1000:9.2f} ms | x{baseline / elapsed:.1f}")
+
+        # the whole validation of a bulk import (serializer fields + sanitization)
+        with mock.patch("cars.serializers.sanitize_user_input", lambda data, memoize=False: sanitize_every_string(data)):
+            before = best(validate_bulk_items)
+        after = best(validate_bulk_items)
+        self.stdout.write(
+            f"  bulk validation, before {before * 1000:9.2f} ms | after {after * 1000:9.2f} ms | x{before / after:.1f}"
+        )
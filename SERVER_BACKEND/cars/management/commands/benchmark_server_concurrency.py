@@ -0,0 +1,78 @@
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+def timed_request(url, headers, timeout):
+    """
+    Send one GET request, return (latency in seconds, HTTP status or None on a connection error).
+    """
+    request = urllib.request.Request(url, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            code = response.status
+    except urllib.error.HTTPError as error:
+        code = error.code
+    except (urllib.error.URLError, OSError):
+        code = None
+    return time.perf_counter() - start, code
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent GET requests to running servers and report throughput and latency percentiles. "
+        "Example: compare the WSGI (SERVER_MODE=wsgi) and the ASGI (SERVER_MODE=asgi) deployments of run_server.sh "
+        "with --url http://127.0.0.1:8000/api/cars/ --url http://127.0.0.1:8001/api/cars/ --session <sessionid cookie>."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", action="append", required=True, help="URL requested (repeat to compare servers).")
+        parser.add_argument("--concurrency", type=int, default=50, help="Number of requests in flight.")
+        parser.add_argument("--requests", type=int, default=1000, help="Number of requests per URL.")
+        parser.add_argument("--session", default=None, help="Value of the sessionid cookie (the car endpoints need a logged in user).")
+        parser.add_argument("--timeout", type=float, default=30, help="Timeout of one request, in seconds.")
+
+    def handle(self, *args, **options):
+        headers = {"Accept": "application/json"}
+        if options["session"]:
+            headers["Cookie"] = f"sessionid={options['session']}"
+
+        self.stdout.write(f"{options['requests']} requests per URL, {options['concurrency']} in flight")
+
+        for url in options["url"]:
+            self.run(url, headers, options)
+
+    def run(self, url, headers, options):
+        # warm up (connections, caches, lazy imports of the workers)
+        for _ in range(min(options["concurrency"], 10)):
+            timed_request(url, headers, options["timeout"])
+
+        lock = threading.Lock()
+        codes = {}
+
+        def one(_):
+            latency, code = timed_request(url, headers, options["timeout"])
+            with lock:
+                codes[code] = codes.get(code, 0) + 1
+            return latency
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            latencies = sorted(executor.map(one, range(options["requests"])))
+        elapsed = time.perf_counter() - start
+
+        percentiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        summary = ", ".join(f"{code or 'error'}: {count}" for code, count in sorted(codes.items(), key=lambda item: str(item[0])))
+
+        self.stdout.write(url)
+        self.stdout.write(
+            f"  {len(latencies) / elapsed:8.1f} req/s | p50 {percentiles[49] * 1000:7.1f} ms | "
+            f"p95 {percentiles[94] * 1000:7.1f} ms | p99 {percentiles[98] * 1000:7.1f} ms | {summary}"
+        )
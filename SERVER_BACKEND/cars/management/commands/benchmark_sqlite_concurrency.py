@@ -0,0 +1,126 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from utils.sqliteTuning import SQLITE_PRAGMAS, apply_sqlite_pragmas, is_database_locked, locked_retry_delays
+
+# Django's default SQLite connection: rollback journal, fsync on every commit, 5 seconds timeout, no retry
+STOCK_PRAGMAS = {"journal_mode": "DELETE", "synchronous": "FULL", "busy_timeout": 5000}
+
+
+def setup_database(path, cars):
+    connection = sqlite3.connect(path)
+    connection.executescript("""
+        CREATE TABLE car (id INTEGER PRIMARY KEY, user_id INTEGER, brand TEXT, model TEXT, motor TEXT);
+        CREATE INDEX car_user ON car (user_id, id);
+        CREATE TABLE user_version (user_id INTEGER PRIMARY KEY, version INTEGER);
+    """)
+    rng = random.Random(0)
+    connection.executemany(
+        "INSERT INTO car (user_id, brand, model, motor) VALUES (?, ?, ?, ?)",
+        ((rng.randint(1, 100), f"Brand {rng.randint(1, 50)}", f"Model {i}", "Diesel") for i in range(cars)),
+    )
+    connection.executemany("INSERT INTO user_version VALUES (?, 0)", ((user_id,) for user_id in range(1, 101)))
+    connection.commit()
+    connection.close()
+
+
+def run_worker(path, pragmas, retry, operations, write_ratio, seed):
+    """
+    One worker process (like a gunicorn worker): reads pages of cars and writes cars
+    (read, insert and counter update in one transaction, like saving a car note).
+    Returns (reads, writes, retries, failures, seconds).
+    """
+    # autocommit mode with explicit BEGIN, like Django
+    connection = sqlite3.connect(path, timeout=pragmas.get("busy_timeout", 5000) / 1000, isolation_level=None)
+    cursor = connection.cursor()
+    apply_sqlite_pragmas(cursor, pragmas)
+
+    rng = random.Random(seed)
+    reads = writes = retries = failures = 0
+
+    def write(user_id):
+        cursor.execute("BEGIN")
+        try:
+            cursor.execute("SELECT COUNT(*) FROM car WHERE user_id = ?", (user_id,))
+            cursor.execute("INSERT INTO car (user_id, brand, model, motor) VALUES (?, 'Audi', 'A4', 'Diesel')", (user_id,))
+            cursor.execute("UPDATE user_version SET version = version + 1 WHERE user_id = ?", (user_id,))
+            cursor.execute("COMMIT")
+        except sqlite3.OperationalError:
+            if connection.in_transaction:
+                cursor.execute("ROLLBACK")
+            raise
+
+    start = time.perf_counter()
+    for _ in range(operations):
+        user_id = rng.randint(1, 100)
+
+        if rng.random() >= write_ratio:
+            cursor.execute("SELECT id, brand, model, motor FROM car WHERE user_id = ? ORDER BY id DESC LIMIT 9", (user_id,))
+            cursor.fetchall()
+            reads += 1
+            continue
+
+        delays = locked_retry_delays() if retry else iter(())
+        while True:
+            try:
+                write(user_id)
+                writes += 1
+                break
+            except sqlite3.OperationalError as error:
+                delay = next(delays, None)
+                if delay is None or not is_database_locked(error):
+                    failures += 1
+                    break
+                retries += 1
+                time.sleep(delay)
+
+    seconds = time.perf_counter() - start
+    connection.close()
+    return reads, writes, retries, failures, seconds
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent reads and writes of several worker processes on one SQLite file, "
+        "with Django's stock connection settings and with the tuned pragmas and retries of utils/sqliteTuning.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Number of worker processes.")
+        parser.add_argument("--operations", type=int, default=500, help="Operations (reads / writes) per worker.")
+        parser.add_argument("--write-ratio", type=float, default=0.3, help="Share of the operations which are writes.")
+        parser.add_argument("--cars", type=int, default=20000, help="Number of cars in the database.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['workers']} workers x {options['operations']} operations, "
+            f"{options['write_ratio']:.0%} writes, {options['cars']} cars"
+        )
+
+        for label, pragmas, retry in (("stock", STOCK_PRAGMAS, False), ("tuned", SQLITE_PRAGMAS, True)):
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "benchmark.sqlite3")
+                setup_database(path, options["cars"])
+
+                start = time.perf_counter()
+                with ProcessPoolExecutor(max_workers=options["workers"]) as executor:
+                    results = list(executor.map(
+                        run_worker,
+                        *zip(*[
+                            (path, pragmas, retry, options["operations"], options["write_ratio"], seed)
+                            for seed in range(options["workers"])
+                        ]),
+                    ))
+                elapsed = time.perf_counter() - start
+
+            reads, writes, retries, failures = (sum(result[i] for result in results) for i in range(4))
+            self.stdout.write(
+                f"  {label}  {(reads + writes) / elapsed:8.0f} ops/s | {writes / elapsed:7.0f} writes/s | "
+                f"retries {retries:5d} | failed writes {failures:5d}"
+            )
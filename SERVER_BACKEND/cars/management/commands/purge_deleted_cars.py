@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from cars.deletion import CARS_UNDO_DELETE_SECONDS, CARS_PURGE_BATCH_SIZE, undo_cutoff, purge_deleted_cars
+from cars.sharding import CAR_SHARDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Hard delete the soft deleted car notes whose undo window (settings.CARS_UNDO_DELETE_SECONDS) is over, "
+        "on every shard, in batches of one transaction each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=int, default=CARS_UNDO_DELETE_SECONDS, help="Purge the cars deleted at least this many seconds ago.")
+        parser.add_argument("--batch-size", type=int, default=CARS_PURGE_BATCH_SIZE, help="Cars deleted per transaction.")
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to wait between two batches.")
+
+    def handle(self, *args, **options):
+        # the same cutoff for all the shards
+        cutoff = undo_cutoff(options["seconds"])
+
+        total = 0
+        for alias in CAR_SHARDS:
+            purged = purge_deleted_cars(cutoff, batch_size=options["batch_size"], using=alias, pause=options["pause"])
+            self.stdout.write(f"{alias}: {purged} car(s) purged")
+            total += purged
+
+        self.stdout.write(self.style.SUCCESS(f"{total} car(s) deleted before {cutoff:%Y-%m-%d %H:%M} purged."))
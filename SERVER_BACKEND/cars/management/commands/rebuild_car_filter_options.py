@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from cars.filter_options import rebuild_filter_options
+from cars.sharding import CAR_SHARDS
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized car filter options (distinct brands and motors) from the cars (hot and archived) of every shard."
+
+    def handle(self, *args, **options):
+        for alias in CAR_SHARDS:
+            rebuild_filter_options(using=alias)
+        self.stdout.write(self.style.SUCCESS("Car filter options rebuilt."))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from utils.replicaRouter import DATABASE_REPLICAS, copy_sqlite_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the SQLite primary database into the SQLite read replicas (settings.DATABASE_REPLICAS) "
+        "with the online backup API. With --interval, the copy is repeated until the command is stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None, help="Seconds between two copies (default: copy once).")
+
+    def handle(self, *args, **options):
+        if not DATABASE_REPLICAS:
+            raise CommandError("No read replica is configured (set DATABASE_REPLICA=True, see settings.py).")
+
+        aliases = [DEFAULT_DB_ALIAS, *DATABASE_REPLICAS]
+        if any(connections[alias].vendor != "sqlite" for alias in aliases):
+            raise CommandError("The primary and the replicas must be SQLite databases.")
+
+        source = connections[DEFAULT_DB_ALIAS].settings_dict["NAME"]
+
+        while True:
+            start = time.perf_counter()
+            for alias in DATABASE_REPLICAS:
+                copy_sqlite_database(source, connections[alias].settings_dict["NAME"])
+            self.stdout.write(f"{len(DATABASE_REPLICAS)} replica(s) synced in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:10
+
+import time
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_filter_options(apps, schema_editor):
+    """
+    Fill the filter options table with the distinct brands and motors of the existing cars.
+    """
+    Car = apps.get_model("cars", "Car")
+    CarFilterOption = apps.get_model("cars", "CarFilterOption")
+    db_alias = schema_editor.connection.alias
+
+    version = time.time_ns() // 1000
+    options = []
+    for kind in ("brand", "motor"):
+        values = Car.objects.using(db_alias).values_list(kind).annotate(count=Count("id")).order_by()
+        options += [CarFilterOption(kind=kind, value=value, count=count, version=version) for value, count in values]
+
+    CarFilterOption.objects.using(db_alias).bulk_create(options)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0002_car_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarFilterOption',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('brand', 'Brand'), ('motor', 'Motor')], max_length=10)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('version', models.PositiveBigIntegerField(db_index=True, default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='carfilteroption',
+            constraint=models.UniqueConstraint(fields=('kind', 'value'), name='unique_car_filter_option'),
+        ),
+        migrations.RunPython(populate_filter_options, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_dimensions(apps, schema_editor):
+    """
+    Create the Brand / Motor rows (case-folded names) of the existing cars and set the references of the cars.
+    One UPDATE per distinct brand / motor string.
+    """
+    Car = apps.get_model("cars", "Car")
+    db_alias = schema_editor.connection.alias
+
+    for field, model_name in (("brand", "Brand"), ("motor", "Motor")):
+        Dimension = apps.get_model("cars", model_name)
+
+        values = Car.objects.using(db_alias).values_list(field, flat=True).distinct().order_by()
+        names = {value: value.strip().casefold() for value in values}
+
+        Dimension.objects.using(db_alias).bulk_create(
+            [Dimension(name=name) for name in set(names.values())], ignore_conflicts=True
+        )
+        ids = dict(Dimension.objects.using(db_alias).values_list("name", "id"))
+
+        for value, name in names.items():
+            Car.objects.using(db_alias).filter(**{field: value}).update(**{f"{field}Ref_id": ids[name]})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0003_car_filter_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Brand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Motor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        # nullable first, filled by populate_dimensions, then required
+        migrations.AddField(
+            model_name='car',
+            name='brandRef',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cars', to='cars.brand'),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='motorRef',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='cars', to='cars.motor'),
+        ),
+        migrations.RunPython(populate_dimensions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='car',
+            name='brandRef',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cars', to='cars.brand'),
+        ),
+        migrations.AlterField(
+            model_name='car',
+            name='motorRef',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='cars', to='cars.motor'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.4 on 2026-10-18 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+FOLDED_FIELDS = {"brand": "brandFolded", "model": "modelFolded", "motor": "motorFolded"}
+
+
+def populate_folded_fields(apps, schema_editor):
+    """
+    Fill the shadow columns of the existing cars (in Python, because casefold is not available in SQL).
+    """
+    Car = apps.get_model("cars", "Car")
+    db_alias = schema_editor.connection.alias
+
+    cars = []
+    for car in Car.objects.using(db_alias).only("id", *FOLDED_FIELDS).iterator(chunk_size=2000):
+        for field, folded_field in FOLDED_FIELDS.items():
+            setattr(car, folded_field, getattr(car, field).strip().casefold())
+        cars.append(car)
+        if len(cars) >= 2000:
+            Car.objects.using(db_alias).bulk_update(cars, list(FOLDED_FIELDS.values()))
+            cars = []
+    if cars:
+        Car.objects.using(db_alias).bulk_update(cars, list(FOLDED_FIELDS.values()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0004_brand_motor_dimensions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='brandFolded',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='modelFolded',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='motorFolded',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(populate_folded_fields, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['user', 'brandFolded'], name='car_user_brand_folded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['user', 'modelFolded'], name='car_user_model_folded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['user', 'motorFolded'], name='car_user_motor_folded_idx'),
+        ),
+    ]
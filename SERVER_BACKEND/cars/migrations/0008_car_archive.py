@@ -0,0 +1,54 @@
+# Generated by Django 5.0.4 on 2026-10-18 16:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0007_car_user_without_db_constraint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedCar',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('brand', models.CharField(max_length=255)),
+                ('model', models.CharField(max_length=255)),
+                ('motor', models.CharField(max_length=255)),
+                ('createdAt', models.DateTimeField()),
+                ('updatedAt', models.DateTimeField()),
+                ('brandFolded', models.CharField(default='', editable=False, max_length=255)),
+                ('modelFolded', models.CharField(default='', editable=False, max_length=255)),
+                ('motorFolded', models.CharField(default='', editable=False, max_length=255)),
+                ('archivedAt', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['updatedAt', 'id'], name='car_updated_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedcar',
+            name='brandRef',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_cars', to='cars.brand'),
+        ),
+        migrations.AddField(
+            model_name='archivedcar',
+            name='motorRef',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='archived_cars', to='cars.motor'),
+        ),
+        migrations.AddField(
+            model_name='archivedcar',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='archived_cars', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedcar',
+            index=models.Index(fields=['user', '-createdAt', '-id'], name='archived_car_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.4 on 2026-10-18 16:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0008_car_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_user_created_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='car',
+            name='car_created_id_idx',
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='deletedAt',
+            field=models.DateTimeField(blank=True, default=None, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('deletedAt__isnull', True)), fields=['user', '-createdAt', '-id'], name='car_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('deletedAt__isnull', True)), fields=['-createdAt', '-id'], name='car_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('deletedAt__isnull', False)), fields=['deletedAt', 'id'], name='car_deleted_id_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.4 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0009_car_soft_delete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CarFilterOptionVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:05
+
+from django.db import migrations
+
+
+def remove_model_options(apps, schema_editor):
+    """
+    Delete the car models from the filter options table: they were counted by an earlier version of the migrations,
+    nothing reads them (the suggestions are built from the cars of the user, see suggest.py).
+    """
+    CarFilterOption = apps.get_model("cars", "CarFilterOption")
+    CarFilterOption.objects.using(schema_editor.connection.alias).filter(kind="model").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0010_car_filter_option_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_model_options, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cars', '0011_remove_car_filter_option_models'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='CarFilterOptionVersion',
+        ),
+    ]
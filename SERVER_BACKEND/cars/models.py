@@ -1,19 +1,334 @@
-from django.db import models
+from django.db import models, router, transaction
 # from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
 
+from .sharding import car_shard_for_user, shard_db
+
 User = get_user_model()
 
 # Create your models here.
 
+def fold(value):
+    """
+    Return the canonical, case-folded form of a brand / model / motor string,
+    used by the lookup tables and the shadow columns: " ŠKODA" --> "škoda"
+    """
+    return value.strip().casefold()
+
+
+class DimensionManager(models.Manager):
+    """
+    Manager of the Brand / Motor lookup tables.
+
+    Every distinct (case-folded) name gets ONE row with a small integer id ("interning"):
+    "Audi", "AUDI" and " audi" all map to the row "audi".
+    The ids of the names already seen by this process are kept in memory, so saving a car with a known
+    brand does not query the lookup table. Ids are only remembered after their transaction has committed,
+    so a rolled back insert is never reused.
+    """
+
+    # maximum number of remembered names per database (the lookup tables grow with the user input)
+    MAX_CACHED_NAMES = 10000
+
+    def __init__(self):
+        super().__init__()
+        self._ids = {}
+
+    @staticmethod
+    def canonical(value):
+        """
+        Return the canonical (case-folded) name of a brand / motor.
+        """
+        return fold(value)
+
+    def _write_db(self, using):
+        return using or self._db or router.db_for_write(self.model)
+
+    def intern_many(self, values, using=None):
+        """
+        Return {value: id} for the given brand / motor strings. Missing names are inserted.
+        One SELECT and one INSERT at most, whatever the number of values.
+        """
+        db = self._write_db(using)
+        cached_ids = self._ids.setdefault(db, {})
+
+        names = {self.canonical(value) for value in values}
+        ids = {name: cached_ids[name] for name in names if name in cached_ids}
+
+        missing = names - ids.keys()
+        if missing:
+            queryset = self.get_queryset().using(db)
+            # ignore_conflicts: the name may have been inserted by a concurrent request
+            queryset.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            found = dict(queryset.filter(name__in=missing).values_list("name", "id"))
+            ids.update(found)
+
+            def remember():
+                if len(cached_ids) + len(found) > self.MAX_CACHED_NAMES:
+                    cached_ids.clear()
+                cached_ids.update(found)
+            transaction.on_commit(remember, using=db)
+
+        return {value: ids[self.canonical(value)] for value in values}
+
+    def intern(self, value, using=None):
+        """
+        Return the id of the brand / motor string (inserted if missing).
+        """
+        return self.intern_many([value], using=using)[value]
+
+    def matching_ids(self, values, using=None):
+        """
+        Return the ids of the names which contain at least one of the values (case-insensitive substring match,
+        the same semantics as "icontains" on the cars table). The lookup table is small,
+        so this is cheap compared to comparing the strings of every car.
+        """
+        return list(self._matching(values, using))
+
+    async def amatching_ids(self, values, using=None):
+        """
+        Async version of matching_ids.
+        """
+        return [name_id async for name_id in self._matching(values, using)]
+
+    def _matching(self, values, using):
+        queries = models.Q()
+        for value in values:
+            queries |= models.Q(name__contains=self.canonical(value))
+        return self.get_queryset().using(using or self.db).filter(queries).values_list("id", flat=True)
+
+
+class Brand(models.Model):
+    """
+    Lookup table of the car brands (case-folded), referenced by Car.brandRef.
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = DimensionManager()
+
+    def __str__(self):
+        return self.name
+
+
+class Motor(models.Model):
+    """
+    Lookup table of the car motors (case-folded), referenced by Car.motorRef.
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = DimensionManager()
+
+    def __str__(self):
+        return self.name
+
+
+class UserShardManager(models.Manager):
+    """
+    Manager of the models stored on the shard of their user (see sharding.py).
+    """
+
+    def of_user(self, user):
+        """
+        Return the rows of the user, on the shard of the user (see sharding.py).
+        """
+        return self.using(shard_db(car_shard_for_user(user.id))).filter(user=user)
+
+
+class CarManager(UserShardManager):
+    """
+    Default manager of the cars: the soft deleted cars (tombstones, see deletion.py) are excluded.
+    Car.all_objects also returns the tombstones.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deletedAt__isnull=True)
+
+    def create(self, **kwargs):
+        # QuerySet.create would save the car on the database of the queryset (the primary database),
+        # save() lets the router choose the shard of the car's user (see sharding.py)
+        car = self.model(**kwargs)
+        car.save(force_insert=True, using=self._db)
+        return car
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create does not call save(): set the brand / motor ids of all the cars here (2 lookups in total)
+        # and the shadow columns
+        objs = list(objs)
+        using = self._db or router.db_for_write(self.model)
+        brand_ids = Brand.objects.intern_many([car.brand for car in objs], using=using)
+        motor_ids = Motor.objects.intern_many([car.motor for car in objs], using=using)
+        for car in objs:
+            car.brandRef_id = brand_ids[car.brand]
+            car.motorRef_id = motor_ids[car.motor]
+            car.set_folded_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Car(models.Model):
-    user = models.ForeignKey(User, on_delete = models.CASCADE)
+    # The users are on the primary database, the cars may be on another shard (see sharding.py):
+    # no foreign key constraint in the database (the cars of a deleted user are deleted by signals.py on the other shards).
+    user = models.ForeignKey(User, on_delete = models.CASCADE, db_constraint=False)
     brand = models.CharField(max_length=255)
     model = models.CharField(max_length=255)
     motor = models.CharField(max_length=255)
     createdAt = models.DateTimeField(auto_now_add=True)
     updatedAt = models.DateTimeField(auto_now=True)
 
+    # Integer references to the normalized brand / motor (see Brand and Motor).
+    # The API still reads and writes the brand / motor strings above (as the user typed them),
+    # the filters compare these small integers instead of the strings.
+    # Set automatically by save() and by Car.objects.bulk_create().
+    brandRef = models.ForeignKey(Brand, on_delete=models.PROTECT, related_name="cars")
+    motorRef = models.ForeignKey(Motor, on_delete=models.PROTECT, related_name="cars")
+
+    # Case-folded copies of brand / model / motor (see fold), with an index each.
+    # "icontains" / "iexact" on the original columns cannot use a normal index on SQLite,
+    # the exact and prefix filters (?brand_exact=, ?brand_prefix=, ...) compare these columns instead (see filters.py).
+    # Set automatically by save() and by Car.objects.bulk_create().
+    brandFolded = models.CharField(max_length=255, default="", editable=False)
+    modelFolded = models.CharField(max_length=255, default="", editable=False)
+    motorFolded = models.CharField(max_length=255, default="", editable=False)
+
+    # the shadow column of each field
+    FOLDED_FIELDS = {"brand": "brandFolded", "model": "modelFolded", "motor": "motorFolded"}
+
+    # SOFT DELETE: deleting a car only sets deletedAt (one UPDATE), the row stays as a tombstone
+    # during the undo window and is removed later by the purge job (see deletion.py).
+    deletedAt = models.DateTimeField(null=True, blank=True, default=None, editable=False)
+
+    # the default manager excludes the tombstones (first manager = default manager)
+    objects = CarManager()
+    all_objects = UserShardManager()
+
+    class Meta:
+        indexes = [
+            # Used by the keyset (cursor) pagination of the list views of a user:
+            # WHERE user_id = ? AND createdAt <= ? ... ORDER BY createdAt DESC, id DESC
+            # The database seeks directly to the cursor position instead of scanning an OFFSET.
+            # Partial index of the live cars: the queries of the default manager (deletedAt IS NULL) use it,
+            # the tombstones are not in it.
+            models.Index(
+                fields=["user", "-createdAt", "-id"], condition=models.Q(deletedAt__isnull=True), name="car_user_created_id_idx"
+            ),
+
+            # Same as above, but for the admin list view (cars of all users).
+            models.Index(fields=["-createdAt", "-id"], condition=models.Q(deletedAt__isnull=True), name="car_created_id_idx"),
+
+            # Exact and prefix filters of the list views of a user:
+            # WHERE user_id = ? AND brandFolded = ?  /  WHERE user_id = ? AND brandFolded >= ? AND brandFolded < ?
+            models.Index(fields=["user", "brandFolded"], name="car_user_brand_folded_idx"),
+            models.Index(fields=["user", "modelFolded"], name="car_user_model_folded_idx"),
+            models.Index(fields=["user", "motorFolded"], name="car_user_motor_folded_idx"),
+
+            # Used by the archive job: WHERE updatedAt < ? ORDER BY updatedAt, id (see archive.py)
+            models.Index(fields=["updatedAt", "id"], name="car_updated_id_idx"),
+
+            # Partial index of the tombstones only, used by the purge job:
+            # WHERE deletedAt IS NOT NULL AND deletedAt < ? ORDER BY deletedAt, id (see deletion.py)
+            models.Index(fields=["deletedAt", "id"], condition=models.Q(deletedAt__isnull=False), name="car_deleted_id_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        # keep the brand / motor ids in sync with the brand / motor strings
+        using = kwargs.get("using") or router.db_for_write(type(self), instance=self)
+        self.brandRef_id = Brand.objects.intern(self.brand, using=using)
+        self.motorRef_id = Motor.objects.intern(self.motor, using=using)
+        self.set_folded_fields()
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "brand" in update_fields:
+                update_fields.add("brandRef")
+            if "motor" in update_fields:
+                update_fields.add("motorRef")
+            for field, folded_field in self.FOLDED_FIELDS.items():
+                if field in update_fields:
+                    update_fields.add(folded_field)
+            kwargs["update_fields"] = update_fields
+
+        super().save(*args, **kwargs)
+
+    def set_folded_fields(self):
+        """
+        Update the shadow columns (brandFolded, modelFolded, motorFolded) from brand, model and motor.
+        """
+        for field, folded_field in self.FOLDED_FIELDS.items():
+            setattr(self, folded_field, fold(getattr(self, field)))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the values loaded from the database,
+        # so that the signal receivers can find out which values changed when the car is saved (see signals.py)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
+class ArchivedCar(models.Model):
+    """
+    Cold storage of the car notes which were not updated for a long time (see archive.py).
+
+    Same columns as Car (a car keeps its id when it is archived, and when it is moved back to the hot table),
+    plus the time it was archived. The default list queries only read the (smaller) cars_car table,
+    the archive is only read for ?include_archived=1 and for the detail of an archived car.
+    Like the cars, the archived cars of a user are on the shard of the user (see sharding.py).
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name="archived_cars")
+    brand = models.CharField(max_length=255)
+    model = models.CharField(max_length=255)
+    motor = models.CharField(max_length=255)
+    createdAt = models.DateTimeField()
+    updatedAt = models.DateTimeField()
+
+    # same references and shadow columns as Car, so that the same filters work on both tables (see filters.py)
+    brandRef = models.ForeignKey(Brand, on_delete=models.PROTECT, related_name="archived_cars")
+    motorRef = models.ForeignKey(Motor, on_delete=models.PROTECT, related_name="archived_cars")
+    brandFolded = models.CharField(max_length=255, default="", editable=False)
+    modelFolded = models.CharField(max_length=255, default="", editable=False)
+    motorFolded = models.CharField(max_length=255, default="", editable=False)
+
+    archivedAt = models.DateTimeField()
+
+    objects = UserShardManager()
+
+    class Meta:
+        indexes = [
+            # the archived cars of a user, in the order of the lists (see Car)
+            models.Index(fields=["user", "-createdAt", "-id"], name="archived_car_user_created_idx"),
+        ]
+
+
+class CarFilterOption(models.Model):
+    """
+    Materialized list of the distinct car brands and motors, used by ProductFilterOptionsView.
+    Every row is a distinct value with the number of cars which use it.
+    The rows are updated incrementally when cars are created, updated or deleted (see filter_options.py),
+    so the view never has to scan the whole cars table with SELECT DISTINCT.
+    """
+
+    BRAND = "brand"
+    MOTOR = "motor"
+    KIND_CHOICES = [
+        (BRAND, "Brand"),
+        (MOTOR, "Motor"),
+    ]
+
+    # the Car fields of the kinds, in the order of the value tuples of apply_filter_option_changes
+    KINDS = (BRAND, MOTOR)
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=255)
 
+    # number of cars with this brand / motor. Values with count 0 are kept (and hidden), see filter_options.py.
+    count = models.PositiveIntegerField(default=0)
 
+    # increases with every change of the table. The workers compare the highest version
+    # with the version of their in-process copy to know when to reload it.
+    version = models.PositiveBigIntegerField(default=0, db_index=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "value"], name="unique_car_filter_option"),
+        ]
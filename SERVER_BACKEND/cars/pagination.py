@@ -0,0 +1,391 @@
+import base64
+import heapq
+import json
+from datetime import datetime
+
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from .caching import get_cached_count, aget_cached_count
+from .sharding import for_each_shard
+
+# Keyset (cursor) pagination for the car notes.
+#
+# Instead of "skip N rows and count all rows" (OFFSET + COUNT(*)), the client sends
+# an opaque cursor which encodes the position (createdAt, id) of the last (or first) car it has seen.
+# The database then seeks directly to that position using the composite index
+# (user_id, createdAt DESC, id DESC) defined in models.py, so every page costs the same,
+# no matter how deep the user pages.
+#
+# Example:
+#   GET /api/cars/?cursor=             --> first page + "next" cursor
+#   GET /api/cars/?cursor=<next>       --> following page + "next" and "previous" cursors
+#   GET /api/cars/?cursor=<previous>   --> page before
+#
+# No COUNT(*) query is executed in this mode.
+
+CURSOR_QUERY_PARAM = "cursor"
+
+# Ordering used by all car lists. "id" breaks the ties between cars created at the same time.
+CURSOR_ORDERING = ("-createdAt", "-id")
+REVERSE_CURSOR_ORDERING = ("createdAt", "id")
+
+NEXT = "n"
+PREVIOUS = "p"
+
+# the car ids are 64-bit signed integers (BigAutoField): a cursor with a larger id is invalid
+MAX_CAR_ID = 2 ** 63 - 1
+
+
+def encode_cursor(created_at, car_id, direction, archived=False):
+    """
+    Encode the position (createdAt, id) and the direction into an opaque, url safe token.
+    archived: the position is in the archived cars (?include_archived=1, see paginate_by_cursor_with_archive).
+    """
+    payload = {"c": created_at.isoformat(), "i": car_id, "d": direction}
+    if archived:
+        payload["a"] = 1
+    payload = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Decode a token created by encode_cursor.
+    Returns a (createdAt, id, direction, archived) tuple or None if the token is missing or invalid.
+    """
+    if not token:
+        return None
+
+    try:
+        padding = "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(token + padding))
+        created_at = datetime.fromisoformat(payload["c"])
+        car_id = payload["i"]
+        direction = payload["d"]
+        archived = bool(payload.get("a"))
+    except (ValueError, TypeError, KeyError, AttributeError, OverflowError):
+        return None
+
+    # the id must be an integer written by encode_cursor (not a float like 1e308 or Infinity, nor a boolean)
+    if type(car_id) is not int or not 0 <= car_id <= MAX_CAR_ID:
+        return None
+
+    if direction not in (NEXT, PREVIOUS):
+        return None
+
+    return created_at, car_id, direction, archived
+
+
+def _car_position(car):
+    return car.createdAt, car.id
+
+
+def paginate_by_cursor(queryset, cursor, page_size, position=_car_position):
+    """
+    Return the page of cars which follows (or precedes) the position encoded in the cursor.
+
+    position returns the (createdAt, id) of a car of the queryset. By default the queryset returns
+    Car instances, pass another function for querysets returning rows (e.g. values_list()).
+
+    Implements the SAME fallback behavior as the page number pagination:
+    - If the cursor is missing / invalid --> return the first page
+
+    Returns a (cars, next_cursor, previous_cursor) tuple.
+    The cursors are None if there is no next / previous page.
+    """
+    cursor_position = decode_cursor(cursor)
+    cars = list(_cursor_page_queryset(queryset, cursor_position, page_size))
+    return _cursor_page(cars, cursor_position, page_size, position)
+
+
+async def apaginate_by_cursor(queryset, cursor, page_size, position=_car_position):
+    """
+    Async version of paginate_by_cursor (the page is read with the async ORM).
+    """
+    cursor_position = decode_cursor(cursor)
+    cars = [car async for car in _cursor_page_queryset(queryset, cursor_position, page_size)]
+    return _cursor_page(cars, cursor_position, page_size, position)
+
+
+def paginate_by_cursor_across_shards(queryset_for_shard, cursor, page_size, position=_car_position):
+    """
+    Same as paginate_by_cursor, for the cars of all the shards (see sharding.py).
+    queryset_for_shard(alias) returns the queryset of the shard. The page is read from every shard
+    in parallel (page_size + 1 rows each) and the rows are merged by position (createdAt, id).
+    """
+    cursor_position = decode_cursor(cursor)
+    pages = for_each_shard(
+        lambda alias: list(_cursor_page_queryset(queryset_for_shard(alias), cursor_position, page_size))
+    )
+    return _cursor_page(_merge_cursor_pages(pages, cursor_position, page_size, position), cursor_position, page_size, position)
+
+
+def _merge_cursor_pages(pages, cursor_position, page_size, position):
+    """
+    Merge the pages read by _cursor_page_queryset on several shards into one page (page_size + 1 rows at most),
+    in the order of the pages: descending, ascending when walking to the previous page.
+    """
+    descending = cursor_position is None or cursor_position[2] == NEXT
+    return list(heapq.merge(*pages, key=position, reverse=descending))[:page_size + 1]
+
+
+def _cursor_page_queryset(queryset, cursor_position, page_size):
+    """
+    Return the queryset of the page at the decoded cursor position (None: first page).
+    It fetches one extra row to know if there is a next page, without counting.
+    """
+    # First page
+    if cursor_position is None:
+        return queryset.order_by(*CURSOR_ORDERING)[:page_size + 1]
+
+    created_at, car_id, direction, archived = cursor_position
+
+    if direction == NEXT:
+        # (createdAt, id) < (created_at, car_id)
+        # The "createdAt <= created_at" term gives the database a range bound on the index.
+        seek = Q(createdAt__lte=created_at) & (Q(createdAt__lt=created_at) | Q(id__lt=car_id))
+        return queryset.filter(seek).order_by(*CURSOR_ORDERING)[:page_size + 1]
+
+    # direction == PREVIOUS
+    # (createdAt, id) > (created_at, car_id), walked in the opposite direction and reversed afterwards
+    seek = Q(createdAt__gte=created_at) & (Q(createdAt__gt=created_at) | Q(id__gt=car_id))
+    return queryset.filter(seek).order_by(*REVERSE_CURSOR_ORDERING)[:page_size + 1]
+
+
+def _cursor_page(cars, cursor_position, page_size, position, archived=None):
+    """
+    Return the (cars, next_cursor, previous_cursor) of the rows read by _cursor_page_queryset.
+    archived(car) tells if the car was read from the archive (default: no car is archived).
+    """
+    has_more = len(cars) > page_size
+
+    def cursor(car, direction):
+        return encode_cursor(*position(car), direction, archived=archived is not None and archived(car))
+
+    # First page
+    if cursor_position is None:
+        cars = cars[:page_size]
+        next_cursor = cursor(cars[-1], NEXT) if has_more else None
+        return cars, next_cursor, None
+
+    if cursor_position[2] == NEXT:
+        cars = cars[:page_size]
+        next_cursor = cursor(cars[-1], NEXT) if has_more else None
+        previous_cursor = cursor(cars[0], PREVIOUS) if cars else None
+        return cars, next_cursor, previous_cursor
+
+    # direction == PREVIOUS
+    cars = cars[:page_size][::-1]
+    next_cursor = cursor(cars[-1], NEXT) if cars else None
+    previous_cursor = cursor(cars[0], PREVIOUS) if has_more else None
+    return cars, next_cursor, previous_cursor
+
+
+# HOT + ARCHIVED CARS (?include_archived=1, see archive.py)
+# The list is the hot cars (cars_car) FOLLOWED by the archived cars, both ordered by (createdAt, id).
+# The archive is read lazily: only by the pages which reach past the last hot car.
+
+def _archive_page_querysets(queryset, archived_queryset, cursor_position, page_size):
+    """
+    Return ((archived, page queryset), continuation) for the keyset pagination over the hot cars of queryset
+    followed by the cars of archived_queryset.
+    The page queryset reads the page at the cursor position, in the table of the cursor (the hot table by default).
+    If that page is short, the page continues with the first rows of the other table in the walking direction:
+    continuation is (archived, ordered queryset) or None if there is no other table in that direction.
+    """
+    in_archive = cursor_position is not None and cursor_position[3]
+    walking_back = cursor_position is not None and cursor_position[2] == PREVIOUS
+
+    # the tables in the walking direction: hot then archived, archived then hot when walking back
+    tables = [(False, queryset), (True, archived_queryset)]
+    ordering = CURSOR_ORDERING
+    if walking_back:
+        tables.reverse()
+        ordering = REVERSE_CURSOR_ORDERING
+
+    start = 1 if in_archive != walking_back else 0
+    table_archived, table_queryset = tables[start]
+    page = (table_archived, _cursor_page_queryset(table_queryset, cursor_position, page_size))
+
+    continuation = None
+    if start + 1 < len(tables):
+        next_archived, next_queryset = tables[start + 1]
+        continuation = (next_archived, next_queryset.order_by(*ordering))
+
+    return page, continuation
+
+
+def paginate_by_cursor_with_archive(queryset, archived_queryset, cursor, page_size, position=_car_position):
+    """
+    Same as paginate_by_cursor, over the hot cars of queryset followed by the archived cars of archived_queryset.
+    The archive is only queried when the page reaches past the last hot car (or, walking back, the first archived car).
+    The cursors remember the table of their position.
+    """
+    cursor_position = decode_cursor(cursor)
+    (archived, page_queryset), continuation = _archive_page_querysets(queryset, archived_queryset, cursor_position, page_size)
+
+    rows = [(archived, row) for row in page_queryset]
+    if continuation is not None and len(rows) <= page_size:
+        archived, next_queryset = continuation
+        rows += [(archived, row) for row in next_queryset[:page_size + 1 - len(rows)]]
+
+    return _untag_cursor_page(rows, cursor_position, page_size, position)
+
+
+async def apaginate_by_cursor_with_archive(queryset, archived_queryset, cursor, page_size, position=_car_position):
+    """
+    Async version of paginate_by_cursor_with_archive.
+    """
+    cursor_position = decode_cursor(cursor)
+    (archived, page_queryset), continuation = _archive_page_querysets(queryset, archived_queryset, cursor_position, page_size)
+
+    rows = [(archived, row) async for row in page_queryset]
+    if continuation is not None and len(rows) <= page_size:
+        archived, next_queryset = continuation
+        rows += [(archived, row) async for row in next_queryset[:page_size + 1 - len(rows)]]
+
+    return _untag_cursor_page(rows, cursor_position, page_size, position)
+
+
+def _untag_cursor_page(rows, cursor_position, page_size, position):
+    """
+    _cursor_page for (archived, row) tuples, returns the rows without their tag.
+    """
+    rows, next_cursor, previous_cursor = _cursor_page(
+        rows, cursor_position, page_size, position=lambda tagged: position(tagged[1]), archived=lambda tagged: tagged[0]
+    )
+    return [row for archived, row in rows], next_cursor, previous_cursor
+
+
+class HotThenArchivedRows:
+    """
+    The rows of the hot queryset followed by the rows of the archived queryset, as the object list of a Paginator
+    (page number pagination with ?include_archived=1). The counts of both querysets are given (cached, see caching.py).
+    A page (slice) only queries the table(s) it overlaps: the archive is not read for the pages of hot cars.
+    Iterate the slices with "for" or with "async for".
+    """
+
+    def __init__(self, queryset, archived_queryset, count, archived_count):
+        self.parts = [(queryset, count), (archived_queryset, archived_count)]
+
+    def count(self):
+        return sum(count for queryset, count in self.parts)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.step is not None:
+            raise TypeError(f"{type(self).__name__} only supports slices without step.")
+
+        start, stop, _ = index.indices(self.count())
+        querysets = []
+        offset = 0
+        for queryset, count in self.parts:
+            # the part of the slice within this queryset
+            bottom, top = max(start - offset, 0), min(stop - offset, count)
+            if bottom < top:
+                querysets.append(queryset[bottom:top])
+            offset += count
+        return _ChainedRows(querysets)
+
+
+class _ChainedRows:
+    """
+    The rows of several (sliced) querysets, one after the other. Lazy: the querysets run when the rows are iterated.
+    """
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+
+    def __iter__(self):
+        for queryset in self.querysets:
+            yield from queryset
+
+    async def __aiter__(self):
+        for queryset in self.querysets:
+            async for row in queryset:
+                yield row
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Django Paginator which reads the total number of cars (count) from the per-user count cache
+    instead of running a COUNT(*) query on every request.
+
+    The cached count is keyed by (user id, user data version, normalized brand/motor/q filters)
+    and is invalidated when the user creates, updates or deletes a car (see caching.py and signals.py).
+    """
+
+    def __init__(self, object_list, per_page, user_id, params, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.user_id = user_id
+        self.params = params
+
+    @cached_property
+    def count(self):
+        return get_cached_count(
+            user_id=self.user_id,
+            params=self.params,
+            count=lambda: Paginator.count.func(self),
+        )
+
+
+def paginator_with_archive(queryset, archived_queryset, per_page, user_id, params):
+    """
+    Return a Paginator over the hot cars of queryset followed by the archived cars of archived_queryset
+    (see HotThenArchivedRows). Both counts are read from the per-user count cache, like CachedCountPaginator.
+    """
+    rows = HotThenArchivedRows(
+        queryset,
+        archived_queryset,
+        count=get_cached_count(user_id=user_id, params=params, count=queryset.count),
+        archived_count=get_cached_count(
+            user_id=user_id, params=params, count=archived_queryset.count, prefix="archived_count"
+        ),
+    )
+    return Paginator(rows, per_page)
+
+
+async def apaginate_by_page(queryset, page, per_page, user_id, params):
+    """
+    Async version of the page number pagination of the list view (CachedCountPaginator + its fallbacks):
+    - If the page is not an integer --> first page
+    - If the page is out of range --> last page
+    Returns a (rows, paginator, page number) tuple.
+    """
+    paginator = Paginator(queryset, per_page)
+    # the cached count is set before the paginator needs it, so the paginator itself never queries the database
+    paginator.count = await aget_cached_count(user_id=user_id, params=params, count=queryset.acount)
+    return await _aread_page(paginator, page)
+
+
+async def apaginate_by_page_with_archive(queryset, archived_queryset, page, per_page, user_id, params):
+    """
+    Same as apaginate_by_page, over the hot cars of queryset followed by the archived cars of archived_queryset
+    (see HotThenArchivedRows). Both counts are read from the per-user count cache.
+    """
+    rows = HotThenArchivedRows(
+        queryset,
+        archived_queryset,
+        count=await aget_cached_count(user_id=user_id, params=params, count=queryset.acount),
+        archived_count=await aget_cached_count(
+            user_id=user_id, params=params, count=archived_queryset.acount, prefix="archived_count"
+        ),
+    )
+    return await _aread_page(Paginator(rows, per_page), page)
+
+
+async def _aread_page(paginator, page):
+    try:
+        cars_page = paginator.page(page)
+    except PageNotAnInteger:
+        cars_page = paginator.page(1)
+    except EmptyPage:
+        cars_page = paginator.page(paginator.num_pages)
+
+    # the page is a lazy slice of the queryset
+    rows = [row async for row in cars_page.object_list]
+    return rows, paginator, cars_page.number
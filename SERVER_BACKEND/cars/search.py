@@ -0,0 +1,181 @@
+from asgiref.sync import sync_to_async
+from django.db import connections, transaction, DEFAULT_DB_ALIAS, DatabaseError, OperationalError
+from django.db.models.expressions import RawSQL
+
+# Full-text search index over Car.brand, Car.model and Car.motor (SQLite FTS5).
+#
+# The index is an "external content" FTS5 table: it does not store a second copy of the text,
+# it only stores the trigram index and points to the rows of the cars_car table (rowid = car id).
+# Triggers on cars_car keep the index in sync on every INSERT / UPDATE / DELETE,
+# also for bulk operations (bulk_create, queryset.update(), queryset.delete()) which bypass Django signals.
+#
+# The "trigram" tokenizer indexes every 3 character sequence, so a MATCH query is an index lookup
+# with the SAME semantics as "icontains" (case-insensitive substring match),
+# instead of a "LIKE '%value%'" full table scan.
+# Values shorter than 3 characters cannot be looked up in a trigram index,
+# for these values the filters fall back to "icontains".
+#
+# On other databases (or if the SQLite build has no FTS5 / trigram support), the filters always use "icontains".
+#
+# On PostgreSQL, "icontains" is "UPPER(column::text) LIKE UPPER('%value%')": GIN indexes of the pg_trgm extension
+# on exactly these expressions (create_trigram_indexes) turn it into an index lookup as well, for the values
+# of at least 3 characters (the planner chooses, the queries are the same as without the indexes).
+
+FTS_TABLE = "cars_car_fts"
+FTS_COLUMNS = ("brand", "model", "motor")
+
+# trigram tokenizer: only values with at least 3 characters can use the index
+FTS_MIN_VALUE_LENGTH = 3
+
+# PostgreSQL: one trigram index per searched column (name --> indexed column)
+TRIGRAM_INDEXES = {f"cars_car_{column}_trgm_idx": column for column in FTS_COLUMNS}
+
+# database aliases which have a usable search index (filled lazily)
+_search_index_available = {}
+
+
+def create_search_index(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS5 table and the triggers which keep it in sync with cars_car, if they don't exist.
+    Safe to call many times. Called after every "migrate" (see apps.py), because SQLite migrations
+    which rebuild the cars_car table drop its triggers.
+    On PostgreSQL, create the trigram indexes instead (see create_trigram_indexes).
+    """
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        create_trigram_indexes(using=using)
+        return
+    if connection.vendor != "sqlite":
+        return
+
+    columns = ", ".join(FTS_COLUMNS)
+    new_columns = ", ".join(f"new.{column}" for column in FTS_COLUMNS)
+    old_columns = ", ".join(f"old.{column}" for column in FTS_COLUMNS)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN (%s, %s, %s, %s, %s)",
+            ["cars_car", FTS_TABLE, f"{FTS_TABLE}_ai", f"{FTS_TABLE}_ad", f"{FTS_TABLE}_au"],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+
+        # the cars app is not migrated (yet) on this database
+        if "cars_car" not in existing:
+            return
+        existing.discard("cars_car")
+
+        if len(existing) == 4:
+            _search_index_available[using] = True
+            return
+
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{columns}, content='cars_car', content_rowid='id', tokenize='trigram')"
+            )
+        except OperationalError:
+            # SQLite was compiled without FTS5 or is older than 3.34 (no trigram tokenizer)
+            _search_index_available[using] = False
+            return
+
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON cars_car BEGIN "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_columns}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON cars_car BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_columns}); END"
+        )
+        cursor.execute(
+            f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON cars_car BEGIN "
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.id, {old_columns}); "
+            f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new_columns}); END"
+        )
+
+        # rows written while the triggers were missing are not indexed --> rebuild the whole index
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    _search_index_available[using] = True
+
+
+def create_trigram_indexes(using=DEFAULT_DB_ALIAS):
+    """
+    PostgreSQL: create the pg_trgm extension and the GIN trigram indexes used by the "icontains" filters
+    of cars_car, if they don't exist. Returns False if the extension is not available
+    (not installed on the server, or the user may not create it): the filters then scan the table.
+    """
+    with connections[using].cursor() as cursor:
+        # the cars app is not migrated (yet) on this database
+        cursor.execute("SELECT to_regclass('cars_car')")
+        if cursor.fetchone()[0] is None:
+            return False
+
+        try:
+            # savepoint: a failed statement aborts the whole transaction on PostgreSQL
+            with transaction.atomic(using=using):
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except DatabaseError:
+            return False
+
+        for name, column in TRIGRAM_INDEXES.items():
+            # same expression as the left side of Django's icontains lookup
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON cars_car USING gin ((UPPER("{column}"::text)) gin_trgm_ops)'
+            )
+
+    return True
+
+
+def search_index_available(using=DEFAULT_DB_ALIAS):
+    """
+    Return True if the database has a usable full-text search index for the cars.
+    """
+    if using not in _search_index_available:
+        connection = connections[using]
+        if connection.vendor != "sqlite":
+            _search_index_available[using] = False
+        else:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE name = %s", [FTS_TABLE])
+                _search_index_available[using] = cursor.fetchone() is not None
+
+    return _search_index_available[using]
+
+
+async def asearch_index_available(using=DEFAULT_DB_ALIAS):
+    """
+    Async version of search_index_available. The database is only checked once per process.
+    """
+    if using in _search_index_available:
+        return _search_index_available[using]
+    return await sync_to_async(search_index_available)(using)
+
+
+def _quote(value):
+    """
+    Quote a value as an FTS5 string (phrase), so that operators in the user input have no effect.
+    """
+    return '"' + value.replace('"', '""') + '"'
+
+
+def match_all_terms(terms):
+    """
+    FTS5 expression: every term is contained in at least one of the indexed columns (AND logic).
+    Example: "audi" AND "diesel"
+    """
+    return " AND ".join(_quote(term) for term in terms)
+
+
+def matching_car_ids(expression):
+    """
+    Subquery which returns the ids of the cars matching the FTS5 expression.
+    Use it as: Car.objects.filter(id__in=matching_car_ids(expression))
+    """
+    return RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+
+
+def can_use_index(values):
+    """
+    Return True if all the values can be looked up in the trigram index.
+    """
+    return all(len(value) >= FTS_MIN_VALUE_LENGTH for value in values)
@@ -1,11 +1,183 @@
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings, ISO_8601
 from .models import Car
+from .filters import split_filter_values
 from utils.sanitizeUserInput import sanitize_user_input
 
 class GetCarSerializer(serializers.ModelSerializer):
     class Meta:
         model = Car
-        fields = "__all__"
+        # the brand / motor references and the shadow columns are internal (the API returns the strings),
+        # the API never returns soft deleted cars (deletedAt, see deletion.py)
+        exclude = ["brandRef", "motorRef", "brandFolded", "modelFolded", "motorFolded", "deletedAt"]
+
+class FastCarReadSerializer:
+    """
+    Fast, read-only version of GetCarSerializer for the car list / detail views.
+
+    A ModelSerializer builds a Field object per field, loads a model instance per row
+    and calls to_representation for every field of every row.
+    This class reads the rows with queryset.values_list() (plain tuples, no model instances)
+    and only converts the values which need it (the datetimes), with converters which are prepared once.
+
+    The output is the SAME as GetCarSerializer(cars, many=True).data (same keys, same order, same values),
+    so the JSON of the responses does not change.
+    The fields and their formats are read from GetCarSerializer, so the two always stay in sync.
+
+    fields: optional subset of the field names (sparse fieldset). Only these fields are serialized
+    and only their columns are read from the database (plus createdAt and id, used by the cursor pagination).
+
+    Example:
+        FastCarReadSerializer().serialize(Car.objects.filter(user=user))
+        FastCarReadSerializer(fields=["brand", "model"]).serialize(Car.objects.filter(user=user))
+    """
+
+    # field types whose representation is the database value itself
+    PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.PrimaryKeyRelatedField)
+
+    def __init__(self, serializer_class=GetCarSerializer, fields=None):
+        fields = {
+            name: field
+            for name, field in serializer_class().fields.items()
+            if fields is None or name in fields
+        }
+
+        # output keys (in the order of the serializer) and the database columns to read
+        self.field_names = tuple(fields)
+        columns = [field.source for field in fields.values()]
+
+        # the position columns of the cursor pagination are always read.
+        # If they are not output fields, they come after the output columns and are ignored by to_representation.
+        for column in ("createdAt", "id"):
+            if column not in columns:
+                columns.append(column)
+        self.columns = tuple(columns)
+        self._created_at_index = self.columns.index("createdAt")
+        self._id_index = self.columns.index("id")
+
+        # (index of the column, field) of the values which must be converted
+        self._datetime_fields = []
+        for index, field in enumerate(fields.values()):
+            if isinstance(field, serializers.DateTimeField):
+                self._datetime_fields.append((index, field))
+            elif not isinstance(field, self.PLAIN_FIELDS) or getattr(field, "pk_field", None) is not None:
+                raise ImproperlyConfigured(f"{type(self).__name__} does not support the field '{field.field_name}'.")
+
+    def _datetime_converters(self):
+        """
+        Return the (index, converter) of the datetime values.
+        Built per call, because DRF formats the datetimes in the CURRENT time zone.
+        """
+        converters = []
+        for index, field in self._datetime_fields:
+            output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+            if output_format is None:
+                continue
+            converters.append((index, self._make_datetime_converter(field, output_format)))
+        return converters
+
+    @staticmethod
+    def _make_datetime_converter(field, output_format):
+        # same steps as DateTimeField.to_representation / enforce_timezone,
+        # but the time zone is looked up once per call instead of once per value
+        field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+
+        def to_timezone(value):
+            # the database returns aware datetimes (USE_TZ = True): only convert them to the time zone
+            if field_timezone is not None and value.utcoffset() is not None:
+                return value.astimezone(field_timezone)
+            return field.enforce_timezone(value)
+
+        if output_format.lower() == ISO_8601:
+            def convert(value):
+                if not value:
+                    return None
+                value = to_timezone(value).isoformat()
+                if value.endswith("+00:00"):
+                    value = value[:-6] + "Z"
+                return value
+        else:
+            def convert(value):
+                if not value:
+                    return None
+                return to_timezone(value).strftime(output_format)
+        return convert
+
+    def values_list(self, queryset):
+        """
+        Return the queryset reading only the serialized columns, as tuples.
+        """
+        return queryset.values_list(*self.columns)
+
+    def position(self, row):
+        """
+        Return the (createdAt, id) of a row of values_list(), used by the cursor pagination.
+        """
+        return row[self._created_at_index], row[self._id_index]
+
+    def to_representation(self, rows):
+        """
+        Convert rows of values_list() into the serialized cars (list of dicts).
+        """
+        field_names = self.field_names
+        converters = self._datetime_converters()
+
+        data = []
+        for row in rows:
+            row = list(row)
+            for index, convert in converters:
+                row[index] = convert(row[index])
+            # zip stops at the last output field (the extra position columns are dropped)
+            data.append(dict(zip(field_names, row)))
+        return data
+
+    def serialize(self, queryset):
+        """
+        Read and serialize all the cars of the queryset.
+        """
+        return self.to_representation(self.values_list(queryset))
+
+    async def aserialize(self, queryset):
+        """
+        Async version of serialize.
+        """
+        return self.to_representation([row async for row in self.values_list(queryset)])
+
+
+# query parameter of the sparse fieldsets, example: ?fields=id,brand,model
+FIELDS_QUERY_PARAM = "fields"
+
+
+@lru_cache(maxsize=None)
+def _fast_car_serializer(fields):
+    return FastCarReadSerializer(fields=fields)
+
+
+def get_fast_car_serializer(fields_param=None):
+    """
+    Return the FastCarReadSerializer for the value of the fields query parameter
+    (comma separated field names, all the fields if it is missing or empty).
+    The serializers are built once per fieldset and reused.
+    Raises a ParseError (400) for unknown field names.
+    """
+    requested = split_filter_values(fields_param, separator=",")
+    if not requested:
+        return _fast_car_serializer(None)
+
+    field_names = _fast_car_serializer(None).field_names
+    unknown = [name for name in requested if name not in field_names]
+    if unknown:
+        raise ParseError(
+            f"Unknown fields: {', '.join(unknown)}. Available fields: {', '.join(field_names)}."
+        )
+
+    # canonical order, so that "brand,id" and "id,brand" share the same serializer
+    return _fast_car_serializer(tuple(name for name in field_names if name in requested))
+
 
 class CreateUpdateCarSerializer(serializers.ModelSerializer):
     class Meta:
@@ -77,7 +249,8 @@ class CreateUpdateCarSerializer(serializers.ModelSerializer):
     #     print(self.fields['model'].error_messages)
 
     def validate(self, data):
-        return sanitize_user_input(data)
+        # car values are not secret, repeated values (brands, motors) are cleaned once (see utils/sanitizeUserInput.py)
+        return sanitize_user_input(data, memoize=True)
 
 
 
@@ -0,0 +1,174 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Sharding of the cars by user (several databases, e.g. several SQLite files).
+#
+# Every user's cars live on ONE database of CAR_SHARDS, chosen by a stable hash of the user id (car_shard_for_user).
+# Each shard has its own copy of the tables of the cars app: cars_car (+ its search index), the archived cars,
+# the brand / motor lookup tables and the materialized filter options. The users, sessions, ... stay on the primary ("default",
+# which is also the first shard), so cars_car has no database foreign key to the users table (see models.py).
+#
+# - The views of a user read and write the cars of that user on his / her shard only (Car.objects.of_user).
+# - Saving or deleting a car goes to the shard of its user (CarShardRouter, from the instance).
+# - The admin list and the filter options read every shard in parallel (for_each_shard)
+#   and merge the results (ordered by createdAt for the cars).
+#
+# Car ids are unique across all the shards: the ids of shard number k start at k << CAR_ID_SHARD_BITS
+# (the id sequence of each shard is moved there after "migrate", see seed_car_id_sequence),
+# so a car id alone tells on which shard the car is (car_shard_for_id).
+#
+# Changing the number of shards moves users to other shards: their cars must then be copied by hand.
+#
+# Local setup with several SQLite files: set CAR_SHARD_COUNT (see settings.py) and migrate every shard:
+#   python3 manage.py migrate && python3 manage.py migrate --database=cars_shard_1 && ...
+
+# database aliases of the shards, the first one is the primary database
+CAR_SHARDS = getattr(settings, "CAR_SHARDS", [DEFAULT_DB_ALIAS])
+
+# database aliases which can hold a shard (all of them are migrated with the tables of the cars app only)
+CAR_SHARD_DATABASES = getattr(settings, "CAR_SHARD_DATABASES", [])
+
+# models stored on the shards
+SHARDED_APP_LABEL = "cars"
+
+# The first migrations of the cars app create a foreign key to the users table (removed later, see models.py):
+# the shards also get the (empty) tables of the user model and of the apps it depends on,
+# so that the migrations run on every database (PostgreSQL checks that the referenced table exists).
+SHARD_SUPPORT_APP_LABELS = (settings.AUTH_USER_MODEL.split(".")[0], "auth", "contenttypes")
+
+# the ids of shard k start at k << CAR_ID_SHARD_BITS (48 bits: 2^48 cars per shard, ids stay below 2^53 for 32 shards,
+# so that JavaScript clients can read them as numbers)
+CAR_ID_SHARD_BITS = 48
+
+
+def car_shard_for_user(user_id):
+    """
+    Return the database alias of the shard of the user (stable: the same on every worker and after restarts).
+    """
+    if len(CAR_SHARDS) == 1:
+        return CAR_SHARDS[0]
+    return CAR_SHARDS[zlib.crc32(str(user_id).encode()) % len(CAR_SHARDS)]
+
+
+def car_shard_for_id(car_id):
+    """
+    Return the database alias of the shard of the car with the given id (None for an id out of range).
+    """
+    index = car_id >> CAR_ID_SHARD_BITS
+    return CAR_SHARDS[index] if 0 <= index < len(CAR_SHARDS) else None
+
+
+def shard_db(alias):
+    """
+    Database alias to pass to using() for the shard: None for the shard on the primary database
+    (the routers choose: the reads may go to a read replica, see utils/replicaRouter.py, the writes go to the primary),
+    the alias for the other shards (they have no replica).
+    """
+    return None if alias == DEFAULT_DB_ALIAS else alias
+
+
+def _user_car_models():
+    from .models import Car, ArchivedCar
+    return Car, ArchivedCar
+
+
+def _run_on_shard(func, alias):
+    try:
+        return func(alias)
+    finally:
+        # the connections are thread-local, close the connections of this worker thread
+        connections.close_all()
+
+
+def for_each_shard(func, shards=None):
+    """
+    Return [func(alias) for alias in shards] (default: all the shards), with the shards queried in parallel threads.
+    Inside a transaction the shards are read one after the other, in the current thread
+    (the reads must see the uncommitted writes of the transaction).
+    """
+    shards = CAR_SHARDS if shards is None else shards
+
+    if len(shards) == 1 or any(connections[alias].in_atomic_block for alias in shards):
+        return [func(alias) for alias in shards]
+
+    # every thread runs in a copy of the context of the request (e.g. the replica reads flag of utils/replicaRouter.py)
+    contexts = [copy_context() for _ in shards]
+    with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        return list(executor.map(lambda context, alias: context.run(_run_on_shard, func, alias), contexts, shards))
+
+
+def seed_car_id_sequence(using):
+    """
+    Move the id sequence of cars_car on the shard "using" to the first id of the shard (see CAR_ID_SHARD_BITS).
+    Safe to call many times, called after every "migrate" (see apps.py). SQLite and PostgreSQL.
+    """
+    # the number of a shard does not depend on CAR_SHARD_COUNT: cars_shard_<n> is shard number n
+    shards = [DEFAULT_DB_ALIAS, *CAR_SHARD_DATABASES]
+    if using not in shards or connections[using].vendor not in ("sqlite", "postgresql"):
+        return
+
+    first_id = shards.index(using) << CAR_ID_SHARD_BITS
+    if not first_id:
+        return
+
+    if connections[using].vendor == "postgresql":
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT pg_get_serial_sequence('cars_car', 'id') WHERE to_regclass('cars_car') IS NOT NULL")
+            row = cursor.fetchone()
+            if row is not None:
+                # never moves the sequence back (the next id is the highest of the two + 1)
+                cursor.execute(
+                    f"SELECT setval(%s, GREATEST(%s, (SELECT last_value FROM {row[0]})))", [row[0], first_id]
+                )
+        return
+
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'cars_car'")
+        if cursor.fetchone() is None:
+            return
+
+        cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = 'cars_car'", [first_id])
+        if not cursor.rowcount:
+            cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('cars_car', %s)", [first_id])
+
+
+class CarShardRouter:
+    """
+    Database router of the sharded models (the models of the cars app).
+    Must be the first router of DATABASE_ROUTERS.
+    """
+
+    def _shard_of_instance(self, model, hints):
+        instance = hints.get("instance")
+        if instance is None or model._meta.app_label != SHARDED_APP_LABEL:
+            return None
+        # a car (hot or archived) goes to the shard of its user, the other rows stay where they were read
+        if isinstance(instance, _user_car_models()) and instance.user_id is not None:
+            return car_shard_for_user(instance.user_id)
+        return instance._state.db
+
+    def db_for_read(self, model, **hints):
+        return self._shard_of_instance(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_of_instance(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = [obj._meta.app_label == SHARDED_APP_LABEL for obj in (obj1, obj2)]
+        # rows of the cars app only reference rows of the same shard
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        # the cars reference the users of the primary database by id
+        if any(sharded):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the shards (except the primary) only have the tables of the cars app (and the empty support tables)
+        if db in CAR_SHARD_DATABASES:
+            return app_label in (SHARDED_APP_LABEL, *SHARD_SUPPORT_APP_LABELS)
+        return None
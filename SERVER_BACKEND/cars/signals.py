@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from .models import Car, ArchivedCar
+from .caching import bump_user_data_version
+from .filter_options import apply_filter_option_changes
+from .sharding import car_shard_for_user
+
+User = get_user_model()
+
+# Invalidate the cached data of a user and update the materialized filter options
+# whenever one of his/her cars changes.
+# Bulk operations (bulk_create, queryset.update(), queryset.delete()) do NOT send these signals,
+# the views using them must call invalidate_user_cars_cache and apply_filter_option_changes themselves.
+# The delete endpoints only mark the cars as deleted (soft delete, see deletion.py), which already removes them
+# from the filter options: deleting the row of a soft deleted car later (e.g. with its user) does not count it again.
+
+
+def invalidate_user_cars_cache(user_id, using=DEFAULT_DB_ALIAS):
+    """
+    Bump the data version of the user now (so the following reads of this request see the change)
+    and again after the transaction commits (so a concurrent request, which read the old data
+    before the commit and cached it with the new version, is invalidated as well).
+    using: the database (shard) of the transaction which changed the cars.
+    """
+    bump_user_data_version(user_id)
+    transaction.on_commit(lambda: bump_user_data_version(user_id), using=using)
+
+
+@receiver(pre_save, sender=Car)
+def car_saving(sender, instance, raw, using, **kwargs):
+    # Cars loaded from the database remember their original values (see Car.from_db).
+    # For other existing cars, read the values which are about to be overwritten.
+    if instance._state.adding or raw:
+        return
+    if {"brand", "motor"} <= set(getattr(instance, "_loaded_values", {})):
+        return
+    instance._loaded_values = (
+        Car.objects.using(using).filter(pk=instance.pk).values("brand", "motor").first() or {}
+    )
+
+
+@receiver(post_save, sender=Car)
+def car_saved(sender, instance, created, raw, using, **kwargs):
+    invalidate_user_cars_cache(instance.user_id, using=using)
+
+    if raw:
+        return
+
+    loaded_values = getattr(instance, "_loaded_values", None) or {}
+    new_values = (instance.brand, instance.motor)
+
+    if created or not loaded_values:
+        apply_filter_option_changes(added=[new_values], using=using)
+    else:
+        old_values = (loaded_values.get("brand"), loaded_values.get("motor"))
+        if old_values != new_values:
+            apply_filter_option_changes(added=[new_values], removed=[old_values], using=using)
+
+    # the saved values are the new original values (if the same instance is saved again)
+    instance._loaded_values = {"brand": instance.brand, "motor": instance.motor}
+
+
+@receiver(post_delete, sender=Car)
+def car_deleted(sender, instance, using, **kwargs):
+    invalidate_user_cars_cache(instance.user_id, using=using)
+
+    if instance.deletedAt is None:
+        apply_filter_option_changes(removed=[(instance.brand, instance.motor)], using=using)
+
+
+@receiver(post_delete, sender=ArchivedCar)
+def archived_car_deleted(sender, instance, using, **kwargs):
+    # archived cars are counted in the filter options as well (see archive.py),
+    # e.g. when the cars of a deleted user are deleted
+    invalidate_user_cars_cache(instance.user_id, using=using)
+
+    apply_filter_option_changes(removed=[(instance.brand, instance.motor)], using=using)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # The cascade of the user deletion only deletes the cars of the primary database:
+    # delete the cars (hot, soft deleted and archived) of the user on his/her shard (no foreign key between the databases, see sharding.py).
+    shard = car_shard_for_user(instance.pk)
+    if shard != DEFAULT_DB_ALIAS:
+        Car.all_objects.using(shard).filter(user_id=instance.pk).delete()
+        ArchivedCar.objects.using(shard).filter(user_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, **kwargs):
+    # SQLite can reuse the id of a deleted user, never serve the cached data of the old user.
+    if created:
+        bump_user_data_version(instance.pk)
@@ -0,0 +1,83 @@
+import heapq
+
+from utils.fastJson import dumps
+
+from .serializers import get_fast_car_serializer
+
+# Streaming of (very) long car lists, used by the admin list view (?stream=json or ?stream=ndjson).
+#
+# The cars are read from the database in chunks with queryset.iterator(chunk_size=...),
+# which does NOT keep the already read rows in memory (no queryset result cache),
+# and every chunk is serialized and sent to the client before the next chunk is read.
+# The memory used by a request therefore stays the same, no matter how many cars are in the table.
+# On PostgreSQL, iterator() reads through a server-side cursor (one FETCH of chunk_size rows per chunk),
+# so the database does not send the whole result at once either (see the POSTGRESQL section of settings.py).
+#
+# With several shards (see sharding.py), the rows of the shards are read at the same time, chunk by chunk,
+# and merged in the order of the lists (createdAt and id descending).
+
+STREAM_FORMATS = {
+    # JSON array: [{...},{...}] (same body as the non-streaming response)
+    "json": "application/json",
+
+    # newline delimited JSON: one car per line, the client can process the cars while they arrive
+    "ndjson": "application/x-ndjson",
+}
+
+# number of cars read from the database (and sent to the client) at once
+STREAM_CHUNK_SIZE = 2000
+
+
+def _encode(data):
+    # same JSON as the API responses (see utils/fastJson.py)
+    return dumps(data)
+
+
+def _rows(querysets, chunk_size, serializer):
+    """
+    Iterate over the values_list() rows of the querysets (one per shard, each ordered by CURSOR_ORDERING),
+    merged by position (createdAt, id) descending.
+    """
+    iterators = [serializer.values_list(queryset).iterator(chunk_size=chunk_size) for queryset in querysets]
+    if len(iterators) == 1:
+        return iterators[0]
+    return heapq.merge(*iterators, key=serializer.position, reverse=True)
+
+
+def _serialized_chunks(querysets, chunk_size, serializer):
+    """
+    Yield lists of serialized cars, chunk_size cars at a time.
+    """
+    # the cars are read as values_list() rows, without model instances (see FastCarReadSerializer)
+    rows = []
+    for row in _rows(querysets, chunk_size, serializer):
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield [_encode(car) for car in serializer.to_representation(rows)]
+            rows = []
+    if rows:
+        yield [_encode(car) for car in serializer.to_representation(rows)]
+
+
+def stream_cars(queryset, stream_format, chunk_size=STREAM_CHUNK_SIZE, serializer=None):
+    """
+    Return a generator of the encoded cars of the queryset, in the given format ("json" or "ndjson").
+    queryset: a queryset, or a list of querysets (one per shard, each ordered by CURSOR_ORDERING).
+    serializer: the FastCarReadSerializer of the requested fields (default: all the fields).
+    """
+    if serializer is None:
+        serializer = get_fast_car_serializer()
+
+    querysets = queryset if isinstance(queryset, list) else [queryset]
+
+    if stream_format == "ndjson":
+        for chunk in _serialized_chunks(querysets, chunk_size, serializer):
+            yield b"\n".join(chunk) + b"\n"
+        return
+
+    yield b"["
+    first = True
+    for chunk in _serialized_chunks(querysets, chunk_size, serializer):
+        yield (b"" if first else b",") + b",".join(chunk)
+        first = False
+    yield b"]"
@@ -0,0 +1,144 @@
+import heapq
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Count
+
+from .models import Car, fold
+from .filters import prefix_upper_bound
+from .caching import get_user_data_version, user_data_may_be_stale
+
+# Autocomplete suggestions for the filter box (/api/cars/suggest/?field=brand&prefix=vo).
+#
+# The suggestions of a user are the brands / models of HIS / HER OWN cars (the models are free text:
+# the values of the other users are never shown), with the number of cars using them.
+# Each worker process keeps the values of the recently active users in memory, as one sorted array per field:
+# the values starting with a prefix are a contiguous slice of the array, found with two binary searches (bisect),
+# and the N most used values of the slice are returned. No database query is needed for the lookup itself.
+#
+# The arrays of a user are built with one GROUP BY query per field over the (hot) cars of the user, on the shard
+# of the user (see sharding.py), and are tagged with the data version of the user (see caching.py):
+# every change of the cars of the user bumps the version, so the next suggestion request rebuilds them
+# (rebuilt, not patched: the GROUP BY reads only the cars of one user, and a change made by another worker
+# or another process, e.g. the archive job, needs no message to the other workers).
+# At most CARS_SUGGEST_USERS_CACHE_SIZE users are kept per process (least recently used users are dropped).
+
+# fields which can be suggested
+SUGGEST_FIELDS = ("brand", "model")
+
+# number of suggestions returned by default / at most (?limit=)
+CARS_SUGGEST_LIMIT = getattr(settings, "CARS_SUGGEST_LIMIT", 10)
+CARS_SUGGEST_MAX_LIMIT = getattr(settings, "CARS_SUGGEST_MAX_LIMIT", 50)
+
+# number of (prefix, limit) results remembered per field, until the index is rebuilt
+# (the short prefixes match many values and are typed again and again)
+SUGGEST_RESULTS_CACHE_SIZE = 4096
+
+# number of users whose arrays are kept in memory by every worker process
+CARS_SUGGEST_USERS_CACHE_SIZE = getattr(settings, "CARS_SUGGEST_USERS_CACHE_SIZE", 1024)
+
+
+class PrefixIndex:
+    """
+    Sorted array of the values of one field (sorted by case-folded value), with the number of cars of every value.
+    Never changed after it was built: a change of the cars builds a new index (see get_user_suggestion_indexes).
+    """
+
+    def __init__(self, counts=None):
+        # value --> number of cars
+        self._counts = {value: count for value, count in (counts or {}).items() if count > 0}
+        # sorted (folded value, value) tuples, the value makes the tuples unique ("Audi" and "AUDI")
+        self._entries = sorted((fold(value), value) for value in self._counts)
+        # (folded prefix, limit) --> result of top()
+        self._results = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def top(self, prefix, limit):
+        """
+        Return the (value, count) of the most used values starting with prefix (case-insensitive),
+        ordered by count (descending) and value.
+        """
+        folded_prefix = fold(prefix)
+
+        result = self._results.get((folded_prefix, limit))
+        if result is not None:
+            return result
+
+        start = bisect_left(self._entries, (folded_prefix,))
+        upper_bound = prefix_upper_bound(folded_prefix)
+        end = bisect_left(self._entries, (upper_bound,), start) if upper_bound is not None else len(self._entries)
+
+        # the most used values of the slice, ties ordered by value
+        counts = self._counts
+        best = heapq.nsmallest(limit, ((-counts[value], folded, value) for folded, value in self._entries[start:end]))
+        result = [(value, -negative_count) for negative_count, folded, value in best]
+
+        if len(self._results) >= SUGGEST_RESULTS_CACHE_SIZE:
+            self._results.clear()
+        self._results[(folded_prefix, limit)] = result
+        return result
+
+
+# user id --> (data version of the user, {field: PrefixIndex}), least recently used first
+_user_indexes = OrderedDict()
+_user_indexes_lock = threading.Lock()
+
+
+def _load_user_indexes(user):
+    """
+    Build the prefix indexes of the cars of the user (one GROUP BY query per field, on the shard of the user).
+    """
+    cars = Car.objects.of_user(user)
+    return {
+        field: PrefixIndex(dict(cars.values_list(field).annotate(count=Count("id")).order_by()))
+        for field in SUGGEST_FIELDS
+    }
+
+
+def get_user_suggestion_indexes(user):
+    """
+    Return the prefix indexes of the user, rebuilt if the cars of the user changed since they were built.
+    """
+    # read before the cars: a change during the load bumps the version again, the next request rebuilds
+    version = get_user_data_version(user.id)
+
+    with _user_indexes_lock:
+        entry = _user_indexes.get(user.id)
+        if entry is not None and entry[0] == version:
+            _user_indexes.move_to_end(user.id)
+            return entry[1]
+
+    indexes = _load_user_indexes(user)
+
+    # read from a replica which may not have the last change yet: not kept under the current version
+    if user_data_may_be_stale(user.id):
+        return indexes
+
+    with _user_indexes_lock:
+        _user_indexes[user.id] = (version, indexes)
+        _user_indexes.move_to_end(user.id)
+        while len(_user_indexes) > CARS_SUGGEST_USERS_CACHE_SIZE:
+            _user_indexes.popitem(last=False)
+
+    return indexes
+
+
+def get_suggestions(user, field, prefix, limit=CARS_SUGGEST_LIMIT):
+    """
+    Return the most used values of the field among the cars of the user, starting with prefix:
+    [{"value": "Volvo", "count": 12}, ...]
+    """
+    if not prefix.strip():
+        return []
+
+    index = get_user_suggestion_indexes(user)[field]
+
+    # top() remembers its results, the same index can be used by several threads
+    with _user_indexes_lock:
+        suggestions = index.top(prefix.strip(), limit)
+
+    return [{"value": value, "count": count} for value, count in suggestions]
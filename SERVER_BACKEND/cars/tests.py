@@ -1,11 +1,64 @@
-from django.test import TestCase, Client
-from rest_framework.test import APIClient
+from django.test import TestCase, TransactionTestCase, SimpleTestCase, Client, AsyncClient, override_settings
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.request import Request
+from django.db import connection, connections, transaction, IntegrityError, OperationalError
+from django.db.models import Q, Max
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
-from .models import Car
+from .models import Car, ArchivedCar, CarFilterOption, Brand, Motor
 from django.contrib.auth import get_user_model
-from .serializers import GetCarSerializer
+from .serializers import GetCarSerializer, FastCarReadSerializer
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from .views_generic_class_based_views import CarNotesPagination
+from . import views_generic_class_based_views as generic_views
+from .search import search_index_available, create_trigram_indexes, TRIGRAM_INDEXES
+from .streaming import stream_cars
+from .bulk import bulk_create_cars
+from .filters import build_car_filters, prefix_upper_bound
+from .filter_options import apply_filter_option_changes
+from .caching import normalize_filter_params, bump_user_data_version, get_or_set_user_cached
+from .suggest import PrefixIndex
+from .views_async_class_based_views import AsyncCarListCreateApiView, AsyncCarDetailApiView
+from django.urls import resolve
+from asgiref.sync import iscoroutinefunction
 import json 
+import random
+import base64
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.utils.serializer_helpers import ReturnList
+from utils.fastJson import FastJSONRenderer, FastJSONParser
+from utils.compressionMiddleware import CompressionMiddleware, compress_stream
+from utils.sqliteTuning import retry_on_database_locked, DATABASE_LOCKED_RETRIES
+from utils.replicaRouter import ReadReplicaRouter, ReadReplicaMiddleware, copy_sqlite_database, reads_from_replica, _request_replica
+from .pagination import paginate_by_cursor_across_shards, HotThenArchivedRows, encode_cursor, decode_cursor
+from .archive import archive_cars, archive_cutoff, restore_archived_cars
+from .deletion import CARS_UNDO_DELETE_SECONDS, purge_deleted_cars, purge_deleted_cars_batch, undo_cutoff
+from .sharding import CAR_SHARDS, CAR_SHARD_DATABASES, CAR_ID_SHARD_BITS, CarShardRouter, car_shard_for_user, car_shard_for_id, for_each_shard, shard_db
+from . import filter_options, suggest
+from django.core.cache import caches
+from types import SimpleNamespace
+from django.contrib.auth.models import AnonymousUser
+import time
+import os
+import sqlite3
+import tempfile
+from django.http import HttpResponse
+from django.test import RequestFactory
+import gzip
+import zlib
+import nh3
+from utils.sanitizeUserInput import _CHANGED_BY_NH3, _clean_cached, sanitize_string, sanitize_user_input, sanitize_user_inputs
+from io import StringIO
+from django.core.management import call_command
 
 User = get_user_model()
 
@@ -726,3 +779,2909 @@ class DeleteSingleCarAdminTest(TestCase):
         invalid_id = max(self.car1.id, self.car2.id) + 999
         response = self.client.delete(reverse("car_detail_admin", kwargs={"id": invalid_id}))
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class CursorPaginationTest(TestCase):
+    """Test module for the keyset (cursor) pagination of the car list APIs."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.admin = User.objects.create_superuser(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        # 20 cars for user2 -> pages of 9, 9, 2
+        for i in range(20):
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user2)
+
+        Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.admin)
+
+        self.url = reverse("car_list_create")
+        self.url_admin = reverse("car_list_create_admin")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_walk_forward_and_backward_through_all_pages(self):
+        self.login(self.user2)
+
+        expected_ids = list(
+            Car.objects.filter(user=self.user2).order_by("-createdAt", "-id").values_list("id", flat=True)
+        )
+
+        # first page
+        response = self.client.get(self.url, {"cursor": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("count", response.data)
+        self.assertIsNone(response.data["previous"])
+        self.assertEqual(response.data["page_size"], 9)
+
+        pages = [[car["id"] for car in response.data["data"]]]
+        responses = [response]
+
+        while response.data["next"]:
+            response = self.client.get(self.url, {"cursor": response.data["next"]})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([car["id"] for car in response.data["data"]])
+            responses.append(response)
+
+        self.assertEqual([len(page) for page in pages], [9, 9, 2])
+        self.assertEqual([car_id for page in pages for car_id in page], expected_ids)
+
+        # go back from the last page to the second page and then to the first page
+        response = self.client.get(self.url, {"cursor": responses[-1].data["previous"]})
+        self.assertEqual([car["id"] for car in response.data["data"]], pages[1])
+
+        response = self.client.get(self.url, {"cursor": response.data["previous"]})
+        self.assertEqual([car["id"] for car in response.data["data"]], pages[0])
+        self.assertIsNone(response.data["previous"])
+
+    def test_cursor_is_restricted_to_request_user_and_filters(self):
+        self.login(self.admin)
+
+        response = self.client.get(self.url, {"cursor": "", "brand": "Porsche"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]), 1)
+        self.assertEqual(response.data["data"][0]["user"], self.admin.id)
+        self.assertIsNone(response.data["next"])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        self.login(self.user2)
+
+        first_page = self.client.get(self.url, {"cursor": ""})
+        response = self.client.get(self.url, {"cursor": "not-a-valid-cursor"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["data"], first_page.data["data"])
+
+        # forged cursors: ids which are not integers or do not fit in 64 bits
+        created_at = timezone.now().isoformat()
+        for car_id in ("Infinity", "-Infinity", "NaN", "1e400", "1.5", '"7"', "true", "null", str(2 ** 63), str(2 ** 70), "-1"):
+            payload = f'{{"c":"{created_at}","i":{car_id},"d":"n"}}'
+            token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+            self.assertIsNone(decode_cursor(token), car_id)
+
+            response = self.client.get(self.url, {"cursor": token})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data["data"], first_page.data["data"])
+
+    def test_cursor_pagination_does_not_count(self):
+        self.login(self.user2)
+
+        first_page = self.client.get(self.url, {"cursor": ""})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"cursor": first_page.data["next"]})
+
+        self.assertFalse(any("COUNT(" in query["sql"].upper() for query in queries.captured_queries))
+
+    def test_admin_cursor_pagination_across_all_users(self):
+        self.login(self.admin)
+
+        response = self.client.get(self.url_admin, {"cursor": ""})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        ids = [car["id"] for car in response.data["data"]]
+        while response.data["next"]:
+            response = self.client.get(self.url_admin, {"cursor": response.data["next"]})
+            ids += [car["id"] for car in response.data["data"]]
+
+        self.assertEqual(ids, list(Car.objects.order_by("-createdAt", "-id").values_list("id", flat=True)))
+
+    def test_generic_pagination_class_cursor_mode(self):
+        request = Request(APIRequestFactory().get("/", {"cursor": "", "page_size": 5}))
+        paginator = CarNotesPagination()
+
+        queryset = Car.objects.filter(user=self.user2).order_by("-createdAt", "-id")
+        page = paginator.paginate_queryset(queryset, request)
+        response = paginator.get_paginated_response([car.id for car in page])
+
+        self.assertEqual(response.data["data"], list(queryset.values_list("id", flat=True)[:5]))
+        self.assertEqual(response.data["page_size"], 5)
+        self.assertIsNone(response.data["previous"])
+        self.assertIsNotNone(response.data["next"])
+        self.assertNotIn("count", response.data)
+
+class SearchFilterTest(TestCase):
+    """Test module for the full-text search index (?q=) and the brand/motor filters routed through it."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Aston Martin", model="DB11", motor="Petrol", user=self.user1)
+        self.car2 = Car.objects.create(brand="Audi", model="A4 Avant", motor="Diesel", user=self.user1)
+        self.car3 = Car.objects.create(brand="Audi", model="e-tron", motor="Electric", user=self.user2)
+
+        self.url = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(car["id"] for car in response.data["data"])
+
+    def test_search_index_is_available(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only (PostgreSQL uses trigram indexes, see TrigramIndexesTest)")
+        self.assertTrue(search_index_available())
+
+    def test_q_matches_substrings_of_brand_model_and_motor(self):
+        self.login(self.user1)
+
+        self.assertEqual(self.get_ids({"q": "avant"}), [self.car2.id])
+        self.assertEqual(self.get_ids({"q": "ton mar"}), [self.car1.id])
+        self.assertEqual(self.get_ids({"q": "audi diesel"}), [self.car2.id])
+        self.assertEqual(self.get_ids({"q": "audi petrol"}), [])
+
+        # short terms fall back to icontains
+        self.assertEqual(self.get_ids({"q": "A4"}), [self.car2.id])
+
+    def test_search_is_restricted_to_request_user(self):
+        self.login(self.user1)
+        self.assertEqual(self.get_ids({"q": "tron"}), [])
+
+        self.login(self.user2)
+        self.assertEqual(self.get_ids({"q": "tron"}), [self.car3.id])
+
+    def test_brand_and_motor_filters_use_the_lookup_tables(self):
+        self.login(self.user1)
+
+        with CaptureQueriesContext(connection) as queries:
+            ids = self.get_ids({"brand": "Aston-Audi", "motor": "diesel"})
+
+        self.assertEqual(ids, [self.car2.id])
+
+        # the strings are only compared in the small lookup tables,
+        # the cars are filtered by the integer ids of the matching brands / motors
+        car_queries = [query["sql"] for query in queries.captured_queries if 'FROM "cars_car"' in query["sql"]]
+        self.assertTrue(car_queries)
+        for sql in car_queries:
+            self.assertIn('"cars_car"."brandRef_id" IN', sql)
+            self.assertIn('"cars_car"."motorRef_id" IN', sql)
+            self.assertNotIn("LIKE", sql)
+
+    def test_search_index_follows_updates_and_deletes(self):
+        self.login(self.user1)
+
+        Car.objects.filter(id=self.car2.id).update(model="Q7")
+        self.assertEqual(self.get_ids({"q": "avant"}), [])
+        self.assertEqual(self.get_ids({"brand": "audi", "q": "Q7"}), [self.car2.id])
+
+        self.car1.delete()
+        self.assertEqual(self.get_ids({"brand": "aston"}), [])
+
+    def test_fts_operators_in_user_input_have_no_effect(self):
+        self.login(self.user1)
+        self.assertEqual(self.get_ids({"q": 'audi" OR "petrol'}), [])
+
+class CachedCountTest(TestCase):
+    """Test module for the cached, invalidation-aware pagination counts."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        for i in range(10):
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+        self.porsche = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user1)
+        Car.objects.create(brand="Porsche", model="Cayenne", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def count_queries(self, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        count_queries = [query for query in queries.captured_queries if "COUNT(" in query["sql"].upper()]
+        return response, len(count_queries)
+
+    def test_repeated_page_loads_do_not_count(self):
+        self.login(self.user1)
+
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 11)
+        self.assertEqual(response.data["pages"], 2)
+
+        response, counts = self.count_queries({"page": 2})
+        self.assertEqual(counts, 0)
+        self.assertEqual(response.data["count"], 11)
+        self.assertEqual(len(response.data["data"]), 2)
+
+    def test_equivalent_filters_share_the_cached_count(self):
+        self.login(self.user1)
+
+        response, counts = self.count_queries({"brand": "Porsche-audi"})
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 11)
+
+        response, counts = self.count_queries({"brand": " AUDI - porsche "})
+        self.assertEqual(counts, 0)
+        self.assertEqual(response.data["count"], 11)
+
+        response, counts = self.count_queries({"brand": "porsche"})
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_counts_are_cached_per_user(self):
+        self.login(self.user1)
+        self.count_queries({"brand": "porsche"})
+
+        self.login(self.user2)
+        response, counts = self.count_queries({"brand": "porsche"})
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 1)
+
+    def test_writes_invalidate_the_cached_count(self):
+        self.login(self.user1)
+        self.count_queries()
+
+        response = self.client.post(self.url, {"brand": "BMW", "model": "M3", "motor": "Petrol"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 12)
+
+        response = self.client.delete(reverse("car_detail", kwargs={"id": self.porsche.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 1)
+        self.assertEqual(response.data["count"], 11)
+
+    def test_writes_of_other_users_keep_the_cached_count(self):
+        self.login(self.user1)
+        self.count_queries()
+
+        Car.objects.create(brand="BMW", model="M3", motor="Petrol", user=self.user2)
+
+        response, counts = self.count_queries()
+        self.assertEqual(counts, 0)
+
+    def test_generic_pagination_class_uses_cached_count(self):
+        paginator = CarNotesPagination()
+        queryset = Car.objects.filter(user=self.user1).order_by("-createdAt", "-id")
+
+        for expected_counts in (1, 0):
+            request = Request(APIRequestFactory().get("/", {"page": 2}))
+            request.user = self.user1
+
+            with CaptureQueriesContext(connection) as queries:
+                page = paginator.paginate_queryset(queryset, request)
+                response = paginator.get_paginated_response([car.id for car in page])
+
+            count_queries = [query for query in queries.captured_queries if "COUNT(" in query["sql"].upper()]
+            self.assertEqual(len(count_queries), expected_counts)
+            self.assertEqual(response.data["count"], 11)
+            self.assertEqual(response.data["pages"], 2)
+
+class ResponseCacheTest(TestCase):
+    """Test module for the per-user versioned response cache of the car list and detail APIs."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.admin = User.objects.create_superuser(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user2)
+        self.car2 = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_list_create")
+        self.url_car1 = reverse("car_detail", kwargs={"id": self.car1.id})
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def get(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        car_queries = [query for query in queries.captured_queries if "cars_car" in query["sql"]]
+        return response, len(car_queries)
+
+    def test_repeated_list_requests_are_served_from_the_cache(self):
+        self.login(self.user2)
+
+        response1, queries = self.get(self.url, {"page": 1, "brand": "Audi-Porsche"})
+        self.assertGreater(queries, 0)
+
+        # same request, parameters in a different order and case
+        response2, queries = self.get(self.url, {"brand": "porsche-audi", "page": 1})
+        self.assertEqual(queries, 0)
+        self.assertEqual(response1.data, response2.data)
+
+        # different page --> not cached yet
+        response3, queries = self.get(self.url, {"page": 2, "brand": "Audi-Porsche"})
+        self.assertGreater(queries, 0)
+
+    def test_detail_requests_are_served_from_the_cache(self):
+        self.login(self.user2)
+
+        response1, queries = self.get(self.url_car1)
+        self.assertGreater(queries, 0)
+
+        response2, queries = self.get(self.url_car1)
+        self.assertEqual(queries, 0)
+        self.assertEqual(response1.data, response2.data)
+
+    def test_cache_is_per_user(self):
+        self.login(self.user2)
+        self.get(self.url_car1)
+
+        self.login(self.admin)
+        response = self.client.get(self.url_car1)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response, queries = self.get(self.url)
+        self.assertEqual(response.data["count"], 0)
+
+    def test_post_put_delete_invalidate_the_cache(self):
+        self.login(self.user2)
+        self.get(self.url)
+        self.get(self.url_car1)
+
+        self.client.put(self.url_car1, {"brand": "Audi", "model": "A6", "motor": "Diesel"}, format="json")
+        response, queries = self.get(self.url_car1)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.data["model"], "A6")
+
+        self.client.post(self.url, {"brand": "BMW", "model": "M3", "motor": "Petrol"}, format="json")
+        response, queries = self.get(self.url)
+        self.assertGreater(queries, 0)
+        self.assertEqual(response.data["count"], 3)
+
+        self.client.delete(self.url_car1)
+        response = self.client.get(self.url_car1)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response, queries = self.get(self.url)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_admin_delete_invalidates_the_cache_of_the_owner(self):
+        self.login(self.user2)
+        self.get(self.url)
+
+        self.login(self.admin)
+        response = self.client.delete(reverse("car_detail_admin", kwargs={"id": self.car2.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.login(self.user2)
+        response, queries = self.get(self.url)
+        self.assertGreater(queries, 0)
+        self.assertEqual([car["id"] for car in response.data["data"]], [self.car1.id])
+
+class ConditionalGetTest(TestCase):
+    """Test module for the ETag / Last-Modified conditional GET support of the car list and detail APIs."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+        self.url = reverse("car_list_create")
+        self.url_car1 = reverse("car_detail", kwargs={"id": self.car1.id})
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_list_and_detail_have_etag_and_last_modified(self):
+        self.login(self.user1)
+
+        for url in (self.url, self.url_car1):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.has_header("ETag"))
+            self.assertFalse(response["ETag"].startswith("W/"))
+            self.assertTrue(response.has_header("Last-Modified"))
+            self.assertIn("no-cache", response["Cache-Control"])
+            self.assertIn("private", response["Cache-Control"])
+
+    def test_matching_if_none_match_returns_304_without_queries(self):
+        self.login(self.user1)
+
+        for url in (self.url, self.url_car1):
+            etag = self.client.get(url)["ETag"]
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response.content, b"")
+            self.assertFalse(any("cars_car" in query["sql"] for query in queries.captured_queries))
+
+    def test_etag_depends_on_query_params_and_user(self):
+        self.login(self.user1)
+        etag_all = self.client.get(self.url)["ETag"]
+        etag_filtered = self.client.get(self.url, {"brand": "Audi"})["ETag"]
+        self.assertNotEqual(etag_all, etag_filtered)
+
+        # equivalent parameters --> same ETag
+        self.assertEqual(etag_filtered, self.client.get(self.url, {"brand": " audi"})["ETag"])
+
+        self.login(self.user2)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag_all)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_writes_change_the_etag(self):
+        self.login(self.user1)
+        etag = self.client.get(self.url)["ETag"]
+
+        self.client.post(self.url, {"brand": "BMW", "model": "M3", "motor": "Petrol"}, format="json")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 2)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        self.login(self.user1)
+        last_modified = self.client.get(self.url_car1)["Last-Modified"]
+
+        response = self.client.get(self.url_car1, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(self.url_car1, HTTP_IF_MODIFIED_SINCE="Mon, 01 Jan 2001 00:00:00 GMT")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+class ProductFilterOptionsTest(TestCase):
+    """Test module for the materialized filter options (distinct brands and motors)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user1)
+        self.car2 = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user2)
+        self.car3 = Car.objects.create(brand="Audi", model="A5", motor="Hybrid", user=self.user2)
+
+        self.url = reverse("prpduct_filters")
+
+    def distinct_values(self):
+        return {
+            "brands": list(Car.objects.values_list("brand", flat=True).distinct().order_by("brand")),
+            "motors": list(Car.objects.values_list("motor", flat=True).distinct().order_by("motor")),
+        }
+
+    def get_options(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_options_match_distinct_values_of_the_cars(self):
+        self.assertEqual(self.get_options(), {"brands": ["Audi", "Porsche"], "motors": ["Diesel", "Hybrid", "Petrol"]})
+        self.assertEqual(self.get_options(), self.distinct_values())
+
+    def test_options_follow_creates_updates_and_deletes(self):
+        Car.objects.create(brand="BMW", model="M3", motor="Petrol", user=self.user1)
+        self.assertEqual(self.get_options(), self.distinct_values())
+
+        self.car1.brand = "Aston Martin"
+        self.car1.save()
+        self.assertEqual(self.get_options()["brands"], ["Aston Martin", "Audi", "BMW"])
+
+        # car2 is one of two Audis, Audi must stay
+        self.car2.delete()
+        self.assertEqual(self.get_options()["brands"], ["Aston Martin", "Audi", "BMW"])
+        self.assertEqual(self.get_options()["motors"], ["Hybrid", "Petrol"])
+
+        self.car3.delete()
+        self.assertEqual(self.get_options(), self.distinct_values())
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Audi").count, 0)
+
+    def test_options_follow_api_writes(self):
+        self.client.force_authenticate(user=self.user2)
+
+        self.client.post(reverse("car_list_create"), {"brand": "Skoda", "model": "Octavia", "motor": "CNG"}, format="json")
+        self.client.put(
+            reverse("car_detail", kwargs={"id": self.car3.id}),
+            {"brand": "Audi", "model": "A5", "motor": "Electric"},
+            format="json",
+        )
+        self.client.delete(reverse("car_detail", kwargs={"id": self.car2.id}))
+
+        self.assertEqual(self.get_options(), self.distinct_values())
+
+    def test_unchanged_options_are_served_from_memory(self):
+        self.get_options()
+
+        with CaptureQueriesContext(connection) as queries:
+            self.get_options()
+
+        # only the version check, no scan of the cars table
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertNotIn("cars_car", queries.captured_queries[0]["sql"].replace("cars_carfilteroption", ""))
+
+    def test_rebuild_command(self):
+        CarFilterOption.objects.all().delete()
+        call_command("rebuild_car_filter_options", stdout=StringIO())
+        self.assertEqual(self.get_options(), self.distinct_values())
+
+    def test_late_commit_is_stamped_above_the_loaded_version(self):
+        self.assertEqual(self.get_options()["brands"], ["Audi", "Porsche"])
+
+        # a change which took its version before the last one, and commits after a worker loaded the options
+        with self.captureOnCommitCallbacks() as callbacks:
+            with mock.patch("cars.filter_options._next_version", return_value=1):
+                apply_filter_option_changes(added=[("BMW", "Petrol")])
+        self.assertEqual(self.get_options()["brands"], ["Audi", "Porsche"])
+
+        # after its commit, the change stamps its rows above all the versions
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_options()["brands"], ["Audi", "BMW", "Porsche"])
+
+    def test_versions_increase_with_the_same_clock(self):
+        with mock.patch("cars.filter_options.time.time_ns", return_value=0):
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_filter_option_changes(added=[("BMW", "Petrol")])
+            first = CarFilterOption.objects.get(kind="brand", value="BMW").version
+
+            with self.captureOnCommitCallbacks(execute=True):
+                apply_filter_option_changes(removed=[("BMW", "Petrol")])
+            second = CarFilterOption.objects.get(kind="brand", value="BMW").version
+
+        self.assertGreater(second, first)
+        self.assertEqual(second, CarFilterOption.objects.aggregate(version=Max("version"))["version"])
+
+
+class FacetsTest(TestCase):
+    """Test module for the per-user facet counts of the car list API (?facets=brand,motor)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        for i in range(3):
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+        Car.objects.create(brand="Audi", model="e-tron", motor="Electric", user=self.user1)
+        Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user1)
+
+        # other user's cars must never be counted
+        Car.objects.create(brand="BMW", model="M3", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_facets_are_counted_per_user(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url, {"facets": "brand,motor"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["facets"], {
+            "brand": [{"value": "Audi", "count": 4}, {"value": "Porsche", "count": 1}],
+            "motor": [
+                {"value": "Diesel", "count": 3},
+                {"value": "Electric", "count": 1},
+                {"value": "Petrol", "count": 1},
+            ],
+        })
+
+    def test_facets_respect_active_filters(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url, {"facets": "motor", "brand": "Audi"})
+        self.assertEqual(response.data["facets"], {
+            "motor": [{"value": "Diesel", "count": 3}, {"value": "Electric", "count": 1}],
+        })
+
+    def test_facets_use_one_grouped_query(self):
+        self.login(self.user1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"facets": "brand,motor", "cursor": ""})
+
+        grouped = [query for query in queries.captured_queries if "GROUP BY" in query["sql"]]
+        self.assertEqual(len(grouped), 1)
+
+    def test_no_facets_without_parameter_and_unknown_fields_are_ignored(self):
+        self.login(self.user1)
+
+        self.assertNotIn("facets", self.client.get(self.url).data)
+        self.assertEqual(self.client.get(self.url, {"facets": "color,brand"}).data["facets"].keys(), {"brand"})
+
+    def test_facets_are_invalidated_by_writes(self):
+        self.login(self.user1)
+        self.client.get(self.url, {"facets": "brand"})
+
+        self.client.post(self.url, {"brand": "Porsche", "model": "Taycan", "motor": "Electric"}, format="json")
+
+        response = self.client.get(self.url, {"facets": "brand", "page": 2})
+        self.assertEqual(response.data["facets"]["brand"], [{"value": "Audi", "count": 4}, {"value": "Porsche", "count": 2}])
+
+class StreamingAdminListTest(TestCase):
+    """Test module for the streaming mode of the admin car list API."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.admin = User.objects.create_superuser(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        for i in range(5):
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user2)
+        Car.objects.create(brand="Porsche", model="Cayenne", motor="Petrol", user=self.admin)
+
+        self.url_admin = reverse("car_list_create_admin")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_json_stream_has_the_same_body_as_the_default_response(self):
+        self.login(self.admin)
+
+        response = self.client.get(self.url_admin, {"brand": "audi"})
+        streamed = self.client.get(self.url_admin, {"brand": "audi", "stream": "json"})
+
+        self.assertEqual(streamed.status_code, status.HTTP_200_OK)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(streamed["Content-Type"], "application/json")
+        self.assertEqual(json.loads(b"".join(streamed.streaming_content)), json.loads(response.content))
+
+    def test_ndjson_stream(self):
+        self.login(self.admin)
+
+        streamed = self.client.get(self.url_admin, {"stream": "ndjson"})
+        self.assertEqual(streamed["Content-Type"], "application/x-ndjson")
+
+        lines = b"".join(streamed.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines],
+            list(Car.objects.order_by("-createdAt", "-id").values_list("id", flat=True)),
+        )
+
+    def test_stream_is_read_in_chunks(self):
+        queryset = Car.objects.order_by("-createdAt", "-id")
+        chunks = list(stream_cars(queryset, "json", chunk_size=2))
+
+        # "[", 3 chunks of cars (2 + 2 + 2), "]"
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(len(json.loads(b"".join(chunks))), 6)
+
+    def test_empty_stream(self):
+        self.login(self.admin)
+
+        streamed = self.client.get(self.url_admin, {"brand": "Skoda", "stream": "json"})
+        self.assertEqual(b"".join(streamed.streaming_content), b"[]")
+
+    def test_non_admin_cannot_stream(self):
+        self.login(self.user2)
+
+        response = self.client.get(self.url_admin, {"stream": "json"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class BulkCreateCarsTest(TestCase):
+    """Test module for creating many car notes with one request."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.url = reverse("car_bulk")
+        self.url_list = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_create_many_cars(self):
+        self.login(self.user1)
+
+        payload = [
+            {"brand": "Audi", "model": f"A{i}", "motor": "Diesel"} for i in range(20)
+        ]
+        response = self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["data"]), 20)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Car.objects.filter(user=self.user1).count(), 20)
+        self.assertTrue(all(car["id"] for car in response.data["data"]))
+        self.assertTrue(all(car["user"] == self.user1.id for car in response.data["data"]))
+
+    def test_inserts_in_batches(self):
+        validated_items = [
+            {"brand": "Audi", "model": f"A{i}", "motor": "Diesel"} for i in range(5)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            cars = bulk_create_cars(user=self.user1, validated_items=validated_items, batch_size=2)
+
+        self.assertEqual(len(cars), 5)
+        inserts = [query for query in queries.captured_queries if query["sql"].startswith('INSERT INTO "cars_car"')]
+        self.assertEqual(len(inserts), 3) # 2 + 2 + 1
+
+    def test_per_item_errors(self):
+        self.login(self.user1)
+
+        payload = [
+            {"brand": "Audi", "model": "A4", "motor": "Diesel"},
+            {"brand": "", "model": "911", "motor": "Petrol"},
+            "not a car",
+            {"brand": "Skoda", "model": "Octavia", "motor": "Petrol"},
+        ]
+        response = self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([car["brand"] for car in response.data["data"]], ["Audi", "Skoda"])
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 2])
+        self.assertEqual(response.data["errors"][0]["detail"]["brand"], ["Car brand is required."])
+        self.assertEqual(Car.objects.count(), 2)
+
+    def test_all_items_invalid(self):
+        self.login(self.user1)
+
+        response = self.client.post(self.url, [{"brand": "Audi"}], format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["data"], [])
+        self.assertEqual(len(response.data["errors"]), 1)
+        self.assertEqual(Car.objects.count(), 0)
+
+    def test_body_must_be_a_non_empty_list(self):
+        self.login(self.user1)
+
+        for payload in ([], {"brand": "Audi", "model": "A4", "motor": "Diesel"}):
+            response = self.client.post(self.url, payload, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_input_is_sanitized(self):
+        self.login(self.user1)
+
+        payload = [{"brand": "<script>alert(1)</script>Audi", "model": "A4", "motor": "Diesel"}]
+        response = self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(response.data["data"][0]["brand"], "Audi")
+
+    def test_invalidates_caches_and_updates_filter_options(self):
+        self.login(self.user1)
+
+        # fill the caches
+        self.assertEqual(self.client.get(self.url_list).data["count"], 0)
+        self.client.get(reverse("prpduct_filters"))
+
+        payload = [
+            {"brand": "Audi", "model": "A4", "motor": "Diesel"},
+            {"brand": "Audi", "model": "A6", "motor": "Electric"},
+        ]
+        self.client.post(self.url, payload, format="json")
+
+        self.assertEqual(self.client.get(self.url_list).data["count"], 2)
+
+        filters = self.client.get(reverse("prpduct_filters")).data
+        self.assertEqual(filters["brands"], ["Audi"])
+        self.assertEqual(filters["motors"], ["Diesel", "Electric"])
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.BRAND, value="Audi").count, 2)
+
+    def test_unauthenticated(self):
+        response = self.client.post(self.url, [{"brand": "Audi", "model": "A4", "motor": "Diesel"}], format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+class BulkUpdateDeleteCarsTest(TestCase):
+    """Test module for updating / deleting many car notes with one request."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.cars = [
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+            for i in range(4)
+        ]
+        self.other_car = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_bulk")
+        self.url_list = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_patch_many_cars(self):
+        self.login(self.user1)
+        ids = [self.cars[0].id, self.cars[1].id]
+
+        response = self.client.patch(self.url, {"ids": ids, "changes": {"motor": "Electric"}}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"updated": ids, "not_found": []})
+        self.assertEqual(
+            list(Car.objects.filter(id__in=ids).values_list("brand", "motor")),
+            [("Audi", "Electric"), ("Audi", "Electric")],
+        )
+        self.assertEqual(Car.objects.get(id=self.cars[2].id).motor, "Diesel")
+
+        car = Car.objects.get(id=ids[0])
+        self.assertGreater(car.updatedAt, self.cars[0].updatedAt)
+
+    def test_update_is_one_update_statement(self):
+        self.login(self.user1)
+        ids = [car.id for car in self.cars]
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(self.url, {"ids": ids, "changes": {"model": "A8"}}, format="json")
+
+        updates = [query for query in queries.captured_queries if query["sql"].startswith('UPDATE "cars_car"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_ids_are_reported_in_the_order_of_the_request(self):
+        self.login(self.user1)
+        ids = [self.cars[3].id, 0, self.cars[0].id, self.cars[2].id]
+
+        response = self.client.patch(self.url, {"ids": ids, "changes": {"motor": "Electric"}}, format="json")
+        self.assertEqual(response.data, {"updated": [ids[0], ids[2], ids[3]], "not_found": [0]})
+
+        response = self.client.delete(self.url, {"ids": ids}, format="json")
+        self.assertEqual(response.data, {"deleted": [ids[0], ids[2], ids[3]], "not_found": [0]})
+
+    def test_put_requires_all_fields(self):
+        self.login(self.user1)
+
+        response = self.client.put(
+            self.url, {"ids": [self.cars[0].id], "changes": {"motor": "Electric"}}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.put(
+            self.url,
+            {"ids": [self.cars[0].id], "changes": {"brand": "<b>Skoda</b>", "model": "Octavia", "motor": "Electric"}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Car.objects.get(id=self.cars[0].id).brand, "<b>Skoda</b>")
+
+    def test_update_reports_not_found_ids_and_ignores_other_users_cars(self):
+        self.login(self.user1)
+
+        response = self.client.patch(
+            self.url,
+            {"ids": [self.cars[0].id, self.other_car.id, 999999], "changes": {"brand": "Skoda"}},
+            format="json",
+        )
+
+        self.assertEqual(response.data, {"updated": [self.cars[0].id], "not_found": [self.other_car.id, 999999]})
+        self.assertEqual(Car.objects.get(id=self.other_car.id).brand, "Porsche")
+
+        response = self.client.patch(self.url, {"ids": [self.other_car.id], "changes": {"brand": "Skoda"}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_update_updates_filter_options_and_caches(self):
+        self.login(self.user1)
+        self.assertEqual(self.client.get(self.url_list, {"brand": "Skoda"}).data["count"], 0)
+
+        self.client.patch(
+            self.url, {"ids": [self.cars[0].id, self.cars[1].id], "changes": {"brand": "Skoda"}}, format="json"
+        )
+
+        self.assertEqual(self.client.get(self.url_list, {"brand": "Skoda"}).data["count"], 2)
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.BRAND, value="Skoda").count, 2)
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.BRAND, value="Audi").count, 2)
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.MOTOR, value="Diesel").count, 4)
+
+    def test_delete_many_cars(self):
+        self.login(self.user1)
+        ids = [self.cars[0].id, self.cars[1].id, self.other_car.id]
+
+        self.assertEqual(self.client.get(self.url_list).data["count"], 4)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(self.url, {"ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"deleted": ids[:2], "not_found": [self.other_car.id]})
+        self.assertTrue(Car.objects.filter(id=self.other_car.id).exists())
+        self.assertEqual(Car.objects.filter(user=self.user1).count(), 2)
+
+        # soft delete: one UPDATE, the rows are deleted by the purge job (see deletion.py)
+        writes = [query["sql"] for query in queries.captured_queries if query["sql"].startswith(('DELETE', 'UPDATE "cars_car"'))]
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('UPDATE "cars_car"'))
+
+        self.assertEqual(self.client.get(self.url_list).data["count"], 2)
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.BRAND, value="Audi").count, 2)
+
+        self.assertEqual(purge_deleted_cars(undo_cutoff(0)), 2)
+        self.assertEqual(CarFilterOption.objects.get(kind=CarFilterOption.BRAND, value="Audi").count, 2)
+
+    def test_delete_removes_cars_from_the_search_index(self):
+        if not search_index_available():
+            self.skipTest("SQLite FTS5 trigram index not available")
+
+        self.login(self.user1)
+        self.client.delete(self.url, {"ids": [car.id for car in self.cars]}, format="json")
+
+        self.assertEqual(self.client.get(self.url_list, {"q": "Audi"}).data["count"], 0)
+
+    def test_delete_not_found(self):
+        self.login(self.user1)
+
+        response = self.client.delete(self.url, {"ids": [self.other_car.id]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data["not_found"], [self.other_car.id])
+
+    def test_invalid_ids(self):
+        self.login(self.user1)
+
+        for ids in (None, [], "1,2", [1, "2"], [True], [-1], [2 ** 63], [self.cars[0].id, 2 ** 64]):
+            response = self.client.delete(self.url, {"ids": ids}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            response = self.client.patch(self.url, {"ids": ids, "changes": {"brand": "Skoda"}}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_changes(self):
+        self.login(self.user1)
+
+        response = self.client.patch(self.url, {"ids": [self.cars[0].id], "changes": {}}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class FastCarReadSerializerTest(TestCase):
+    """Test module for the fast read path of the car serializer."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.admin = User.objects.create_superuser(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        for i in range(12):
+            Car.objects.create(brand="Audi", model=f"A{i} é\u2028", motor="Diesel", user=self.user1)
+
+        self.serializer = FastCarReadSerializer()
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_same_output_as_get_car_serializer(self):
+        queryset = Car.objects.order_by("-createdAt", "-id")
+
+        expected = GetCarSerializer(queryset, many=True).data
+        data = self.serializer.serialize(queryset)
+
+        self.assertEqual(data, expected)
+        self.assertEqual([list(car) for car in data], [list(car) for car in expected]) # same key order
+        self.assertEqual(JSONRenderer().render(data), JSONRenderer().render(expected))
+
+    def test_same_output_in_another_time_zone(self):
+        queryset = Car.objects.order_by("-createdAt", "-id")
+
+        with timezone.override("Europe/Berlin"):
+            expected = GetCarSerializer(queryset, many=True).data
+            data = self.serializer.serialize(queryset)
+
+        self.assertEqual(data, expected)
+        self.assertFalse(data[0]["createdAt"].endswith("Z"))
+
+    def test_list_and_detail_responses_are_unchanged(self):
+        self.login(self.user1)
+        expected = GetCarSerializer(Car.objects.order_by("-createdAt", "-id"), many=True).data
+
+        response = self.client.get(reverse("car_list_create"))
+        self.assertEqual(response.data["data"], expected[:9])
+
+        response = self.client.get(reverse("car_list_create"), {"cursor": ""})
+        self.assertEqual(response.data["data"], expected[:9])
+        response = self.client.get(reverse("car_list_create"), {"cursor": response.data["next"]})
+        self.assertEqual(response.data["data"], expected[9:])
+
+        response = self.client.get(reverse("car_detail", kwargs={"id": expected[3]["id"]}))
+        self.assertEqual(response.content, JSONRenderer().render(expected[3]))
+
+        self.login(self.admin)
+        response = self.client.get(reverse("car_list_create_admin"))
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    def test_reads_rows_without_model_instances(self):
+        rows = list(self.serializer.values_list(Car.objects.all()))
+        self.assertIsInstance(rows[0], tuple)
+
+    def test_unsupported_fields_are_rejected(self):
+        class CarWithBrandLengthSerializer(GetCarSerializer):
+            brand_length = serializers.SerializerMethodField()
+
+            def get_brand_length(self, car):
+                return len(car.brand)
+
+        with self.assertRaises(ImproperlyConfigured):
+            FastCarReadSerializer(CarWithBrandLengthSerializer)
+
+class FastJSONTest(TestCase):
+    """Test module for the orjson / stdlib JSON renderer and parser (utils/fastJson.py)."""
+
+    def setUp(self):
+        self.data = {
+            "count": 2,
+            "data": ReturnList([
+                {"id": 1, "brand": "Škoda", "model": "Octavia\u2028RS\u2029", "createdAt": datetime(2024, 5, 1, 10, 30, tzinfo=dt_timezone.utc)},
+                {"id": 2, "brand": "Audi", "model": "A4", "createdAt": datetime(2024, 5, 1, 10, 30, 0, 123456, tzinfo=dt_timezone.utc)},
+            ], serializer=None),
+            "price": Decimal("1.50"),
+            "big": 2 ** 70,
+            "empty": None,
+        }
+
+    def test_same_output_as_drf_renderer(self):
+        expected = JSONRenderer().render(self.data)
+
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+        with mock.patch("utils.fastJson.orjson", None):
+            self.assertEqual(FastJSONRenderer().render(self.data), expected)
+
+    def test_datetimes_and_line_separators(self):
+        data = {"createdAt": datetime(2024, 5, 1, 10, 30, tzinfo=dt_timezone.utc), "model": "a\u2028b"}
+
+        self.assertEqual(
+            FastJSONRenderer().render(data),
+            b'{"createdAt":"2024-05-01T10:30:00Z","model":"a\\u2028b"}',
+        )
+
+    def test_documented_differences_with_drf_renderer(self):
+        from utils import fastJson
+        if fastJson.orjson is None:
+            self.skipTest("orjson is not installed")
+
+        self.assertEqual(FastJSONRenderer().render({"price": float("nan"), "max": float("inf")}), b'{"price":null,"max":null}')
+        offset = dt_timezone(timezone.timedelta(hours=1, minutes=1, seconds=1))
+        self.assertEqual(FastJSONRenderer().render([datetime(2024, 5, 1, 10, 30, tzinfo=offset)]), b'["2024-05-01T10:30:00+01:01"]')
+
+        # the stdlib path behaves like DRF
+        with mock.patch("utils.fastJson.orjson", None):
+            with self.assertRaises(ValueError):
+                FastJSONRenderer().render({"price": float("nan")})
+
+    def test_indent_uses_drf_renderer(self):
+        rendered = FastJSONRenderer().render({"a": 1}, "application/json; indent=4", {})
+        self.assertEqual(rendered, b'{\n    "a": 1\n}')
+
+    def test_parse(self):
+        body = '{"brand": "Škoda", "big": 1180591620717411303424, "ids": [1, 2]}'.encode()
+
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with mock.patch("utils.fastJson.orjson", None):
+            self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+
+    def test_parse_errors(self):
+        for body in (b'{"brand": ', b'{"price": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(BytesIO(body))
+
+    def test_api_uses_fast_renderer_and_parser(self):
+        user = User.objects.create_user(username="u1", email="e1@gmail.com", password="password")
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.post(
+            reverse("car_list_create"),
+            data=json.dumps({"brand": "Škoda", "model": "Octavia", "motor": "Diesel"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(json.loads(response.content)["brand"], "Škoda")
+
+class SparseFieldsetsTest(TestCase):
+    """Test module for the ?fields= query parameter of the car endpoints."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.admin = User.objects.create_superuser(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.cars = [
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+            for i in range(12)
+        ]
+
+        self.url_list = reverse("car_list_create")
+        self.url_admin = reverse("car_list_create_admin")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_list_returns_only_the_requested_fields(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url_list, {"fields": "model, id,brand"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 12)
+        # the serializer order is kept
+        self.assertEqual(list(response.data["data"][0]), ["id", "brand", "model"])
+        self.assertEqual(response.data["data"][0], {"id": self.cars[-1].id, "brand": "Audi", "model": "A11"})
+
+    def test_only_the_requested_columns_are_read(self):
+        self.login(self.user1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url_list, {"fields": "brand"})
+
+        selects = [query["sql"] for query in queries.captured_queries if 'FROM "cars_car"' in query["sql"] and "COUNT" not in query["sql"]]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('"cars_car"."brand"', selects[0])
+        self.assertNotIn('"cars_car"."motor"', selects[0])
+        self.assertNotIn('"cars_car"."updatedAt"', selects[0])
+
+    def test_cursor_pagination_with_fields(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url_list, {"fields": "model", "cursor": ""})
+        self.assertEqual(response.data["data"][0], {"model": "A11"})
+
+        response = self.client.get(self.url_list, {"fields": "model", "cursor": response.data["next"]})
+        self.assertEqual(response.data["data"], [{"model": "A2"}, {"model": "A1"}, {"model": "A0"}])
+
+    def test_cached_pages_depend_on_the_fields(self):
+        self.login(self.user1)
+
+        full = self.client.get(self.url_list)
+        sparse = self.client.get(self.url_list, {"fields": "id"})
+
+        self.assertEqual(len(full.data["data"][0]), 7)
+        self.assertEqual(list(sparse.data["data"][0]), ["id"])
+        self.assertNotEqual(full["ETag"], sparse["ETag"])
+
+    def test_detail(self):
+        self.login(self.user1)
+        url = reverse("car_detail", kwargs={"id": self.cars[0].id})
+
+        full = self.client.get(url)
+        sparse = self.client.get(url, {"fields": "motor,updatedAt"})
+
+        self.assertEqual(len(full.data), 7)
+        self.assertEqual(sparse.data, {"motor": "Diesel", "updatedAt": full.data["updatedAt"]})
+        self.assertNotEqual(full["ETag"], sparse["ETag"])
+
+    def test_admin_list_and_stream(self):
+        self.login(self.admin)
+
+        response = self.client.get(self.url_admin, {"fields": "id"})
+        self.assertEqual(response.data, [{"id": car.id} for car in reversed(self.cars)])
+
+        streamed = self.client.get(self.url_admin, {"fields": "id", "stream": "ndjson"})
+        lines = b"".join(streamed.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], response.data)
+
+    def test_unknown_fields(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url_list, {"fields": "brand,price"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("price", response.data["detail"])
+
+        response = self.client.get(reverse("car_detail", kwargs={"id": self.cars[0].id}), {"fields": "price"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_empty_fields_returns_all_fields(self):
+        self.login(self.user1)
+
+        response = self.client.get(self.url_list, {"fields": ""})
+        self.assertEqual(len(response.data["data"][0]), 7)
+
+class CompressionMiddlewareTest(TestCase):
+    """Test module for the gzip compression of the responses (utils/compressionMiddleware.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.admin = User.objects.create_superuser(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        for i in range(60):
+            Car.objects.create(brand="Volkswagen", model=f"Golf {i}", motor="Diesel", user=self.admin)
+
+        self.url_list = reverse("car_list_create")
+        self.url_admin = reverse("car_list_create_admin")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_large_json_is_compressed(self):
+        self.login(self.admin)
+
+        plain = self.client.get(self.url_admin)
+        compressed = self.client.get(self.url_admin, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+        self.assertLess(len(compressed.content), len(plain.content) / 5)
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+
+    def test_small_responses_are_not_compressed(self):
+        self.login(self.admin)
+
+        response = self.client.get(
+            reverse("car_detail", kwargs={"id": Car.objects.first().id}), HTTP_ACCEPT_ENCODING="gzip"
+        )
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_auth_responses_are_not_compressed(self):
+        request = RequestFactory().get("/api/auth/user/", HTTP_ACCEPT_ENCODING="gzip")
+        response = HttpResponse(b"{}" * 2000, content_type="application/json")
+
+        response = CompressionMiddleware(lambda request: response)(request)
+        self.assertNotIn("Content-Encoding", response)
+
+    def test_content_type_policy(self):
+        request = RequestFactory().get("/media/car.png", HTTP_ACCEPT_ENCODING="gzip")
+
+        image = HttpResponse(b"\x89PNG" * 2000, content_type="image/png")
+        self.assertNotIn("Content-Encoding", CompressionMiddleware(lambda request: image)(request))
+
+        text = HttpResponse(b"car " * 2000, content_type="text/plain; charset=utf-8")
+        self.assertEqual(CompressionMiddleware(lambda request: text)(request)["Content-Encoding"], "gzip")
+
+    def test_streaming_responses_are_compressed_incrementally(self):
+        chunks = [json.dumps([{"brand": "Volkswagen", "model": i}] * 100).encode() for i in range(3)]
+
+        compressed_chunks = list(compress_stream(iter(chunks)))
+
+        # one compressed chunk per chunk (flushed) + the end of the gzip stream
+        self.assertEqual(len(compressed_chunks), 4)
+        decompressor = zlib.decompressobj(31)
+        for chunk, compressed_chunk in zip(chunks, compressed_chunks):
+            # every chunk can be decompressed as soon as it arrives
+            self.assertEqual(decompressor.decompress(compressed_chunk), chunk)
+        self.assertEqual(gzip.decompress(b"".join(compressed_chunks)), b"".join(chunks))
+
+    def test_streamed_admin_list(self):
+        self.login(self.admin)
+
+        plain = self.client.get(self.url_admin, {"stream": "json"})
+        compressed = self.client.get(self.url_admin, {"stream": "json"}, HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(
+            gzip.decompress(b"".join(compressed.streaming_content)), b"".join(plain.streaming_content)
+        )
+
+    def test_etag_is_weak_and_still_matches(self):
+        self.login(self.admin)
+
+        response = self.client.get(self.url_list, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertTrue(response["ETag"].startswith('W/"'))
+
+        response = self.client.get(
+            self.url_list, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+class SanitizeUserInputTest(TestCase):
+    """Test module for the fast path and the memo of utils/sanitizeUserInput.py."""
+
+    def test_fast_path_matches_nh3(self):
+        # the special characters alone, at the start, in the middle and at the end of a string
+        values = ["Audi", "A4 Avant", "Škoda Octavia", "日本", "🚗", "\t", "\n"]
+        for special in ["\ufeff", "<", ">", "&", "\x00", "\r", "\xa0"]:
+            values += [special, f"{special}Audi", f"Au{special}di", f"Audi{special}"]
+
+        # and a bounded random sample of short strings of any code points (fixed seed)
+        rng = random.Random(0)
+        code_points = [code_point for code_point in range(0x110000) if not 0xD800 <= code_point <= 0xDFFF]
+        values += ["".join(chr(rng.choice(code_points)) for _ in range(rng.randint(1, 4))) for _ in range(2000)]
+
+        for value in values:
+            self.assertEqual(sanitize_string(value), nh3.clean(value), repr(value))
+
+    def test_same_result_as_nh3(self):
+        values = ["Diesel", "Aston Martin", "a & b", "<script>alert(1)</script>Audi", "x\r\ny", "a\xa0b", "a\x00b", "<b>A4</b>"]
+
+        for value in values:
+            self.assertEqual(sanitize_string(value), nh3.clean(value))
+            self.assertEqual(sanitize_string(value, memoize=True), nh3.clean(value))
+
+    def test_plain_values_skip_nh3(self):
+        with mock.patch("utils.sanitizeUserInput.nh3.clean") as clean:
+            data = sanitize_user_input({"brand": "Audi", "model": "A4", "motor": "Diesel", "year": 2020})
+
+        clean.assert_not_called()
+        self.assertEqual(data, {"brand": "Audi", "model": "A4", "motor": "Diesel", "year": 2020})
+
+    def test_memo(self):
+        _clean_cached.cache_clear()
+
+        payloads = [{"brand": "<b>Audi</b>", "model": f"A{i}"} for i in range(10)]
+        data = sanitize_user_inputs(payloads)
+
+        self.assertEqual([item["brand"] for item in data], ["<b>Audi</b>"] * 10)
+        self.assertEqual(_clean_cached.cache_info().misses, 1)
+        self.assertEqual(_clean_cached.cache_info().hits, 9)
+
+    def test_no_memo_by_default(self):
+        # sanitize_user_input is also used for passwords: not kept in memory unless asked for
+        _clean_cached.cache_clear()
+
+        sanitize_user_input({"password": "p&ssw<rd"})
+        self.assertEqual(_clean_cached.cache_info().currsize, 0)
+
+class BrandMotorDimensionsTest(TestCase):
+    """Test module for the normalized Brand / Motor lookup tables."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+
+        self.url_list = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_names_are_case_folded_and_interned(self):
+        car1 = Car.objects.create(brand="Škoda", model="Octavia", motor="Diesel", user=self.user1)
+        car2 = Car.objects.create(brand="ŠKODA ", model="Fabia", motor="DIESEL", user=self.user1)
+
+        self.assertEqual(car1.brandRef_id, car2.brandRef_id)
+        self.assertEqual(car1.motorRef_id, car2.motorRef_id)
+        self.assertEqual(list(Brand.objects.values_list("name", flat=True)), ["škoda"])
+        self.assertEqual(list(Motor.objects.values_list("name", flat=True)), ["diesel"])
+
+        # the strings are kept as typed
+        self.assertEqual(Car.objects.get(id=car2.id).brand, "ŠKODA ")
+
+    def test_update_changes_the_reference(self):
+        car = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+        car.brand = "Porsche"
+        car.save(update_fields=["brand"])
+
+        car = Car.objects.get(id=car.id)
+        self.assertEqual(car.brandRef.name, "porsche")
+
+    def test_bulk_create_sets_the_references(self):
+        cars = Car.objects.bulk_create([
+            Car(brand="Audi", model=f"A{i}", motor="Electric" if i % 2 else "Diesel", user=self.user1)
+            for i in range(10)
+        ])
+
+        self.assertEqual(len({car.brandRef_id for car in cars}), 1)
+        self.assertEqual(Motor.objects.count(), 2)
+        self.assertFalse(Car.objects.filter(brandRef__isnull=True).exists())
+
+    def test_api_accepts_and_returns_strings(self):
+        self.login(self.user1)
+
+        response = self.client.post(self.url_list, {"brand": "Aston Martin", "model": "DB11", "motor": "Petrol"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        car = self.client.get(self.url_list).data["data"][0]
+        self.assertEqual(car["brand"], "Aston Martin")
+        self.assertNotIn("brandRef", car)
+        self.assertNotIn("motorRef", car)
+
+    def test_filters_are_case_insensitive_for_non_ascii(self):
+        self.login(self.user1)
+        car = Car.objects.create(brand="Škoda", model="Octavia", motor="Diesel", user=self.user1)
+        Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+        response = self.client.get(self.url_list, {"brand": "ŠKOD"})
+        self.assertEqual([item["id"] for item in response.data["data"]], [car.id])
+
+    def test_bulk_update_changes_the_reference(self):
+        self.login(self.user1)
+        car = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+        self.client.patch(reverse("car_bulk"), {"ids": [car.id], "changes": {"brand": "BMW"}}, format="json")
+
+        self.assertEqual(Car.objects.get(id=car.id).brandRef.name, "bmw")
+        response = self.client.get(self.url_list, {"brand": "bmw"})
+        self.assertEqual(response.data["count"], 1)
+
+    def test_rolled_back_names_are_not_remembered(self):
+        try:
+            with transaction.atomic():
+                Brand.objects.intern("Lada")
+                raise IntegrityError
+        except IntegrityError:
+            pass
+
+        self.assertFalse(Brand.objects.filter(name="lada").exists())
+        car = Car.objects.create(brand="Lada", model="Niva", motor="Petrol", user=self.user1)
+        self.assertEqual(car.brandRef.name, "lada")
+
+
+class FoldedShadowColumnsTest(TestCase):
+    """Test module for the case-folded shadow columns and the exact / prefix filters."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Volkswagen", model="Golf", motor="Diesel", user=self.user1)
+        self.car2 = Car.objects.create(brand="VOLVO", model="XC60", motor="Electric", user=self.user1)
+        self.car3 = Car.objects.create(brand="Audi", model="A4 Avant", motor="Diesel", user=self.user1)
+        self.car4 = Car.objects.create(brand="Volvo", model="V60", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def get_ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return sorted(car["id"] for car in response.data["data"])
+
+    def explain(self, params):
+        queryset = Car.objects.filter(Q(user=self.user1) & build_car_filters(params)).order_by()
+        with connection.cursor() as cursor:
+            sql, sql_params = queryset.query.sql_with_params()
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, sql_params)
+            return " ".join(row[-1] for row in cursor.fetchall())
+
+    def test_folded_columns_are_maintained(self):
+        car = Car.objects.get(id=self.car2.id)
+        self.assertEqual((car.brandFolded, car.modelFolded, car.motorFolded), ("volvo", "xc60", "electric"))
+
+        car.model = " XC90 "
+        car.save(update_fields=["model"])
+        self.assertEqual(Car.objects.get(id=car.id).modelFolded, "xc90")
+
+        cars = Car.objects.bulk_create([Car(brand="ŠKODA", model="Fabia", motor="Petrol", user=self.user1)])
+        self.assertEqual(Car.objects.get(id=cars[0].id).brandFolded, "škoda")
+
+    def test_bulk_update_maintains_the_folded_columns(self):
+        self.login(self.user1)
+        self.client.patch(reverse("car_bulk"), {"ids": [self.car3.id], "changes": {"model": "Q7"}}, format="json")
+
+        self.assertEqual(Car.objects.get(id=self.car3.id).modelFolded, "q7")
+
+    def test_exact_filter(self):
+        self.login(self.user1)
+
+        self.assertEqual(self.get_ids({"brand_exact": "volvo"}), [self.car2.id])
+        self.assertEqual(self.get_ids({"brand_exact": "VOLVO-audi"}), [self.car2.id, self.car3.id])
+        self.assertEqual(self.get_ids({"model_exact": "a4"}), [])
+        self.assertEqual(self.get_ids({"model_exact": "a4 avant"}), [self.car3.id])
+        self.assertEqual(self.get_ids({"motor_exact": "diesel", "brand_exact": "audi"}), [self.car3.id])
+
+    def test_prefix_filter(self):
+        self.login(self.user1)
+
+        self.assertEqual(self.get_ids({"brand_prefix": "VOL"}), [self.car1.id, self.car2.id])
+        self.assertEqual(self.get_ids({"brand_prefix": "volv-au"}), [self.car2.id, self.car3.id])
+        self.assertEqual(self.get_ids({"model_prefix": "xc", "motor_prefix": "die"}), [])
+
+        # restricted to the request user
+        self.login(self.user2)
+        self.assertEqual(self.get_ids({"brand_prefix": "vol"}), [self.car4.id])
+
+    def test_prefix_upper_bound(self):
+        self.assertEqual(prefix_upper_bound("vol"), "vom")
+        self.assertEqual(prefix_upper_bound("a\U0010ffff"), "b")
+        self.assertEqual(prefix_upper_bound("\ud7ff"), "\ue000")
+        self.assertIsNone(prefix_upper_bound("\U0010ffff"))
+
+    def test_filters_use_the_folded_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite query plans only")
+        for params, index in (
+            ({"brand_exact": "volvo-audi"}, "car_user_brand_folded_idx"),
+            ({"model_prefix": "xc"}, "car_user_model_folded_idx"),
+            ({"motor_prefix": "die-ele"}, "car_user_motor_folded_idx"),
+        ):
+            plan = self.explain(params)
+            self.assertIn(index, plan)
+            self.assertNotIn("SCAN cars_car", plan)
+
+    def test_cache_keys_include_the_new_filters(self):
+        self.assertNotEqual(
+            normalize_filter_params({"brand_prefix": "vol"}),
+            normalize_filter_params({"brand_exact": "vol"}),
+        )
+        self.assertEqual(normalize_filter_params({"brand": "audi"}), "brand=audi;motor=;q=")
+
+        self.login(self.user1)
+        self.assertEqual(self.client.get(self.url, {"brand_prefix": "vol"}).data["count"], 2)
+        self.assertEqual(self.client.get(self.url, {"brand_exact": "vol"}).data["count"], 0)
+
+
+class CarSuggestTest(TestCase):
+    """Test module for the autocomplete suggestions (/api/cars/suggest/)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+
+        self.car1 = Car.objects.create(brand="Volkswagen", model="Golf", motor="Diesel", user=self.user1)
+        self.car2 = Car.objects.create(brand="Volkswagen", model="Polo", motor="Petrol", user=self.user1)
+        self.car3 = Car.objects.create(brand="Volvo", model="XC60", motor="Electric", user=self.user1)
+        self.car4 = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+        self.url = reverse("car_suggest")
+
+    def suggest(self, field, prefix, **params):
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.url, {"field": field, "prefix": prefix, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(item["value"], item["count"]) for item in response.data["suggestions"]]
+
+    def test_suggest_unauthenticated(self):
+        response = self.client.get(self.url, {"field": "brand", "prefix": "vo"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_suggestions_are_ordered_by_frequency(self):
+        self.assertEqual(self.suggest("brand", "VO"), [("Volkswagen", 2), ("Volvo", 1)])
+        self.assertEqual(self.suggest("brand", "volv"), [("Volvo", 1)])
+        self.assertEqual(self.suggest("brand", "vo", limit=1), [("Volkswagen", 2)])
+        self.assertEqual(self.suggest("model", "x"), [("XC60", 1)])
+        self.assertEqual(self.suggest("brand", "bmw"), [])
+        self.assertEqual(self.suggest("brand", "  "), [])
+
+    def test_invalid_parameters(self):
+        self.client.force_authenticate(user=self.user1)
+
+        for params in (
+            {"field": "motor", "prefix": "d"},
+            {"prefix": "d"},
+            {"field": "brand", "prefix": "v", "limit": "many"},
+            {"field": "brand", "prefix": "v", "limit": "0"},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_suggestions_only_show_the_cars_of_the_user(self):
+        user2 = User.objects.create_user(username="u2", email="e2@gmail.com", password="password")
+        Car.objects.create(brand="Volvo", model="Golf secret project", motor="Diesel", user=user2)
+        Car.objects.create(brand="Vauxhall", model="Astra", motor="Diesel", user=user2)
+
+        self.assertEqual(self.suggest("brand", "v"), [("Volkswagen", 2), ("Volvo", 1)])
+        self.assertEqual(self.suggest("model", "golf"), [("Golf", 1)])
+
+        self.client.force_authenticate(user=user2)
+        response = self.client.get(self.url, {"field": "model", "prefix": "g"})
+        self.assertEqual(response.data["suggestions"], [{"value": "Golf secret project", "count": 1}])
+
+    def test_index_follows_the_changes_of_the_cars(self):
+        self.suggest("brand", "vo")
+
+        Car.objects.create(brand="Volvo", model="V60", motor="Petrol", user=self.user1)
+        self.car1.delete()
+        self.client.force_authenticate(user=self.user1)
+        self.client.delete(reverse("car_detail", kwargs={"id": self.car2.id}))
+
+        # the soft deleted car2 is not suggested either
+        self.assertEqual(self.suggest("brand", "vo"), [("Volvo", 2)])
+        self.assertEqual(self.suggest("model", "v"), [("V60", 1)])
+
+    def test_unchanged_index_reads_no_car(self):
+        self.suggest("brand", "vo")
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.suggest("brand", "au"), [("Audi", 1)])
+            self.suggest("model", "p")
+
+        self.assertFalse([query for query in queries.captured_queries if "cars_car" in query["sql"]])
+
+    def test_filter_options_do_not_count_models(self):
+        self.assertFalse(CarFilterOption.objects.filter(kind="model").exists())
+
+        response = self.client.get(reverse("prpduct_filters"))
+        self.assertEqual(response.data, {"brands": ["Audi", "Volkswagen", "Volvo"], "motors": ["Diesel", "Electric", "Petrol"]})
+
+        # a new model only changes the car
+        with CaptureQueriesContext(connection) as queries:
+            self.car1.model = "Golf GTI"
+            self.car1.save()
+        self.assertFalse([query for query in queries.captured_queries if "cars_carfilteroption" in query["sql"]])
+
+    def test_model_options_follow_updates(self):
+        self.car1.model = "Golf GTI"
+        self.car1.save()
+
+        self.assertEqual(self.suggest("model", "golf"), [("Golf GTI", 1)])
+
+    def test_prefix_index(self):
+        index = PrefixIndex({"Škoda": 3, "SKODA": 1, "Seat": 2, "Smart": 0})
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.top("š", 10), [("Škoda", 3)])
+        # "š" is another letter than "s"
+        self.assertEqual(index.top("s", 10), [("Seat", 2), ("SKODA", 1)])
+        self.assertEqual(index.top("s", 1), [("Seat", 2)])
+        self.assertEqual(index.top("sk", 10), [("SKODA", 1)])
+
+
+class ArchivedCarsTest(TestCase):
+    """Test module for the hot / cold archive of the car notes (cars/archive.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        # 12 recent cars (pages of 9 + 3) and 5 cars not updated for two years
+        self.hot_cars = [
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+            for i in range(12)
+        ]
+        self.old_cars = [
+            Car.objects.create(brand="Volvo", model=f"V{i}", motor="Petrol", user=self.user1)
+            for i in range(5)
+        ]
+        Car.objects.filter(id__in=[car.id for car in self.old_cars]).update(
+            createdAt=timezone.now() - timezone.timedelta(days=800),
+            updatedAt=timezone.now() - timezone.timedelta(days=730),
+        )
+        self.other_car = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user2)
+
+        self.url = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def archive(self):
+        return archive_cars(archive_cutoff(365))
+
+    def list_ids(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [car["id"] for car in response.data["data"]], response
+
+    def all_ids(self, **params):
+        """Walk all the pages with the cursors, return the ids."""
+        ids, response = self.list_ids(cursor="", **params)
+        while response.data["next"]:
+            page_ids, response = self.list_ids(cursor=response.data["next"], **params)
+            ids += page_ids
+        return ids
+
+    def test_only_old_cars_are_moved_and_keep_their_ids(self):
+        old_rows = [
+            {column: value for column, value in row.items() if column != "deletedAt"}
+            for row in Car.objects.filter(id__in=[car.id for car in self.old_cars]).order_by("id").values()
+        ]
+
+        self.assertEqual(self.archive(), 5)
+
+        self.assertEqual(Car.objects.count(), 13)
+        self.assertEqual(
+            list(ArchivedCar.objects.order_by("id").values(*old_rows[0])),
+            old_rows,
+        )
+        self.assertTrue(all(car.archivedAt is not None for car in ArchivedCar.objects.all()))
+
+        # nothing left to archive
+        self.assertEqual(self.archive(), 0)
+
+    def test_archive_runs_in_batches(self):
+        self.assertEqual(archive_cars(archive_cutoff(365), batch_size=2), 5)
+        self.assertEqual(ArchivedCar.objects.count(), 5)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command("archive_cars", "--days", "365", "--batch-size", "2", stdout=out)
+
+        self.assertIn("5 car(s) not updated since", out.getvalue())
+        self.assertEqual(ArchivedCar.objects.count(), 5)
+
+    def test_default_list_only_reads_the_hot_cars(self):
+        self.login(self.user1)
+        self.archive()
+
+        ids, response = self.list_ids()
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(response.data["pages"], 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.all_ids()), 12)
+            self.client.get(self.url, {"page": 2, "brand": "Volvo"})
+        self.assertFalse(any("cars_archivedcar" in query["sql"] for query in queries.captured_queries))
+
+    def test_archiving_invalidates_the_cached_pages(self):
+        self.login(self.user1)
+        self.assertEqual(self.list_ids()[1].data["count"], 17)
+
+        self.archive()
+
+        self.assertEqual(self.list_ids()[1].data["count"], 12)
+
+    def test_include_archived_pages_follow_the_hot_cars(self):
+        self.login(self.user1)
+        expected_ids = (
+            [car.id for car in reversed(self.hot_cars)] + [car.id for car in reversed(self.old_cars)]
+        )
+        self.archive()
+
+        ids, response = self.list_ids(include_archived=1)
+        self.assertEqual(response.data["count"], 17)
+        self.assertEqual(response.data["pages"], 2)
+
+        ids += self.list_ids(include_archived=1, page=2)[0]
+        self.assertEqual(ids, expected_ids)
+
+        # the last page, also for an out of range page number
+        self.assertEqual(self.list_ids(include_archived="true", page=99)[0], expected_ids[9:])
+
+    def test_include_archived_reads_the_archive_lazily(self):
+        self.login(self.user1)
+        self.archive()
+
+        # the first page only has hot cars
+        with CaptureQueriesContext(connection) as queries:
+            self.list_ids(include_archived=1, cursor="")
+        self.assertFalse(any("cars_archivedcar" in query["sql"] for query in queries.captured_queries))
+
+    def test_include_archived_cursors_walk_forward_and_backward(self):
+        self.login(self.user1)
+        expected_ids = (
+            [car.id for car in reversed(self.hot_cars)] + [car.id for car in reversed(self.old_cars)]
+        )
+        self.archive()
+
+        first_ids, first = self.list_ids(include_archived=1, cursor="")
+        second_ids, second = self.list_ids(include_archived=1, cursor=first.data["next"])
+        # the second page: the last 3 hot cars, then the 5 archived cars
+        self.assertEqual(first_ids + second_ids, expected_ids)
+        self.assertIsNone(second.data["next"])
+
+        back_ids, back = self.list_ids(include_archived=1, cursor=second.data["previous"])
+        self.assertEqual(back_ids, first_ids)
+        self.assertIsNone(back.data["previous"])
+
+        # walking back from a position in the archived cars crosses into the hot cars
+        last = ArchivedCar.objects.get(id=expected_ids[-1])
+        back_ids, back = self.list_ids(include_archived=1, cursor=encode_cursor(last.createdAt, last.id, "p", archived=True))
+        self.assertEqual(back_ids, expected_ids[7:16])
+        self.assertIsNotNone(back.data["previous"])
+        self.assertEqual(self.list_ids(include_archived=1, cursor=back.data["next"])[0], expected_ids[16:])
+
+        self.assertEqual(self.all_ids(include_archived=1), expected_ids)
+
+    def test_include_archived_with_filters_and_facets(self):
+        self.login(self.user1)
+        self.archive()
+
+        ids, response = self.list_ids(include_archived=1, q="volvo", facets="brand")
+        self.assertEqual(sorted(ids), sorted(car.id for car in self.old_cars))
+        self.assertEqual(response.data["facets"], {"brand": [{"value": "Volvo", "count": 5}]})
+
+        ids, response = self.list_ids(include_archived=1, brand_prefix="vol", motor="petrol")
+        self.assertEqual(len(ids), 5)
+
+        # without the archive
+        ids, response = self.list_ids(q="volvo", facets="brand")
+        self.assertEqual((ids, response.data["facets"]), ([], {"brand": []}))
+
+    def test_include_archived_is_restricted_to_request_user(self):
+        self.login(self.user2)
+        Car.objects.filter(id=self.other_car.id).update(updatedAt=timezone.now() - timezone.timedelta(days=730))
+        self.archive()
+
+        ids, response = self.list_ids(include_archived=1)
+        self.assertEqual(ids, [self.other_car.id])
+
+    def test_detail_of_an_archived_car(self):
+        self.login(self.user1)
+        car = self.old_cars[0]
+        self.archive()
+
+        response = self.client.get(reverse("car_detail", kwargs={"id": car.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["id"], response.data["model"]), (car.id, "V0"))
+
+        # not the cars of other users
+        self.login(self.user2)
+        response = self.client.get(reverse("car_detail", kwargs={"id": car.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_updating_an_archived_car_makes_it_hot_again(self):
+        self.login(self.user1)
+        car = self.old_cars[0]
+        self.archive()
+
+        response = self.client.put(
+            reverse("car_detail", kwargs={"id": car.id}), {"brand": "Volvo", "model": "XC90", "motor": "Hybrid"}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(ArchivedCar.objects.filter(id=car.id).exists())
+        self.assertEqual(Car.objects.get(id=car.id).model, "XC90")
+        self.assertEqual(self.list_ids()[1].data["count"], 13)
+
+    def test_deleting_archived_cars(self):
+        self.login(self.user1)
+        self.archive()
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 5)
+
+        response = self.client.delete(reverse("car_detail", kwargs={"id": self.old_cars[0].id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        response = self.client.delete(
+            reverse("car_bulk"), {"ids": [self.old_cars[1].id, self.old_cars[2].id, 0]}, format="json"
+        )
+        self.assertEqual(response.data, {"deleted": [self.old_cars[1].id, self.old_cars[2].id], "not_found": [0]})
+
+        self.assertEqual(ArchivedCar.objects.count(), 2)
+        self.assertEqual(Car.objects.filter(brand="Volvo").count(), 0)
+        self.assertEqual(Car.all_objects.filter(brand="Volvo").count(), 3)
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 2)
+
+        self.assertEqual(purge_deleted_cars(undo_cutoff(0)), 3)
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 2)
+
+    def test_admin_deletes_an_archived_car(self):
+        admin = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="password")
+        self.login(admin)
+        self.archive()
+
+        response = self.client.delete(reverse("car_detail_admin", kwargs={"id": self.old_cars[0].id}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(ArchivedCar.objects.count() + Car.objects.filter(brand="Volvo").count(), 4)
+
+    def test_archived_cars_keep_their_filter_options(self):
+        self.archive()
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 5)
+
+        filter_options.rebuild_filter_options()
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 5)
+
+        # deleting the user deletes the archived cars (and their counts)
+        self.user1.delete()
+        self.assertFalse(ArchivedCar.objects.exists())
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Volvo").count, 0)
+
+    def test_restore_only_restores_the_cars_of_the_user(self):
+        self.archive()
+        ids = [car.id for car in self.old_cars[:2]]
+
+        self.assertEqual(restore_archived_cars(self.user2.id, ids), [])
+        self.assertEqual(sorted(restore_archived_cars(self.user1.id, ids)), ids)
+        self.assertEqual(ArchivedCar.objects.count(), 3)
+        # the restored cars are found by the search index again
+        self.login(self.user1)
+        self.assertEqual(sorted(self.list_ids(q="volvo")[0]), ids)
+
+    def test_hot_then_archived_rows_slices(self):
+        rows = HotThenArchivedRows(list(range(5)), list(range(10, 13)), count=5, archived_count=3)
+
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(list(rows[0:3]), [0, 1, 2])
+        self.assertEqual(list(rows[3:7]), [3, 4, 10, 11])
+        self.assertEqual(list(rows[6:20]), [11, 12])
+        # a slice within the hot rows does not touch the archived rows
+        self.assertEqual(len(rows[0:5].querysets), 1)
+
+    def test_cursor_tokens_remember_the_archive(self):
+        created_at = timezone.now()
+
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 7, "n")), (created_at, 7, "n", False))
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 7, "p", archived=True)), (created_at, 7, "p", True))
+
+
+class SoftDeleteCarsTest(TestCase):
+    """Test module for the soft delete, the undo and the purge of the car notes (cars/deletion.py)."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.user2 = User.objects.create_user(
+            username="u2", email="e2@gmail.com", password="password"
+        )
+
+        self.cars = [
+            Car.objects.create(brand="Audi", model=f"A{i}", motor="Diesel", user=self.user1)
+            for i in range(3)
+        ]
+        self.other_car = Car.objects.create(brand="Porsche", model="911", motor="Petrol", user=self.user2)
+
+        self.url_list = reverse("car_list_create")
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def delete(self, car):
+        return self.client.delete(reverse("car_detail", kwargs={"id": car.id}))
+
+    def restore(self, car):
+        return self.client.post(reverse("car_restore", kwargs={"id": car.id}))
+
+    def make_old(self, *cars, seconds=3600):
+        Car.all_objects.filter(id__in=[car.id for car in cars]).update(
+            deletedAt=timezone.now() - timezone.timedelta(seconds=seconds)
+        )
+
+    def test_delete_is_one_update(self):
+        self.login(self.user1)
+        self.assertEqual(self.client.get(self.url_list).data["count"], 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.delete(self.cars[0])
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        car_writes = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith(("DELETE", 'UPDATE "cars_car"'))
+        ]
+        self.assertEqual(len(car_writes), 1)
+        self.assertIn('"deletedAt"', car_writes[0])
+
+        # the car is hidden everywhere, but its row is still there
+        self.assertEqual(self.client.get(self.url_list).data["count"], 2)
+        self.assertEqual(self.client.get(reverse("car_detail", kwargs={"id": self.cars[0].id})).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Car.objects.filter(id=self.cars[0].id).exists())
+        self.assertIsNotNone(Car.all_objects.get(id=self.cars[0].id).deletedAt)
+
+        # a deleted car cannot be deleted or updated again
+        self.assertEqual(self.delete(self.cars[0]).status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.put(
+            reverse("car_detail", kwargs={"id": self.cars[0].id}),
+            {"brand": "Audi", "model": "A8", "motor": "Diesel"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_undo_within_the_window(self):
+        self.login(self.user1)
+        self.delete(self.cars[0])
+
+        response = self.restore(self.cars[0])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(Car.objects.get(id=self.cars[0].id).deletedAt)
+        self.assertEqual(self.client.get(self.url_list).data["count"], 3)
+        self.assertEqual(self.client.get(reverse("car_detail", kwargs={"id": self.cars[0].id})).status_code, status.HTTP_200_OK)
+
+        # a car which is not deleted cannot be restored
+        self.assertEqual(self.restore(self.cars[0]).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_undo_after_the_window_or_by_another_user(self):
+        self.login(self.user1)
+        self.delete(self.cars[0])
+        self.delete(self.cars[1])
+        self.make_old(self.cars[1], seconds=CARS_UNDO_DELETE_SECONDS + 60)
+
+        self.assertEqual(self.restore(self.cars[1]).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.login(self.user2)
+        self.assertEqual(self.restore(self.cars[0]).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNotNone(Car.all_objects.get(id=self.cars[0].id).deletedAt)
+
+    def test_undo_without_auth(self):
+        response = self.restore(self.cars[0])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_purge_runs_in_batches(self):
+        self.login(self.user1)
+        for car in self.cars:
+            self.delete(car)
+        self.make_old(*self.cars[:2])
+
+        cutoff = undo_cutoff()
+        self.assertEqual(purge_deleted_cars_batch(cutoff, batch_size=1), 1)
+        self.assertEqual(purge_deleted_cars(cutoff, batch_size=1), 1)
+        self.assertEqual(purge_deleted_cars(cutoff), 0)
+
+        # the car deleted within the undo window is kept, and can still be restored
+        self.assertEqual(list(Car.all_objects.filter(user=self.user1).values_list("id", flat=True)), [self.cars[2].id])
+        self.assertEqual(self.restore(self.cars[2]).status_code, status.HTTP_200_OK)
+
+    def test_purge_command(self):
+        self.login(self.user1)
+        self.delete(self.cars[0])
+        self.make_old(self.cars[0])
+
+        out = StringIO()
+        call_command("purge_deleted_cars", stdout=out)
+
+        self.assertIn("1 car(s)", out.getvalue())
+        self.assertFalse(Car.all_objects.filter(id=self.cars[0].id).exists())
+
+    def test_filter_options_follow_delete_undo_and_purge(self):
+        self.login(self.user2)
+        url = reverse("prpduct_filters")
+
+        # the public filter options do not show the brands of the deleted cars
+        self.delete(self.other_car)
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Porsche").count, 0)
+        self.assertEqual(self.client.get(url).data["brands"], ["Audi"])
+        filter_options.rebuild_filter_options()
+        self.assertFalse(CarFilterOption.objects.filter(kind="brand", value="Porsche", count__gt=0).exists())
+
+        self.restore(self.other_car)
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Porsche").count, 1)
+        self.assertEqual(self.client.get(url).data["brands"], ["Audi", "Porsche"])
+
+        self.delete(self.other_car)
+        purge_deleted_cars(undo_cutoff(0))
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Porsche").count, 0)
+
+    def test_purge_uses_the_partial_index(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN is SQLite only")
+
+        queryset = Car.all_objects.filter(deletedAt__isnull=False, deletedAt__lt=undo_cutoff()).order_by("deletedAt", "id")
+        sql, params = queryset.values_list("id")[:10].query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+
+        self.assertIn("car_deleted_id_idx", plan)
+
+    def test_bulk_delete_is_soft(self):
+        self.login(self.user1)
+        ids = [car.id for car in self.cars[:2]]
+
+        response = self.client.delete(reverse("car_bulk"), {"ids": ids}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Car.all_objects.filter(id__in=ids, deletedAt__isnull=False).count(), 2)
+        self.assertEqual(self.restore(self.cars[0]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(self.url_list).data["count"], 2)
+
+    def test_admin_delete_is_soft(self):
+        admin = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="password")
+        self.login(admin)
+
+        response = self.client.delete(reverse("car_detail_admin", kwargs={"id": self.other_car.id}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNotNone(Car.all_objects.get(id=self.other_car.id).deletedAt)
+
+        response = self.client.delete(reverse("car_detail_admin", kwargs={"id": self.other_car.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # the owner can undo the delete
+        self.login(self.user2)
+        self.assertEqual(self.restore(self.other_car).status_code, status.HTTP_200_OK)
+
+    def test_deleting_the_user_deletes_the_deleted_cars(self):
+        Car.objects.create(brand="Audi", model="Q5", motor="Diesel", user=self.user2)
+        self.login(self.user1)
+        self.delete(self.cars[0])
+
+        self.user1.delete()
+
+        self.assertFalse(Car.all_objects.filter(user_id=self.user1.id).exists())
+        # the deleted car is not removed from the filter options twice
+        self.assertEqual(CarFilterOption.objects.get(kind="brand", value="Audi").count, 1)
+
+
+# The same tests against the async views of the ASGI mode (settings.ASYNC_VIEWS, see car_notes_api/urls_async.py)
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncGetAllCarsTest(GetAllCarsTest):
+    """GetAllCarsTest against AsyncCarListCreateApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncGetSingleCarTest(GetSingleCarTest):
+    """GetSingleCarTest against AsyncCarDetailApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncCreateNewCarTest(CreateNewCarTest):
+    """CreateNewCarTest against AsyncCarListCreateApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncUpdateCarTest(UpdateCarTest):
+    """UpdateCarTest against AsyncCarDetailApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncDeleteSingleCarTest(DeleteSingleCarTest):
+    """DeleteSingleCarTest against AsyncCarDetailApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncCursorPaginationTest(CursorPaginationTest):
+    """CursorPaginationTest against AsyncCarListCreateApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncArchivedCarsTest(ArchivedCarsTest):
+    """ArchivedCarsTest against the async car views."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncSoftDeleteCarsTest(SoftDeleteCarsTest):
+    """SoftDeleteCarsTest against the async car views."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncSearchFilterTest(SearchFilterTest):
+    """SearchFilterTest against AsyncCarListCreateApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncConditionalGetTest(ConditionalGetTest):
+    """ConditionalGetTest against the async views."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncFacetsTest(FacetsTest):
+    """FacetsTest against AsyncCarListCreateApiView."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncSparseFieldsetsTest(SparseFieldsetsTest):
+    """SparseFieldsetsTest against the async views."""
+
+
+@override_settings(ROOT_URLCONF="car_notes_api.urls_async")
+class AsyncCarViewsTest(TestCase):
+    """Test module for the routing and the event loop execution of the async car views."""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            username="u1", email="e1@gmail.com", password="password"
+        )
+        self.car1 = Car.objects.create(brand="Audi", model="A4", motor="Diesel", user=self.user1)
+
+    def test_async_views_are_routed(self):
+        match = resolve(reverse("car_list_create"))
+        self.assertIs(match.func.view_class, AsyncCarListCreateApiView)
+        self.assertTrue(iscoroutinefunction(match.func))
+
+        match = resolve(reverse("car_detail", kwargs={"id": self.car1.id}))
+        self.assertIs(match.func.view_class, AsyncCarDetailApiView)
+
+        # the endpoints without an async version are the sync ones
+        self.assertFalse(iscoroutinefunction(resolve(reverse("car_bulk")).func))
+
+    async def test_views_run_on_the_event_loop(self):
+        client = AsyncClient()
+        await client.aforce_login(self.user1)
+
+        response = await client.get(reverse("car_list_create"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([car["id"] for car in response.json()["data"]], [self.car1.id])
+
+        response = await client.get(reverse("car_detail", kwargs={"id": self.car1.id}), {"fields": "id,brand"})
+        self.assertEqual(response.json(), {"id": self.car1.id, "brand": "Audi"})
+
+        # Basic authentication queries the database, it runs in a thread
+        credentials = base64.b64encode(b"u1:password").decode()
+        response = await AsyncClient().get(reverse("car_list_create"), headers={"Authorization": f"Basic {credentials}"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_unauthenticated(self):
+        response = await AsyncClient().get(reverse("car_list_create"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SqlitePragmasTest(TestCase):
+    """Test module for the pragmas run on every new SQLite connection (utils/sqliteTuning.py)."""
+
+    def test_pragmas(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("SQLite only")
+        with connection.cursor() as cursor:
+            def pragma(name):
+                cursor.execute(f"PRAGMA {name}")
+                return cursor.fetchone()[0]
+
+            self.assertEqual(pragma("synchronous"), 1)  # NORMAL
+            self.assertEqual(pragma("temp_store"), 2)  # MEMORY
+            self.assertEqual(pragma("cache_size"), -20000)
+            self.assertEqual(pragma("busy_timeout"), 5000)
+
+
+class RetryOnDatabaseLockedTest(SimpleTestCase):
+    """Test module for the retry of the write transactions which fail with "database is locked"."""
+
+    databases = {"default"}
+
+    def failing(self, errors, result="done"):
+        """Function which raises the given errors (one per call), then returns result."""
+        errors = list(errors)
+        calls = []
+
+        def func():
+            calls.append(connection.in_atomic_block)
+            if errors:
+                raise errors.pop(0)
+            return result
+
+        return func, calls
+
+    @mock.patch("utils.sqliteTuning.time.sleep")
+    def test_retried_in_a_transaction(self, sleep):
+        func, calls = self.failing([OperationalError("database is locked"), OperationalError("database table is locked")])
+
+        self.assertEqual(retry_on_database_locked(func)(), "done")
+        # every attempt runs in its own transaction
+        self.assertEqual(calls, [True, True, True])
+        self.assertEqual(sleep.call_count, 2)
+        # growing delays
+        first, second = (call.args[0] for call in sleep.call_args_list)
+        self.assertLess(first, second * 3)
+
+    @mock.patch("utils.sqliteTuning.time.sleep")
+    def test_gives_up(self, sleep):
+        func, calls = self.failing([OperationalError("database is locked")] * (DATABASE_LOCKED_RETRIES + 1))
+
+        with self.assertRaisesMessage(OperationalError, "database is locked"):
+            retry_on_database_locked(func)()
+        self.assertEqual(len(calls), DATABASE_LOCKED_RETRIES + 1)
+
+    @mock.patch("utils.sqliteTuning.time.sleep")
+    def test_other_errors_not_retried(self, sleep):
+        func, calls = self.failing([OperationalError("no such table: cars_car")])
+
+        with self.assertRaises(OperationalError):
+            retry_on_database_locked(func)()
+        self.assertEqual(len(calls), 1)
+        sleep.assert_not_called()
+
+    @mock.patch("utils.sqliteTuning.time.sleep")
+    def test_not_retried_inside_a_transaction(self, sleep):
+        func, calls = self.failing([OperationalError("database is locked")])
+
+        with self.assertRaises(OperationalError):
+            with transaction.atomic():
+                retry_on_database_locked(func)()
+        self.assertEqual(len(calls), 1)
+
+
+class RetryOnDatabaseLockedRollbackTest(TransactionTestCase):
+    """Test module for the rollback of the failed attempts of a retried write."""
+
+    def tearDown(self):
+        # the tables are emptied after every test, the remembered brand / motor ids too
+        Brand.objects._ids.clear()
+        Motor.objects._ids.clear()
+
+    @mock.patch("utils.sqliteTuning.time.sleep")
+    def test_failed_attempt_rolled_back(self, sleep):
+        user = User.objects.create_user(username="u1", email="e1@gmail.com", password="password")
+        attempts = []
+
+        @retry_on_database_locked
+        def create_car():
+            Car.objects.create(brand="Audi", model=f"A{len(attempts)}", motor="Diesel", user=user)
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+
+        create_car()
+
+        self.assertEqual(list(Car.objects.values_list("model", flat=True)), ["A1"])
+
+    def test_locked_write_view_retried(self):
+        user = User.objects.create_user(username="u1", email="e1@gmail.com", password="password")
+        client = APIClient()
+        client.force_authenticate(user)
+
+        original_save = Car.save
+        attempts = []
+
+        def save(car, *args, **kwargs):
+            original_save(car, *args, **kwargs)
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OperationalError("database is locked")
+
+        with mock.patch.object(Car, "save", save), mock.patch("utils.sqliteTuning.time.sleep"):
+            response = client.post(reverse("car_list_create"), {"brand": "Audi", "model": "A4", "motor": "Diesel"}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(Car.objects.count(), 1)
+
+
+class ReadReplicaRouterTest(SimpleTestCase):
+    """Test module for the routing of the reads to the read replicas (utils/replicaRouter.py)."""
+
+    def setUp(self):
+        self.router = ReadReplicaRouter(replicas=["replica"])
+
+    def test_reads_from_the_replica_when_allowed(self):
+        self.assertEqual(self.router.db_for_read(Car), "default")
+
+        token = _request_replica.set("replica")
+        try:
+            self.assertEqual(self.router.db_for_read(Car), "replica")
+            # writes always go to the primary
+            self.assertEqual(self.router.db_for_write(Car), "default")
+        finally:
+            _request_replica.reset(token)
+
+    def test_no_replica(self):
+        token = _request_replica.set("replica")
+        try:
+            self.assertEqual(ReadReplicaRouter(replicas=[]).db_for_read(Car), "default")
+        finally:
+            _request_replica.reset(token)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica", "cars"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "cars"))
+
+
+class ReadReplicaRouterTransactionTest(TestCase):
+    """Test module for the reads inside a transaction (TestCase runs every test in a transaction)."""
+
+    def test_reads_of_a_transaction_use_the_primary(self):
+        token = _request_replica.set("replica")
+        try:
+            self.assertEqual(ReadReplicaRouter(replicas=["replica"]).db_for_read(Car), "default")
+        finally:
+            _request_replica.reset(token)
+
+
+@mock.patch("utils.replicaRouter.DATABASE_REPLICAS", ["replica"])
+class ReadReplicaMiddlewareTest(SimpleTestCase):
+    """Test module for the replica reads of the safe requests and the read-your-writes stickiness."""
+
+    def setUp(self):
+        caches["default"].clear()
+        self.factory = RequestFactory()
+        self.user1 = SimpleNamespace(id=1, is_authenticated=True)
+        self.user2 = SimpleNamespace(id=2, is_authenticated=True)
+
+    def reads_from_replica(self, method, path, user, session_key=None):
+        """Run the middleware, return whether the view was allowed to read from a replica."""
+        seen = []
+
+        def get_response(request):
+            seen.append(reads_from_replica())
+            return HttpResponse()
+
+        request = getattr(self.factory, method)(path)
+        request.user = user
+        if session_key:
+            request.COOKIES["sessionid"] = session_key
+
+        ReadReplicaMiddleware(get_response)(request)
+        # reset after the request
+        self.assertIs(reads_from_replica(), False)
+        return seen[0]
+
+    def test_safe_requests_of_the_listed_paths(self):
+        self.assertTrue(self.reads_from_replica("get", "/api/cars/", self.user1))
+        self.assertTrue(self.reads_from_replica("get", "/api/cars/filters/", self.user1))
+        self.assertTrue(self.reads_from_replica("get", "/api/auth/is_authenticated/", AnonymousUser()))
+        self.assertFalse(self.reads_from_replica("get", "/api/auth/csrf_cookie/", AnonymousUser()))
+        self.assertFalse(self.reads_from_replica("post", "/api/cars/", self.user1))
+
+    def test_read_your_writes(self):
+        self.reads_from_replica("post", "/api/cars/", self.user1)
+
+        # the user who wrote reads from the primary, the other users from the replica
+        self.assertFalse(self.reads_from_replica("get", "/api/cars/", self.user1))
+        self.assertTrue(self.reads_from_replica("get", "/api/cars/", self.user2))
+
+    def test_sticky_session(self):
+        # e.g. login: the session is read before the user is known
+        self.reads_from_replica("post", "/api/auth/login/", AnonymousUser(), session_key="abc")
+
+        self.assertFalse(self.reads_from_replica("get", "/api/auth/is_authenticated/", AnonymousUser(), session_key="abc"))
+        self.assertTrue(self.reads_from_replica("get", "/api/auth/is_authenticated/", AnonymousUser(), session_key="xyz"))
+
+    def test_sticky_window_expires(self):
+        with mock.patch("utils.replicaRouter.DATABASE_REPLICA_STICKY_SECONDS", 0.01):
+            self.reads_from_replica("delete", "/api/cars/1/", self.user1)
+        time.sleep(0.05)
+        self.assertTrue(self.reads_from_replica("get", "/api/cars/", self.user1))
+
+    async def test_async_middleware(self):
+        seen = []
+
+        async def get_response(request):
+            seen.append(reads_from_replica())
+            return HttpResponse()
+
+        middleware = ReadReplicaMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        async def request(method, user):
+            request = getattr(self.factory, method)("/api/cars/")
+            async def auser():
+                return user
+            request.auser = auser
+            await middleware(request)
+
+        await request("get", self.user1)
+        await request("put", self.user1)
+        await request("get", self.user1)
+        await request("get", self.user2)
+
+        self.assertEqual(seen, [True, False, False, True])
+
+    def test_one_replica_per_request(self):
+        router = ReadReplicaRouter(replicas=["replica", "replica2"])
+        replicas = []
+
+        def get_response(request):
+            # all the reads of the request go to the same replica
+            replicas.append({router.db_for_read(Car) for _ in range(20)})
+            return HttpResponse()
+
+        with mock.patch("utils.replicaRouter.DATABASE_REPLICAS", ["replica", "replica2"]):
+            for _ in range(40):
+                request = self.factory.get("/api/cars/")
+                request.user = self.user1
+                ReadReplicaMiddleware(get_response)(request)
+
+        self.assertTrue(all(len(aliases) == 1 for aliases in replicas))
+        self.assertEqual(set().union(*replicas), {"replica", "replica2"})
+
+    def test_owner_of_changed_cars_reads_from_the_primary(self):
+        # e.g. an admin or the archive job changed the cars of user1
+        bump_user_data_version(self.user1.id)
+
+        self.assertFalse(self.reads_from_replica("get", "/api/cars/", self.user1))
+        self.assertTrue(self.reads_from_replica("get", "/api/cars/", self.user2))
+
+    def test_replica_reads_are_not_cached_during_the_replication_delay(self):
+        builds = []
+
+        def read_page():
+            # e.g. a request which started before the change: it reads from the replica
+            token = _request_replica.set("replica")
+            try:
+                return get_or_set_user_cached("page", self.user1.id, ["p"], lambda: builds.append(1) or "page")
+            finally:
+                _request_replica.reset(token)
+
+        bump_user_data_version(self.user1.id)
+        read_page()
+        read_page()
+        self.assertEqual(len(builds), 2)
+
+        with mock.patch("utils.replicaRouter.DATABASE_REPLICA_STICKY_SECONDS", 0.01):
+            time.sleep(0.05)
+            read_page()
+            read_page()
+        self.assertEqual(len(builds), 3)
+
+
+class CopySqliteDatabaseTest(SimpleTestCase):
+    """Test module for the copy of the primary SQLite file into a replica (online backup API)."""
+
+    def test_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary_path = os.path.join(directory, "primary.sqlite3")
+            replica_path = os.path.join(directory, "replica.sqlite3")
+
+            primary = sqlite3.connect(primary_path)
+            primary.execute("CREATE TABLE car (id INTEGER PRIMARY KEY, brand TEXT)")
+            primary.execute("INSERT INTO car (brand) VALUES ('Audi')")
+            primary.commit()
+
+            copy_sqlite_database(primary_path, replica_path)
+
+            # a reader of the replica (like the connection of a worker) stays open between the copies
+            replica = sqlite3.connect(replica_path)
+            self.assertEqual(replica.execute("SELECT brand FROM car").fetchall(), [("Audi",)])
+
+            primary.execute("INSERT INTO car (brand) VALUES ('Porsche')")
+            primary.commit()
+            copy_sqlite_database(primary_path, replica_path)
+
+            self.assertEqual(replica.execute("SELECT brand FROM car ORDER BY id").fetchall(), [("Audi",), ("Porsche",)])
+
+            replica.close()
+            primary.close()
+
+
+# settings.py only declares the shards of CAR_SHARD_COUNT (one by default): the sharding tests add a second one
+TEST_SHARD_ALIAS = "cars_shard_1"
+
+
+def declare_test_shard(test_class):
+    """
+    Declare the database alias of a second shard (like benchmark_database_backends declares its databases)
+    until the end of the test class. No database is created.
+    """
+    default = connections["default"]
+    # PostgreSQL: a database of its own on the same server, SQLite: an in-memory database
+    test_name = f"{default.settings_dict['NAME']}_{TEST_SHARD_ALIAS}" if default.vendor == "postgresql" else None
+    connections.settings[TEST_SHARD_ALIAS] = connections.configure_settings({
+        **connections.settings,
+        TEST_SHARD_ALIAS: {**default.settings_dict, "TEST": {**default.settings_dict["TEST"], "NAME": test_name}},
+    })[TEST_SHARD_ALIAS]
+
+    # the shard router only migrates the cars app on the shards (CAR_SHARD_DATABASES is shared, change it in place)
+    shard_databases = list(CAR_SHARD_DATABASES)
+    CAR_SHARD_DATABASES[:] = [TEST_SHARD_ALIAS]
+
+    def forget():
+        CAR_SHARD_DATABASES[:] = shard_databases
+        connections[TEST_SHARD_ALIAS].close()
+        del connections[TEST_SHARD_ALIAS]
+        del connections.settings[TEST_SHARD_ALIAS]
+
+    test_class.addClassCleanup(forget)
+
+
+class CarShardingTest(SimpleTestCase):
+    """Test module for the choice of the shards (cars/sharding.py)."""
+
+    @classmethod
+    def setUpClass(cls):
+        declare_test_shard(cls)
+        super().setUpClass()
+
+    def setUp(self):
+        # two shards (CAR_SHARDS is shared by all the modules, change it in place)
+        self.shards = list(CAR_SHARDS)
+        CAR_SHARDS[:] = ["default", TEST_SHARD_ALIAS]
+        self.addCleanup(CAR_SHARDS.__setitem__, slice(None), self.shards)
+
+    def test_user_shard_is_stable_and_spread(self):
+        shards = [car_shard_for_user(user_id) for user_id in range(1, 201)]
+
+        self.assertEqual(shards, [car_shard_for_user(user_id) for user_id in range(1, 201)])
+        self.assertGreater(shards.count("default"), 50)
+        self.assertGreater(shards.count("cars_shard_1"), 50)
+
+    def test_shard_of_car_id(self):
+        self.assertEqual(car_shard_for_id(1), "default")
+        self.assertEqual(car_shard_for_id((1 << CAR_ID_SHARD_BITS) + 1), "cars_shard_1")
+        self.assertIsNone(car_shard_for_id((2 << CAR_ID_SHARD_BITS) + 1))
+
+    def test_shard_db(self):
+        # the primary shard lets the routers choose (read replicas)
+        self.assertIsNone(shard_db("default"))
+        self.assertEqual(shard_db("cars_shard_1"), "cars_shard_1")
+
+    def test_shards_only_migrate_the_cars_app(self):
+        router = CarShardRouter()
+
+        self.assertTrue(router.allow_migrate("cars_shard_1", "cars", "car"))
+        self.assertFalse(router.allow_migrate("cars_shard_1", "sessions", "session"))
+        # the migrations of the cars app reference the users table
+        self.assertTrue(router.allow_migrate("cars_shard_1", "authentication", "customuser"))
+        self.assertIsNone(router.allow_migrate("default", "auth", "user"))
+
+    def test_for_each_shard_keeps_the_order(self):
+        self.assertEqual(for_each_shard(lambda alias: alias.upper()), ["DEFAULT", "CARS_SHARD_1"])
+
+
+class ShardedCarsTest(TransactionTestCase):
+    """Test module for the cars of users on two shards (threads read the shards, so no TestCase transaction)."""
+
+    # TEST_SHARD_ALIAS is added by setUpClass (the test runner only knows the databases of settings.py)
+    databases = {"default"}
+
+    @classmethod
+    def setUpClass(cls):
+        # create the test database of the second shard, migrated with the tables of the cars app only (see CarShardRouter)
+        declare_test_shard(cls)
+        creation = connections[TEST_SHARD_ALIAS].creation
+        shard_name = connections[TEST_SHARD_ALIAS].settings_dict["NAME"]
+        creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        cls.addClassCleanup(creation.destroy_test_db, shard_name, verbosity=0)
+
+        cls.databases = {"default", TEST_SHARD_ALIAS}
+        super().setUpClass()
+
+    def setUp(self):
+        self.shards = list(CAR_SHARDS)
+        CAR_SHARDS[:] = ["default", TEST_SHARD_ALIAS]
+        caches["default"].clear()
+
+        # one user on every shard
+        users = {}
+        number = 0
+        while len(users) < 2:
+            number += 1
+            user = User.objects.create_user(username=f"u{number}", email=f"e{number}@gmail.com", password="password")
+            users.setdefault(car_shard_for_user(user.id), user)
+        self.user0, self.user1 = users["default"], users["cars_shard_1"]
+
+        self.admin = User.objects.create_superuser(username="admin", email="admin@gmail.com", password="password")
+        self.client = APIClient()
+
+    def tearDown(self):
+        CAR_SHARDS[:] = self.shards
+        # the tables are emptied after every test, the in-process copies too
+        Brand.objects._ids.clear()
+        Motor.objects._ids.clear()
+        filter_options._cached_options.clear()
+        suggest._user_indexes.clear()
+
+    def create_car(self, user, brand, model="A4", motor="Diesel"):
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse("car_list_create"), {"brand": brand, "model": model, "motor": motor}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Car.objects.using(car_shard_for_user(user.id)).latest("id").id
+
+    def test_cars_are_stored_on_the_shard_of_the_user(self):
+        car0 = self.create_car(self.user0, "Audi")
+        car1 = self.create_car(self.user1, "Volvo")
+
+        self.assertEqual(list(Car.objects.using("default").values_list("id", flat=True)), [car0])
+        self.assertEqual(list(Car.objects.using("cars_shard_1").values_list("id", flat=True)), [car1])
+        # the ids of the shards do not overlap, the id tells the shard
+        self.assertEqual(car_shard_for_id(car0), "default")
+        self.assertEqual(car_shard_for_id(car1), "cars_shard_1")
+        # the brand lookup table of the shard
+        self.assertTrue(Brand.objects.using("cars_shard_1").filter(name="volvo").exists())
+        self.assertFalse(Brand.objects.using("default").filter(name="volvo").exists())
+
+    def test_user_reads_updates_and_deletes_his_cars(self):
+        self.create_car(self.user0, "Audi")
+        car1 = self.create_car(self.user1, "Volvo")
+
+        self.client.force_authenticate(self.user1)
+        response = self.client.get(reverse("car_list_create"), {"brand": "Volvo"})
+        self.assertEqual([car["id"] for car in response.data["data"]], [car1])
+
+        url = reverse("car_detail", kwargs={"id": car1})
+        self.assertEqual(self.client.get(url).data["brand"], "Volvo")
+
+        response = self.client.put(url, {"brand": "Saab", "model": "900", "motor": "Petrol"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Car.objects.using("cars_shard_1").get(id=car1).brand, "Saab")
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Car.objects.using("cars_shard_1").exists())
+
+        # the car of another user (on another shard) is not found
+        self.client.force_authenticate(self.user0)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_bulk_create_on_the_shard_of_the_user(self):
+        cars = bulk_create_cars(self.user1, [{"brand": "Volvo", "model": "V60", "motor": "Hybrid"}] * 3)
+
+        self.assertEqual(Car.objects.using("cars_shard_1").count(), 3)
+        self.assertTrue(all(car_shard_for_id(car.id) == "cars_shard_1" for car in cars))
+
+    def test_admin_list_merges_the_shards(self):
+        ids = [self.create_car(user, brand) for user, brand in ((self.user0, "Audi"), (self.user1, "Volvo"), (self.user0, "BMW"))]
+        newest_first = ids[::-1]
+
+        self.client.force_authenticate(self.admin)
+        url = reverse("car_list_create_admin")
+
+        self.assertEqual([car["id"] for car in self.client.get(url).data], newest_first)
+
+        data = self.client.get(url, {"cursor": ""}).data
+        self.assertEqual([car["id"] for car in data["data"]], newest_first)
+        self.assertIsNone(data["next"])
+
+        # cursor pagination across the shards, 2 cars per page
+        def page(cursor):
+            return paginate_by_cursor_across_shards(lambda alias: Car.objects.using(shard_db(alias)), cursor, page_size=2)
+
+        cars, next_cursor, previous_cursor = page("")
+        self.assertEqual([car.id for car in cars], newest_first[:2])
+        cars, next_cursor, previous_cursor = page(next_cursor)
+        self.assertEqual([car.id for car in cars], newest_first[2:])
+        self.assertIsNone(next_cursor)
+        cars, next_cursor, previous_cursor = page(previous_cursor)
+        self.assertEqual([car.id for car in cars], newest_first[:2])
+
+        response = self.client.get(url, {"stream": "ndjson"})
+        streamed = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([car["id"] for car in streamed], newest_first)
+
+    def test_admin_deletes_a_car_of_another_shard(self):
+        car1 = self.create_car(self.user1, "Volvo")
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.delete(reverse("car_detail_admin", kwargs={"id": car1}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Car.objects.using("cars_shard_1").exists())
+        self.assertEqual(
+            self.client.delete(reverse("car_detail_admin", kwargs={"id": car1})).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_generic_views_merge_the_shards_and_soft_delete(self):
+        # the alternative implementation of views_generic_class_based_views.py (not routed)
+        ids = [self.create_car(user, brand) for user, brand in ((self.user0, "Audi"), (self.user1, "Volvo"), (self.user0, "BMW"))]
+        newest_first = ids[::-1]
+
+        def call(view, method, user, data=None, **kwargs):
+            request = getattr(APIRequestFactory(), method)("/", data)
+            force_authenticate(request, user=user)
+            return view.as_view()(request, **kwargs)
+
+        list_view = generic_views.CarListCreateApiViewAdminPriviledge
+        self.assertEqual([car["id"] for car in call(list_view, "get", self.admin).data], newest_first)
+        self.assertEqual([car["id"] for car in call(list_view, "get", self.admin, {"brand": "Volvo-BMW"}).data], newest_first[:2])
+
+        data = call(list_view, "get", self.admin, {"cursor": "", "page_size": 2}).data
+        self.assertEqual([car["id"] for car in data["data"]], newest_first[:2])
+        data = call(list_view, "get", self.admin, {"cursor": data["next"], "page_size": 2}).data
+        self.assertEqual([car["id"] for car in data["data"]], newest_first[2:])
+        self.assertIsNone(data["next"])
+
+        # soft delete, on the shard of the car
+        response = call(generic_views.CarDetailApiViewAdminPriviledge, "delete", self.admin, id=ids[1])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(Car.all_objects.using("cars_shard_1").get(id=ids[1]).deletedAt)
+        response = call(generic_views.CarDetailApiViewAdminPriviledge, "delete", self.admin, id=ids[1])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = call(generic_views.CarDetailApiView, "delete", self.user0, id=ids[0])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(Car.all_objects.using("default").get(id=ids[0]).deletedAt)
+        self.assertEqual([car["id"] for car in call(list_view, "get", self.admin).data], [ids[2]])
+
+    def test_filter_options_merge_the_shards(self):
+        self.create_car(self.user0, "Volvo", motor="Diesel")
+        self.create_car(self.user1, "Volvo", motor="Electric")
+        self.create_car(self.user1, "Volkswagen", motor="Electric")
+
+        response = self.client.get(reverse("prpduct_filters"))
+        self.assertEqual(response.data, {"brands": ["Volkswagen", "Volvo"], "motors": ["Diesel", "Electric"]})
+
+        # the suggestions of a user come from his / her shard only
+        self.client.force_authenticate(self.user1)
+        response = self.client.get(reverse("car_suggest"), {"field": "brand", "prefix": "vol"})
+        self.assertEqual(response.data["suggestions"], [{"value": "Volkswagen", "count": 1}, {"value": "Volvo", "count": 1}])
+
+    def test_cars_are_archived_on_the_shard_of_the_user(self):
+        car0 = self.create_car(self.user0, "Audi")
+        car1 = self.create_car(self.user1, "Volvo")
+        for alias in CAR_SHARDS:
+            Car.objects.using(alias).update(updatedAt=timezone.now() - timezone.timedelta(days=730))
+
+        call_command("archive_cars", stdout=StringIO())
+
+        self.assertEqual(list(ArchivedCar.objects.using("cars_shard_1").values_list("id", flat=True)), [car1])
+        self.assertEqual(list(ArchivedCar.objects.using("default").values_list("id", flat=True)), [car0])
+
+        self.client.force_authenticate(self.user1)
+        self.assertEqual(self.client.get(reverse("car_list_create")).data["count"], 0)
+        response = self.client.get(reverse("car_list_create"), {"include_archived": 1})
+        self.assertEqual([car["id"] for car in response.data["data"]], [car1])
+
+        # updating the archived car moves it back to the hot table of its shard
+        response = self.client.patch(reverse("car_bulk"), {"ids": [car1], "changes": {"model": "XC60"}}, format="json")
+        self.assertEqual(response.data["updated"], [car1])
+        self.assertEqual(Car.objects.using("cars_shard_1").get(id=car1).model, "XC60")
+
+    def test_deleted_cars_are_purged_on_the_shard_of_the_user(self):
+        car1 = self.create_car(self.user1, "Volvo")
+
+        self.assertEqual(self.client.delete(reverse("car_detail", kwargs={"id": car1})).status_code, status.HTTP_204_NO_CONTENT)
+        self.assertIsNotNone(Car.all_objects.using("cars_shard_1").get(id=car1).deletedAt)
+        self.assertEqual(self.client.post(reverse("car_restore", kwargs={"id": car1})).status_code, status.HTTP_200_OK)
+
+        self.client.force_authenticate(self.admin)
+        self.assertEqual(self.client.delete(reverse("car_detail_admin", kwargs={"id": car1})).status_code, status.HTTP_204_NO_CONTENT)
+        call_command("purge_deleted_cars", seconds=0, stdout=StringIO())
+
+        self.assertFalse(Car.all_objects.using("cars_shard_1").exists())
+        self.assertEqual(CarFilterOption.objects.using("cars_shard_1").get(kind="brand", value="Volvo").count, 0)
+
+    def test_deleting_a_user_deletes_his_cars_on_the_shard(self):
+        self.create_car(self.user1, "Volvo")
+
+        self.user1.delete()
+
+        self.assertFalse(Car.objects.using("cars_shard_1").exists())
+
+
+class TrigramIndexesTest(TestCase):
+    """Test module for the PostgreSQL trigram indexes of the icontains filters (cars/search.py)."""
+
+    def test_indexes_match_the_icontains_lookups(self):
+        # PostgreSQL only uses an expression index for the same expression as the query
+        from django.db.backends.postgresql.base import DatabaseWrapper
+        postgresql = DatabaseWrapper(connections.configure_settings({
+            "default": {"ENGINE": "django.db.backends.postgresql", "NAME": "car_notes"},
+        })["default"])
+
+        for name, column in TRIGRAM_INDEXES.items():
+            sql, params = Car.objects.filter(**{f"{column}__icontains": "audi"}).query.get_compiler(connection=postgresql).as_sql()
+            self.assertIn(f'UPPER("cars_car"."{column}"::text) LIKE', sql)
+
+    def test_indexes_created_on_postgresql(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("PostgreSQL only")
+
+        available = create_trigram_indexes()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pg_indexes WHERE indexname = ANY(%s)", [list(TRIGRAM_INDEXES)])
+            # without the pg_trgm extension on the server, the filters scan the table
+            self.assertEqual(cursor.fetchone()[0], len(TRIGRAM_INDEXES) if available else 0)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views_async_class_based_views import AsyncCarListCreateApiView, AsyncCarDetailApiView
+
+# Async versions of the car endpoints of urls.py (same paths and names), used in the ASGI mode (see car_notes_api/urls_async.py).
+urlpatterns = [
+    path('', AsyncCarListCreateApiView.as_view(), name="car_list_create"),
+    path('<int:id>/', AsyncCarDetailApiView.as_view(), name="car_detail"),
+]
@@ -1,3 +1,4 @@
+import heapq
 import math
 
 from rest_framework.pagination import PageNumberPagination
@@ -5,13 +6,46 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import permissions
-from .models import Car
-from .serializers import GetCarSerializer, CreateUpdateCarSerializer
+from rest_framework.exceptions import ValidationError
+from .models import Car, ArchivedCar
+from .serializers import GetCarSerializer, CreateUpdateCarSerializer, FIELDS_QUERY_PARAM, get_fast_car_serializer
+from .pagination import CURSOR_QUERY_PARAM, CURSOR_ORDERING, paginate_by_cursor, paginate_by_cursor_across_shards, CachedCountPaginator
+from .pagination import paginate_by_cursor_with_archive, paginator_with_archive
+from .filters import build_car_filters, parse_facet_fields, compute_facets
+from .filter_options import get_filter_options
+from .suggest import SUGGEST_FIELDS, CARS_SUGGEST_LIMIT, CARS_SUGGEST_MAX_LIMIT, get_suggestions
+from .streaming import STREAM_FORMATS, stream_cars
+from .bulk import CARS_BULK_MAX_ITEMS, validate_bulk_items, bulk_create_cars, parse_bulk_ids, bulk_update_cars, bulk_delete_cars
+from .sharding import CAR_SHARDS, car_shard_for_user, for_each_shard, shard_db
+from .caching import get_or_set_user_cached, normalize_query_params, normalize_filter_params, make_user_etag, get_user_last_modified
+from .archive import include_archived, restore_archived_cars
+from .deletion import soft_delete_user_car, soft_delete_car, undo_delete_user_car
 from django.db.models import Q
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from utils.sqliteTuning import retry_on_database_locked
 
 # Create your views here.
 
+# CONDITIONAL GET (ETag / Last-Modified)
+# The ETags are derived from the data version of the request user (see caching.py), so they are computed
+# without any database query. If the client sends a matching If-None-Match (or an If-Modified-Since
+# which is not older than the last change of the user's cars), the view answers "304 Not Modified"
+# without querying and serializing the cars.
+# "Cache-Control: private, no-cache" lets the browser keep the response, but revalidate it on every use.
+
+def car_list_etag(request):
+    return make_user_etag(request.user.id, "list", normalize_query_params(request.query_params))
+
+def car_detail_etag(request, id):
+    return make_user_etag(request.user.id, "detail", id, get_fast_car_serializer(request.query_params.get(FIELDS_QUERY_PARAM)).field_names)
+
+def car_last_modified(request, *args, **kwargs):
+    return get_user_last_modified(request.user.id)
+
 # # NOT USED ANYMORE. 
 # # THIS THROWS AN INVALID PAGE ERROR, IF A REQUEST
 # # IS MADE WITH A PAGE PARAM GREATER THAN THE TOTLA NUMBER OF PAGES.
@@ -121,7 +155,9 @@ class CarListCreateApiView(APIView):
 
     #     serializer = CarSerializer(filtered_cars, many=True)
     #     return Response(serializer.data, status=status.HTTP_200_OK)
-        
+
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=car_list_etag, last_modified_func=car_last_modified))
     def get(self, request):
         """
         Get all cars belonging to the current request user,
@@ -134,65 +170,183 @@ class CarListCreateApiView(APIView):
         - motor: one or more motor types separated by "-" (OR logic within motor).
                 Example: "Diesel-Electric"
                 → matches cars whose motor is Diesel OR Electric.
+        - q: free text search, words separated by white spaces (AND logic).
+                Example: "audi diesel"
+                → matches cars whose brand, model or motor contain "audi" AND "diesel".
+        - brand_exact, model_exact, motor_exact: values separated by "-" (OR logic), case-insensitive equality.
+                Example: model_exact="a4-a6" → matches cars whose model is A4 OR A6.
+        - brand_prefix, model_prefix, motor_prefix: values separated by "-" (OR logic), case-insensitive prefix.
+                Example: brand_prefix="vol" → matches Volkswagen, Volvo, ...
+                The exact / prefix filters use the indexes of the case-folded columns.
 
         The method filters all cars of the request user with the given brands AND the given motors
 
         Filtering logic:
-        - brand group and motor group are each optional.
-        - If both are provided, results must satisfy BOTH (AND logic).
-        - Filtering is case-insensitive (iexact).
+        - brand group, motor group and q are each optional.
+        - If more of them are provided, results must satisfy ALL of them (AND logic).
+        - Filtering is case-insensitive (icontains), backed by the full-text search index when available.
         - Always restricted to cars owned by the current request user.
         - Results are ordered by createdAt descending.
+
+        Pagination:
+        - page: page number (page number pagination, default).
+        - cursor: opaque cursor (keyset pagination). Send an empty cursor ("?cursor=") to get the first page,
+                then follow the "next" / "previous" cursors of the response. No total count is returned in this mode.
+
+        Facets:
+        - facets: comma separated fields ("brand", "motor"), optional.
+                Example: "brand,motor"
+                → the response gets a "facets" key with the number of the user's cars per brand and per motor,
+                  under the active filters: {"brand": [{"value": "Audi", "count": 12}, ...], "motor": [...]}
+
+        Sparse fieldsets:
+        - fields: comma separated field names, optional. Default: all the fields.
+                Example: "id,brand,model"
+                → every car only has the id, brand and model keys, and only these columns are read from the database.
+
+        Archived cars:
+        - include_archived: "1" or "true", optional. By default only the hot cars are listed (see archive.py).
+                With it, the archived cars (not updated for a long time) follow the hot cars, with the same filters.
+                The archive is only read by the pages which reach past the last hot car.
+
+        Caching:
+        - The response is cached per user, user data version and normalized query parameters (see caching.py).
+        - Creating, updating or deleting a car of the user bumps the data version (see signals.py),
+          which invalidates all the cached pages of the user at once.
+        - The response has an ETag and a Last-Modified header. Conditional requests
+          (If-None-Match / If-Modified-Since) for unchanged data get a "304 Not Modified".
         """
-        brand_queries = Q()
-        motor_queries = Q()
+        data = get_or_set_user_cached(
+            prefix="list",
+            user_id=request.user.id,
+            parts=[normalize_query_params(request.query_params)],
+            build=lambda: self.__get_cars_page(request),
+        )
+
+        return Response(data, status=status.HTTP_200_OK)
 
+    def __get_cars_page(self, request):
+        """
+        Private method which filters, paginates and serializes the cars of the request user.
+        Returns the data of the response.
+        """
         # Filtering based on query parameters
         params = self.request.query_params
 
-        brand = params.get('brand')
-        if brand:
-            for brand_value in brand.split('-'):
-                brand_value = brand_value.strip() # remove white spaces
-                if brand_value:
-                    # brand_queries |= Q(brand__iexact=brand_value) # OR queries (exact match, case-sensitive)
-                    brand_queries |= Q(brand__icontains=brand_value) # OR queries (substring match, case-sensitive)
-
-        motor = params.get('motor')
-        if motor:
-            for motor_value in motor.split('-'):
-                motor_value = motor_value.strip()  # remove white spaces
-                if motor_value:
-                    # motor_queries |= Q(motor__iexact=motor_value) # OR queries (exact match, case-sensitive)
-                    motor_queries |= Q(motor__icontains=motor_value) # OR queries (substring match, case-sensitive)
+        # the cars of the user are on the shard of the user (see sharding.py)
+        using = shard_db(car_shard_for_user(request.user.id))
+
+        # brand AND motor AND q filters (see filters.py)
+        car_filters = build_car_filters(params, using=using)
 
         # Filter cars belonging only to the request user
-        # If brand_queries or motor_queries are empty, these queries are ignored. 
-        # For example, if both brand_queries and motor_queries are empty, 
+        # If the brand, motor or q filters are empty, these queries are ignored. 
+        # For example, if all of them are empty, 
         # the query returns all cars of the request user.
-        filters = Q(user=self.request.user) & brand_queries & motor_queries
+        filters = Q(user=self.request.user) & car_filters
 
-        filtered_cars = Car.objects.filter(filters).order_by('-createdAt') # AND queries
+        filtered_cars = Car.objects.using(using).filter(filters).order_by(*CURSOR_ORDERING) # AND queries
+
+        # ARCHIVED CARS (?include_archived=1, see archive.py)
+        # By default only the hot cars are read. The archived cars of the user follow the hot cars,
+        # they are only queried by the pages (and the counts) which need them.
+        archived_cars = None
+        if include_archived(params):
+            archived_filters = Q(user=self.request.user) & build_car_filters(params, using=using, archived=True)
+            archived_cars = ArchivedCar.objects.using(using).filter(archived_filters).order_by(*CURSOR_ORDERING)
 
         # serializer = GetCarSerializer(filtered_cars, many=True, context={"request": request})
         #
         # return Response(serializer.data, status=status.HTTP_200_OK)
 
+        page_size = 9  # page size = 9 items per page
+
+        # SPARSE FIELDSETS (?fields=id,brand,model)
+        # The cars are serialized from values_list() rows (same output as GetCarSerializer, see serializers.py),
+        # reading only the columns of the requested fields.
+        fast_car_serializer = get_fast_car_serializer(params.get(FIELDS_QUERY_PARAM))
+
+        # FACETS
+        # The facet counts do not depend on the page, so they are cached separately:
+        # all the pages of the same filters share them.
+        # With the archived cars, the facets count the hot and the archived cars.
+        facet_fields = parse_facet_fields(params.get("facets"))
+        facets = None
+        if facet_fields:
+            facet_cars = filtered_cars if archived_cars is None else [filtered_cars, archived_cars]
+            facets = get_or_set_user_cached(
+                prefix="facets",
+                user_id=request.user.id,
+                parts=[normalize_filter_params(params), ",".join(facet_fields), archived_cars is not None],
+                build=lambda: compute_facets(facet_cars, facet_fields),
+            )
+
+        # KEYSET (CURSOR) PAGINATION
+        if CURSOR_QUERY_PARAM in params:
+            if archived_cars is None:
+                rows, next_cursor, previous_cursor = paginate_by_cursor(
+                    queryset=fast_car_serializer.values_list(filtered_cars),
+                    cursor=params.get(CURSOR_QUERY_PARAM),
+                    page_size=page_size,
+                    position=fast_car_serializer.position,
+                )
+            else:
+                # the cursors remember if their position is in the hot or in the archived cars
+                rows, next_cursor, previous_cursor = paginate_by_cursor_with_archive(
+                    queryset=fast_car_serializer.values_list(filtered_cars),
+                    archived_queryset=fast_car_serializer.values_list(archived_cars),
+                    cursor=params.get(CURSOR_QUERY_PARAM),
+                    page_size=page_size,
+                    position=fast_car_serializer.position,
+                )
+
+            data = {
+                # The actual serialized objects for the current page.
+                "data": fast_car_serializer.to_representation(rows),
+
+                # Cursors of the next and previous pages (None if there is no such page).
+                "next": next_cursor,
+                "previous": previous_cursor,
+
+                # Page size actually used.
+                "page_size": page_size,
+            }
+
+            if facets is not None:
+                data["facets"] = facets
+
+            return data
+
         # PAGINATION
 
         # Read the requested page number from the query parameters (?page=2, ?page=5, etc.)
         # If the client does not send a page parameter, this will be None.        
         page = request.query_params.get("page")
 
-        page_size = 9  # page size = 9 items per page
-
         # Create a paginator over the *already filtered* queryset.
         # This splits the queryset into chunks ("pages") of 9 items each (9 items per page, because page_size=9):
         #       page 1 -> items[0:8]
         #       page 2 -> items[9:17]
         #       page 3 -> items[18:26]
         #               ...
-        paginator = Paginator(object_list=filtered_cars, per_page=page_size) 
+        # The total count is read from the per-user count cache (no COUNT(*) on repeated page loads).
+        # The paginator slices the values_list() rows (no model instances, see FastCarReadSerializer).
+        if archived_cars is None:
+            paginator = CachedCountPaginator(
+                object_list=fast_car_serializer.values_list(filtered_cars),
+                per_page=page_size,
+                user_id=request.user.id,
+                params=params,
+            )
+        else:
+            # the hot cars, then the archived cars (both counts are cached), see pagination.py
+            paginator = paginator_with_archive(
+                queryset=fast_car_serializer.values_list(filtered_cars),
+                archived_queryset=fast_car_serializer.values_list(archived_cars),
+                per_page=page_size,
+                user_id=request.user.id,
+                params=params,
+            )
 
         try:
             # Attempt to return the requested page.
@@ -218,9 +372,10 @@ class CarListCreateApiView(APIView):
         # page = int(page)
 
         # serializer = GetCarSerializer(cars_page, many=True, context={"request": request})
-        serializer = GetCarSerializer(cars_page.object_list, many=True, context={"request": request})
+        # serializer = GetCarSerializer(cars_page.object_list, many=True, context={"request": request})
+        cars_data = fast_car_serializer.to_representation(cars_page.object_list)
 
-        return Response({
+        data = {
             # Total number of filtered objects in the database.
             # Useful for UI summaries like: "57 results found".
             "count": paginator.count,
@@ -229,15 +384,23 @@ class CarListCreateApiView(APIView):
             "pages": paginator.num_pages,
 
             # The actual serialized objects for the current page.
-            "data": serializer.data,
+            "data": cars_data,
 
             # Current page number. Useful for displaying: "Page 2 of 6".
             "page": cars_page.number,
 
             # Page size actually used.
             "page_size": paginator.per_page,
-        })
+        }
 
+        if facets is not None:
+            # Number of cars per brand / motor under the active filters.
+            # Useful for checkbox labels like: "Audi (12)".
+            data["facets"] = facets
+
+        return data
+
+    @retry_on_database_locked
     def post(self, request):
         """
         Create a new car note
@@ -253,6 +416,125 @@ class CarListCreateApiView(APIView):
             status=status.HTTP_400_BAD_REQUEST)
 
 
+class CarBulkApiView(APIView):
+    """
+    View for creating, updating or deleting many car notes of the current user with one request.
+    """
+
+    permission_classes=[permissions.IsAuthenticated]
+
+    @retry_on_database_locked
+    def post(self, request):
+        """
+        Create many car notes at once.
+
+        Body: a list of cars, for example:
+        [{"brand": "Audi", "model": "A4", "motor": "Diesel"}, {"brand": "Porsche", "model": "911", "motor": "Petrol"}]
+
+        Every car is validated on its own. The valid cars are created (in one transaction),
+        the invalid ones are reported with their index in the list, so the client only has to resend those.
+
+        Response (201 if at least one car was created, else 400):
+        {
+            "data": [created cars],
+            "errors": [{"index": 3, "detail": {"brand": ["Car brand is required."]}}]
+        }
+        """
+        items = request.data
+
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"detail": "Expected a non-empty list of car notes."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if len(items) > CARS_BULK_MAX_ITEMS:
+            return Response(
+                {"detail": f"Too many car notes, at most {CARS_BULK_MAX_ITEMS} can be created at once."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        valid_items, errors = validate_bulk_items(items, context={"request": request})
+
+        cars = bulk_create_cars(
+            user=request.user,
+            validated_items=[validated_data for index, validated_data in valid_items],
+        )
+
+        return Response(
+            {"data": GetCarSerializer(cars, many=True).data, "errors": errors},
+            status=status.HTTP_201_CREATED if cars else status.HTTP_400_BAD_REQUEST)
+
+    @retry_on_database_locked
+    def put(self, request):
+        """
+        Update many car notes at once, with the same changes.
+
+        Body: {"ids": [1, 2, 3], "changes": {"brand": "Audi", "model": "A4", "motor": "Diesel"}}
+        With PUT all the fields are required, with PATCH only the changed fields.
+
+        Only the cars of the current user are updated. The ids which do not belong to a car
+        of the current user are returned in "not_found".
+
+        Response (200 if at least one car was updated, else 404):
+        {"updated": [1, 2], "not_found": [3]}
+        """
+        return self.__update_cars(request, partial=False)
+
+    @retry_on_database_locked
+    def patch(self, request):
+        """
+        Partially update many car notes at once, see put.
+        """
+        return self.__update_cars(request, partial=True)
+
+    def __update_cars(self, request, partial):
+        try:
+            ids = parse_bulk_ids(request.data.get("ids") if isinstance(request.data, dict) else None)
+        except ValidationError as exc:
+            return Response({"detail": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = CreateUpdateCarSerializer(data=request.data.get("changes"), partial=partial, context={"request": request})
+
+        if not serializer.is_valid():
+            return Response(
+                {"detail": serializer.errors},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if not serializer.validated_data:
+            return Response(
+                {"detail": "No changes given."},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        updated_ids, not_found_ids = bulk_update_cars(user=request.user, ids=ids, changes=serializer.validated_data)
+
+        return Response(
+            {"updated": updated_ids, "not_found": not_found_ids},
+            status=status.HTTP_200_OK if updated_ids else status.HTTP_404_NOT_FOUND)
+
+    @retry_on_database_locked
+    def delete(self, request):
+        """
+        Delete many car notes at once.
+
+        Body: {"ids": [1, 2, 3]}
+
+        Only the cars of the current user are deleted. The ids which do not belong to a car
+        of the current user are returned in "not_found".
+
+        Response (200 if at least one car was deleted, else 404):
+        {"deleted": [1, 2], "not_found": [3]}
+        """
+        try:
+            ids = parse_bulk_ids(request.data.get("ids") if isinstance(request.data, dict) else None)
+        except ValidationError as exc:
+            return Response({"detail": exc.detail}, status=status.HTTP_400_BAD_REQUEST)
+
+        deleted_ids, not_found_ids = bulk_delete_cars(user=request.user, ids=ids)
+
+        return Response(
+            {"deleted": deleted_ids, "not_found": not_found_ids},
+            status=status.HTTP_200_OK if deleted_ids else status.HTTP_404_NOT_FOUND)
+
+
 class CarDetailApiView(APIView):
     """
     View for retrieving, updating or deleting a particular car note of the current user.
@@ -271,34 +553,67 @@ class CarDetailApiView(APIView):
 
     def __get_car_note(self, carId, requestUser):
         """
-        Private method to get the car note with given car id and user id
+        Private method to get the car note with given car id and user id.
+        An archived car is moved back to the hot cars first (it is changed, so it is active again, see archive.py).
         """
         try:
-            return Car.objects.get(id=carId, user = requestUser)
+            return Car.objects.of_user(requestUser).get(id=carId)
         except Car.DoesNotExist:
+            if restore_archived_cars(requestUser.id, [carId]):
+                return Car.objects.of_user(requestUser).get(id=carId)
             return None
 
 
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=car_detail_etag, last_modified_func=car_last_modified))
     def get(self, request, id):
         """
         Get the car note with the given car id and user id.
         The id is a request parameter.
+        Supports sparse fieldsets (?fields=id,brand,model), like the list view.
+        Archived cars are returned as well (read from the archive, see archive.py).
         """
-        # car = self.__get_car_note(carId=id, userId=request.user.id)
-        car = self.__get_car_note(carId=id, requestUser=request.user)
-
+        # Sparse fieldset (?fields=id,brand,model), all the fields by default
+        fast_car_serializer = get_fast_car_serializer(request.query_params.get(FIELDS_QUERY_PARAM))
+
+        # The serialized car is cached per user and user data version (see caching.py).
+        # Updating or deleting a car of the user invalidates it.
+        data = get_or_set_user_cached(
+            prefix="detail",
+            user_id=request.user.id,
+            parts=[id, fast_car_serializer.field_names],
+            build=lambda: self.__get_serialized_car_note(carId=id, request=request, fast_car_serializer=fast_car_serializer),
+        )
 
-        if car is None:
+        # cached as False, because None means "not in the cache"
+        if data is False:
             return Response(
                 {"detail": "Car note with the given car id and user id does not exist"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = GetCarSerializer(car, context={"request": request})
+        return Response(data, status=status.HTTP_200_OK)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+    def __get_serialized_car_note(self, carId, request, fast_car_serializer):
+        """
+        Private method which returns the serialized car note with given car id of the request user,
+        or False if it does not exist.
+        """
+        # car = self.__get_car_note(carId=id, userId=request.user.id)
+        # car = self.__get_car_note(carId=carId, requestUser=request.user)
+        cars = fast_car_serializer.serialize(Car.objects.of_user(request.user).filter(id=carId))
+
+        # the archive is only read if the car is not hot
+        if not cars:
+            cars = fast_car_serializer.serialize(ArchivedCar.objects.of_user(request.user).filter(id=carId))
+
+        if not cars:
+            return False
+
+        return cars[0]
  
     
+    @retry_on_database_locked
     def put(self, request, id):
         """
         Update the car note with the given car id and user id.
@@ -326,25 +641,48 @@ class CarDetailApiView(APIView):
             status=status.HTTP_400_BAD_REQUEST)
 
         
+    @retry_on_database_locked
     def delete(self, request, id):
         """
         Delete the car note with the given car id and user id.
         The id is a request parameter.
+        The car is only marked as deleted (one UPDATE, no deletion collector) and can be restored
+        during the undo window (see CarRestoreApiView and deletion.py).
         """
         # car = self.__get_car_note(carId=id, userId=request.user.id)
-        car = self.__get_car_note(carId=id, requestUser=request.user)
-
-        if car is None:
+        # car.delete()
+        if not soft_delete_user_car(request.user, id):
             return Response(
                 {"detail": "Car note with the given car id and user id does not exist"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        car.delete()
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class CarRestoreApiView(APIView):
+    """
+    View for restoring (undoing the delete of) a car note of the current user.
+    """
+
+    permission_classes=[permissions.IsAuthenticated]
+
+    @retry_on_database_locked
+    def post(self, request, id):
+        """
+        Restore the deleted car note with the given car id and user id.
+        The id is a request parameter.
+        Only possible during the undo window (settings.CARS_UNDO_DELETE_SECONDS) after the delete, see deletion.py.
+        """
+        if not undo_delete_user_car(request.user, id):
+            return Response(
+                {"detail": "No deleted car note with the given car id and user id can be restored"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(status=status.HTTP_200_OK)
+
+
 class CarListCreateApiViewAdminPriviledge(APIView):
     """
     View for listing all the notes in the database.
@@ -406,44 +744,95 @@ class CarListCreateApiViewAdminPriviledge(APIView):
         - motor: one or more motor types separated by "-" (OR logic within motor).
                 Example: "Diesel-Electric"
                 → matches cars whose motor is Diesel OR Electric.
+        - q: free text search, words separated by white spaces (AND logic).
+                Example: "audi diesel"
+                → matches cars whose brand, model or motor contain "audi" AND "diesel".
+        - brand_exact, model_exact, motor_exact: values separated by "-" (OR logic), case-insensitive equality.
+                Example: model_exact="a4-a6" → matches cars whose model is A4 OR A6.
+        - brand_prefix, model_prefix, motor_prefix: values separated by "-" (OR logic), case-insensitive prefix.
+                Example: brand_prefix="vol" → matches Volkswagen, Volvo, ...
+                The exact / prefix filters use the indexes of the case-folded columns.
 
         The method filters all cars of all users with the given brands AND the given motors
 
         Filtering logic:
-        - brand group and motor group are each optional.
-        - If both are provided, results must satisfy BOTH (AND logic).
-        - Filtering is case-insensitive (iexact).
+        - brand group, motor group and q are each optional.
+        - If more of them are provided, results must satisfy ALL of them (AND logic).
+        - Filtering is case-insensitive (icontains), backed by the full-text search index when available.
         - Always restricted to cars owned by the current request user.
         - Results are ordered by createdAt descending.
-        """
-        brand_queries = Q()
-        motor_queries = Q()
 
+        Pagination:
+        - cursor: opaque cursor (keyset pagination), optional. Without it, all cars are returned.
+
+        Streaming:
+        - stream: "json" or "ndjson", optional. Streams all the (filtered) cars in chunks
+                instead of building the whole list in memory. "json" returns the same JSON array
+                as the default response, "ndjson" returns one car per line.
+
+        Sparse fieldsets:
+        - fields: comma separated field names, optional. Default: all the fields.
+                Example: "id,brand,model"
+        """
         # Filtering based on query parameters
         params = self.request.query_params
 
-        brand = params.get('brand')
-        if brand:
-            for brand_value in brand.split('-'):
-                brand_value = brand_value.strip() # remove white spaces
-                if brand_value:
-                    # brand_queries |= Q(brand__iexact=brand_value) # OR queries (exact match, case-sensitive)
-                    brand_queries |= Q(brand__icontains=brand_value) # OR queries (substring match, case-sensitive)
-
-        motor = params.get('motor')
-        if motor:
-            for motor_value in motor.split('-'):
-                motor_value = motor_value.strip()  # remove white spaces
-                if motor_value:
-                    # motor_queries |= Q(motor__iexact=motor_value) # OR queries (exact match, case-sensitive)
-                    motor_queries |= Q(motor__icontains=motor_value) # OR queries (substring match, case-sensitive)
-
-        # cars belong to all users
-        filters = brand_queries & motor_queries
-        
-        filtered_cars = Car.objects.filter(filters).order_by('-createdAt') # AND queries
-        serializer = GetCarSerializer(filtered_cars, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def filtered_cars(alias):
+            """
+            Return the filtered cars of one shard (see sharding.py).
+            """
+            using = shard_db(alias)
+
+            # brand AND motor AND q filters (see filters.py)
+            car_filters = build_car_filters(params, using=using)
+
+            # cars belong to all users
+            filters = car_filters
+
+            return Car.objects.using(using).filter(filters).order_by(*CURSOR_ORDERING) # AND queries
+
+        # only the columns of the requested fields are read (see serializers.py)
+        fast_car_serializer = get_fast_car_serializer(params.get(FIELDS_QUERY_PARAM))
+
+        # KEYSET (CURSOR) PAGINATION
+        # every shard reads one page, the pages are merged by (createdAt, id)
+        if CURSOR_QUERY_PARAM in params:
+            page_size = 9
+            rows, next_cursor, previous_cursor = paginate_by_cursor_across_shards(
+                queryset_for_shard=lambda alias: fast_car_serializer.values_list(filtered_cars(alias)),
+                cursor=params.get(CURSOR_QUERY_PARAM),
+                page_size=page_size,
+                position=fast_car_serializer.position,
+            )
+
+            return Response({
+                "data": fast_car_serializer.to_representation(rows),
+                "next": next_cursor,
+                "previous": previous_cursor,
+                "page_size": page_size,
+            }, status=status.HTTP_200_OK)
+
+        # STREAMING
+        stream_format = params.get("stream")
+        if stream_format in STREAM_FORMATS:
+            return StreamingHttpResponse(
+                stream_cars(
+                    queryset=[filtered_cars(alias) for alias in CAR_SHARDS],
+                    stream_format=stream_format,
+                    serializer=fast_car_serializer,
+                ),
+                content_type=STREAM_FORMATS[stream_format],
+                status=status.HTTP_200_OK,
+            )
+
+        # the rows of the shards are read in parallel and merged by (createdAt, id)
+        rows = heapq.merge(
+            *for_each_shard(lambda alias: list(fast_car_serializer.values_list(filtered_cars(alias)))),
+            key=fast_car_serializer.position,
+            reverse=True,
+        )
+
+        return Response(fast_car_serializer.to_representation(rows), status=status.HTTP_200_OK)
 
 class CarDetailApiViewAdminPriviledge(APIView):
     """
@@ -452,23 +841,21 @@ class CarDetailApiViewAdminPriviledge(APIView):
 
     permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser]
 
+    @retry_on_database_locked
     def delete(self, request, id):
         """
         Delete the car note with the given car id.
         The id is a request parameter.
         """
 
-        car = None
-        try:
-            car = Car.objects.get(id=id)
-        except Car.DoesNotExist:
+        # the car is only marked as deleted, like the deletes of the users (see deletion.py).
+        # The id tells on which shard the car is (see sharding.py), an archived car is moved back to the hot cars first
+        if not soft_delete_car(id):
             return Response(
                 {"detail": "Car note with the given car id does not exist"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        car.delete()
-
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 class ProductFilterOptionsView(APIView):
@@ -480,22 +867,55 @@ class ProductFilterOptionsView(APIView):
     def get(self, request):
         """
         Retrieve all distinct car brands and motors when the user makes a GET request to this endpoint.    
+
+        The values are read from the materialized filter options table (or from its in-process copy),
+        which is updated incrementally when cars change, instead of running SELECT DISTINCT over all cars.
+        See filter_options.py.
         """
-        brands = (
-            Car.objects
-            .values_list("brand", flat=True)
-            .distinct()
-            .order_by("brand")
-        )
+        options = get_filter_options()
 
-        categories = (
-            Car.objects
-            .values_list("motor", flat=True)
-            .distinct()
-            .order_by("motor")
-        )
+        return Response({
+            "brands": options["brands"],
+            "motors": options["motors"],
+        }, status=status.HTTP_200_OK)
+
+
+class CarSuggestApiView(APIView):
+    """
+    Class Based View for the autocomplete suggestions of the filter box.
+    """
+    permission_classes=[permissions.IsAuthenticated]
+
+    def get(self, request):
+        """
+        Return the most used brands or models of the cars of the current user starting with a prefix.
+
+        Supported query parameters:
+        - field: "brand" or "model" (required).
+        - prefix: the text typed so far, case-insensitive. An empty prefix returns no suggestions.
+        - limit: number of suggestions, default CARS_SUGGEST_LIMIT, at most CARS_SUGGEST_MAX_LIMIT.
+
+        Example: /api/cars/suggest/?field=brand&prefix=vo
+        → {"field": "brand", "prefix": "vo", "suggestions": [{"value": "Volkswagen", "count": 12}, {"value": "Volvo", "count": 3}]}
+
+        The suggestions are served from an in-memory sorted array of the distinct values of the user (see suggest.py),
+        rebuilt only when the cars of the user changed.
+        """
+        field = request.query_params.get("field")
+        if field not in SUGGEST_FIELDS:
+            raise ValidationError({"field": [f"Expected one of: {', '.join(SUGGEST_FIELDS)}."]})
+
+        try:
+            limit = int(request.query_params.get("limit", CARS_SUGGEST_LIMIT))
+        except ValueError:
+            raise ValidationError({"limit": ["A valid integer is required."]})
+        if not 1 <= limit <= CARS_SUGGEST_MAX_LIMIT:
+            raise ValidationError({"limit": [f"Expected a number between 1 and {CARS_SUGGEST_MAX_LIMIT}."]})
+
+        prefix = request.query_params.get("prefix", "")
 
         return Response({
-            "brands": list(brands),
-            "motors": list(categories),
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "field": field,
+            "prefix": prefix,
+            "suggestions": get_suggestions(request.user, field, prefix, limit),
+        }, status=status.HTTP_200_OK)
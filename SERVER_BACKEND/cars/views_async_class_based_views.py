@@ -0,0 +1,253 @@
+from asgiref.sync import sync_to_async
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework import permissions
+from django.db.models import Q
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from utils.asyncApiView import AsyncAPIView, async_method_decorator
+from utils.sqliteTuning import retry_on_database_locked
+from .models import Car, ArchivedCar
+from .serializers import CreateUpdateCarSerializer, FIELDS_QUERY_PARAM, get_fast_car_serializer
+from .pagination import CURSOR_QUERY_PARAM, CURSOR_ORDERING, apaginate_by_cursor, apaginate_by_page
+from .pagination import apaginate_by_cursor_with_archive, apaginate_by_page_with_archive
+from .archive import include_archived, restore_archived_cars
+from .deletion import soft_delete_user_car
+from .sharding import car_shard_for_user, shard_db
+from .filters import abuild_car_filters, parse_facet_fields, acompute_facets
+from .caching import aget_or_set_user_cached, normalize_query_params, normalize_filter_params
+from .views_api_class_based_views import car_list_etag, car_detail_etag, car_last_modified
+
+# ASYNC VIEWS (ASGI mode, see settings.ASYNC_VIEWS and car_notes_api/urls_async.py)
+# Same endpoints, responses, caching and conditional GET as the views of views_api_class_based_views.py,
+# but the handlers are coroutines (see utils/asyncApiView.py): the cars are read with the async ORM,
+# so the event loop serves other requests while a request waits for the database.
+# Creating and updating a car still calls the sync Car.save() (the brand / motor interning and the signal receivers
+# are sync), deleting a car the sync soft delete (see deletion.py), in one sync_to_async call per request,
+# retried while the database is locked (see utils/sqliteTuning.py).
+
+
+class AsyncCarListCreateApiView(AsyncAPIView):
+    """
+    Async view for listing the car notes of the current user or for creating a new car note.
+    """
+
+    permission_classes=[permissions.IsAuthenticated]
+
+    @async_method_decorator(cache_control(private=True, no_cache=True))
+    @async_method_decorator(condition(etag_func=car_list_etag, last_modified_func=car_last_modified))
+    async def get(self, request):
+        """
+        Get all cars belonging to the current request user, optionally filtered by query parameters.
+        Same query parameters (filters, page / cursor, facets, fields, include_archived) and response
+        as CarListCreateApiView.get.
+        """
+        data = await aget_or_set_user_cached(
+            prefix="list",
+            user_id=request.user.id,
+            parts=[normalize_query_params(request.query_params)],
+            build=lambda: self.__get_cars_page(request),
+        )
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    async def __get_cars_page(self, request):
+        """
+        Private method which filters, paginates and serializes the cars of the request user.
+        Returns the data of the response.
+        """
+        params = request.query_params
+
+        # the cars of the user are on the shard of the user (see sharding.py)
+        using = shard_db(car_shard_for_user(request.user.id))
+
+        # brand AND motor AND q filters (see filters.py), restricted to the request user
+        filters = Q(user=request.user) & await abuild_car_filters(params, using=using)
+
+        filtered_cars = Car.objects.using(using).filter(filters).order_by(*CURSOR_ORDERING)
+
+        # ARCHIVED CARS (?include_archived=1, see archive.py): they follow the hot cars, read only when needed
+        archived_cars = None
+        if include_archived(params):
+            archived_filters = Q(user=request.user) & await abuild_car_filters(params, using=using, archived=True)
+            archived_cars = ArchivedCar.objects.using(using).filter(archived_filters).order_by(*CURSOR_ORDERING)
+
+        page_size = 9  # page size = 9 items per page
+
+        # SPARSE FIELDSETS (?fields=id,brand,model)
+        fast_car_serializer = get_fast_car_serializer(params.get(FIELDS_QUERY_PARAM))
+
+        # FACETS (cached separately, all the pages of the same filters share them)
+        facet_fields = parse_facet_fields(params.get("facets"))
+        facets = None
+        if facet_fields:
+            facet_cars = filtered_cars if archived_cars is None else [filtered_cars, archived_cars]
+            facets = await aget_or_set_user_cached(
+                prefix="facets",
+                user_id=request.user.id,
+                parts=[normalize_filter_params(params), ",".join(facet_fields), archived_cars is not None],
+                build=lambda: acompute_facets(facet_cars, facet_fields),
+            )
+
+        # KEYSET (CURSOR) PAGINATION
+        if CURSOR_QUERY_PARAM in params:
+            if archived_cars is None:
+                rows, next_cursor, previous_cursor = await apaginate_by_cursor(
+                    queryset=fast_car_serializer.values_list(filtered_cars),
+                    cursor=params.get(CURSOR_QUERY_PARAM),
+                    page_size=page_size,
+                    position=fast_car_serializer.position,
+                )
+            else:
+                rows, next_cursor, previous_cursor = await apaginate_by_cursor_with_archive(
+                    queryset=fast_car_serializer.values_list(filtered_cars),
+                    archived_queryset=fast_car_serializer.values_list(archived_cars),
+                    cursor=params.get(CURSOR_QUERY_PARAM),
+                    page_size=page_size,
+                    position=fast_car_serializer.position,
+                )
+
+            data = {
+                "data": fast_car_serializer.to_representation(rows),
+                "next": next_cursor,
+                "previous": previous_cursor,
+                "page_size": page_size,
+            }
+
+            if facets is not None:
+                data["facets"] = facets
+
+            return data
+
+        # PAGINATION (page number, the total count is read from the per-user count cache)
+        if archived_cars is None:
+            rows, paginator, page_number = await apaginate_by_page(
+                queryset=fast_car_serializer.values_list(filtered_cars),
+                page=params.get("page"),
+                per_page=page_size,
+                user_id=request.user.id,
+                params=params,
+            )
+        else:
+            rows, paginator, page_number = await apaginate_by_page_with_archive(
+                queryset=fast_car_serializer.values_list(filtered_cars),
+                archived_queryset=fast_car_serializer.values_list(archived_cars),
+                page=params.get("page"),
+                per_page=page_size,
+                user_id=request.user.id,
+                params=params,
+            )
+
+        data = {
+            "count": paginator.count,
+            "pages": paginator.num_pages,
+            "data": fast_car_serializer.to_representation(rows),
+            "page": page_number,
+            "page_size": paginator.per_page,
+        }
+
+        if facets is not None:
+            data["facets"] = facets
+
+        return data
+
+    async def post(self, request):
+        """
+        Create a new car note
+        """
+        serializer = CreateUpdateCarSerializer(data=request.data, context={"request": request})
+
+        if serializer.is_valid():
+            await sync_to_async(retry_on_database_locked(serializer.save))(user=request.user)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        return Response(
+            {"detail": serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncCarDetailApiView(AsyncAPIView):
+    """
+    Async view for retrieving, updating or deleting a particular car note of the current user.
+    """
+
+    permission_classes=[permissions.IsAuthenticated]
+
+    async def __get_car_note(self, carId, requestUser):
+        """
+        Private method to get the car note with given car id and user id (None if it does not exist).
+        An archived car is moved back to the hot cars first (see archive.py).
+        """
+        car = await Car.objects.of_user(requestUser).filter(id=carId).afirst()
+        if car is None and await sync_to_async(restore_archived_cars)(requestUser.id, [carId]):
+            car = await Car.objects.of_user(requestUser).filter(id=carId).afirst()
+        return car
+
+    @async_method_decorator(cache_control(private=True, no_cache=True))
+    @async_method_decorator(condition(etag_func=car_detail_etag, last_modified_func=car_last_modified))
+    async def get(self, request, id):
+        """
+        Get the car note with the given car id and user id.
+        Supports sparse fieldsets (?fields=id,brand,model), like CarDetailApiView.get. Archived cars are returned as well.
+        """
+        fast_car_serializer = get_fast_car_serializer(request.query_params.get(FIELDS_QUERY_PARAM))
+
+        async def serialized_car_note():
+            cars = await fast_car_serializer.aserialize(Car.objects.of_user(request.user).filter(id=id))
+            # the archive is only read if the car is not hot
+            if not cars:
+                cars = await fast_car_serializer.aserialize(ArchivedCar.objects.of_user(request.user).filter(id=id))
+            # cached as False, because None means "not in the cache"
+            return cars[0] if cars else False
+
+        data = await aget_or_set_user_cached(
+            prefix="detail",
+            user_id=request.user.id,
+            parts=[id, fast_car_serializer.field_names],
+            build=serialized_car_note,
+        )
+
+        if data is False:
+            return Response(
+                {"detail": "Car note with the given car id and user id does not exist"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(data, status=status.HTTP_200_OK)
+
+    async def put(self, request, id):
+        """
+        Update the car note with the given car id and user id.
+        """
+        car = await self.__get_car_note(carId=id, requestUser=request.user)
+
+        if car is None:
+            return Response(
+                {"detail": "Car note with the given car id and user id does not exist"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = CreateUpdateCarSerializer(instance=car, data=request.data, context={"request": request})
+
+        if serializer.is_valid():
+            await sync_to_async(retry_on_database_locked(serializer.save))()
+            return Response(status=status.HTTP_200_OK)
+
+        return Response(
+            {"detail": serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST)
+
+    async def delete(self, request, id):
+        """
+        Delete the car note with the given car id and user id (soft delete, see CarDetailApiView.delete).
+        """
+        deleted = await sync_to_async(retry_on_database_locked(soft_delete_user_car))(request.user, id)
+
+        if not deleted:
+            return Response(
+                {"detail": "Car note with the given car id and user id does not exist"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,6 +1,13 @@
+import heapq
+
 from rest_framework import permissions
 from .models import Car
 from .serializers import GetCarSerializer, CreateUpdateCarSerializer, GetProductFilterOptionsSerializer
+from .pagination import CURSOR_QUERY_PARAM, CURSOR_ORDERING, paginate_by_cursor, paginate_by_cursor_across_shards, CachedCountPaginator
+from .filters import build_car_filters
+from .sharding import car_shard_for_user, for_each_shard, shard_db
+from .deletion import soft_delete_user_car, soft_delete_car
+from .filter_options import get_filter_options
 from rest_framework import generics
 from django.db.models import Q
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -28,6 +35,10 @@ class CarNotesPagination(PageNumberPagination):
     # This prevents clients from requesting too much data at once.
     max_page_size = 20
 
+    # Name of the query parameter that switches to keyset (cursor) pagination.
+    # Example: GET /items/?cursor=  -> first page, then follow the returned "next" / "previous" cursors.
+    cursor_query_param = CURSOR_QUERY_PARAM
+
 
     def paginate_queryset(self, queryset, request, view=None):
         """
@@ -35,6 +46,8 @@ class CarNotesPagination(PageNumberPagination):
         - If the page is missing / not an int -->  return data at page 1
         - If the page is out of range --> return data at the last page
         - If there are 0 pages (empty queryset) --> return data at page 1 (returns empty qeryset)
+
+        If the cursor query parameter is present, keyset pagination is used instead (no COUNT(*), no OFFSET).
         """
         # store request so get_paginated_response / links can use it if needed
         self.request = request
@@ -44,8 +57,24 @@ class CarNotesPagination(PageNumberPagination):
         # otherwise fall back to the default page_size.
         page_size = self.get_page_size(request) or self.page_size
 
+        self._cursor_mode = self.cursor_query_param in request.query_params
+
+        if self._cursor_mode:
+            self._page_size = page_size
+            cars, self._next_cursor, self._previous_cursor = paginate_by_cursor(
+                queryset=queryset, cursor=request.query_params.get(self.cursor_query_param), page_size=page_size
+            )
+            return cars
+
         # Use Django's Paginator directly (same as your manual code)
-        paginator = Paginator(object_list=queryset, per_page=page_size)
+        # The total count is read from the per-user count cache (no COUNT(*) on repeated page loads).
+        # (The admin view only uses the cursor mode, so it never gets here.)
+        if request.user.is_authenticated:
+            paginator = CachedCountPaginator(
+                object_list=queryset, per_page=page_size, user_id=request.user.id, params=request.query_params
+            )
+        else:
+            paginator = Paginator(object_list=queryset, per_page=page_size)
         
         # store it, so that it can be used in the get_paginated_response method
         self._paginator = paginator  
@@ -91,7 +120,37 @@ class CarNotesPagination(PageNumberPagination):
         # return list(self.page)
         return self.page.object_list
 
+    def paginate_shards(self, queryset_for_shard, request):
+        """
+        Keyset (cursor) pagination of the cars of all the shards (see sharding.py):
+        queryset_for_shard(alias) returns the queryset of one shard. Every shard reads one page,
+        the pages are merged by (createdAt, id).
+        """
+        self.request = request
+        self._cursor_mode = True
+        self._page_size = self.get_page_size(request) or self.page_size
+
+        cars, self._next_cursor, self._previous_cursor = paginate_by_cursor_across_shards(
+            queryset_for_shard=queryset_for_shard,
+            cursor=request.query_params.get(self.cursor_query_param),
+            page_size=self._page_size,
+        )
+        return cars
+
     def get_paginated_response(self, data):
+        if getattr(self, "_cursor_mode", False):
+            return Response({
+                # The actual serialized objects for the current page.
+                "data": data,
+
+                # Cursors of the next and previous pages (None if there is no such page).
+                "next": self._next_cursor,
+                "previous": self._previous_cursor,
+
+                # Page size actually used.
+                "page_size": self._page_size,
+            })
+
         paginator = getattr(self, "_paginator", None)
 
         # this does not fix the problem
@@ -185,42 +244,32 @@ class CarListCreateApiView(generics.ListCreateAPIView):
         - motor: one or more motor types separated by "-" (OR logic within motor).
                 Example: "Diesel-Electric"
                 --> matches cars whose motor is Diesel OR Electric.
+        - q: free text search, words separated by white spaces (AND logic).
+                Example: "audi diesel"
+                --> matches cars whose brand, model or motor contain "audi" AND "diesel".
 
         The method filters all cars of the request user with the given brands AND the given motors
 
         Filtering logic:
-        - brand group and motor group are each optional.
-        - If both are provided, results must satisfy BOTH (AND logic).
-        - Filtering is case-insensitive (iexact).
+        - brand group, motor group and q are each optional.
+        - If more of them are provided, results must satisfy ALL of them (AND logic).
+        - Filtering is case-insensitive (icontains), backed by the full-text search index when available.
         - Always restricted to cars owned by the current request user.
         - Results are ordered by createdAt descending.
         """
-        brand_queries = Q()
-        motor_queries = Q()
-
         # Filtering based on query parameters
         params = self.request.query_params
 
-        brand = params.get('brand')
-        if brand:
-            for brand_value in brand.split('-'):
-                brand_value = brand_value.strip() # remove white spaces
-                if brand_value:
-                    # brand_queries |= Q(brand__iexact=brand_value) # OR queries (exact match, case-sensitive)
-                    brand_queries |= Q(brand__icontains=brand_value) # OR queries (substring match, case-sensitive)
-
-        motor = params.get('motor')
-        if motor:
-            for motor_value in motor.split('-'):
-                motor_value = motor_value.strip()  # remove white spaces
-                if motor_value:
-                    # motor_queries |= Q(motor__iexact=motor_value) # OR queries (exact match, case-sensitive)
-                    motor_queries |= Q(motor__icontains=motor_value) # OR queries (substring match, case-sensitive)
+        # the cars of the user are on the shard of the user (see sharding.py)
+        using = shard_db(car_shard_for_user(self.request.user.id))
+
+        # brand AND motor AND q filters (see filters.py)
+        car_filters = build_car_filters(params, using=using)
 
         # filter cars belonging only to the request user
-        filters = Q(user=self.request.user) & brand_queries & motor_queries
+        filters = Q(user=self.request.user) & car_filters
 
-        return Car.objects.filter(filters).order_by('-createdAt') # AND queries
+        return Car.objects.using(using).filter(filters).order_by(*CURSOR_ORDERING) # AND queries
 
 class CarDetailApiView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -235,7 +284,20 @@ class CarDetailApiView(generics.RetrieveUpdateDestroyAPIView):
         return  CreateUpdateCarSerializer
     
     def get_queryset(self):
-        return Car.objects.filter(user=self.request.user)    
+        return Car.objects.of_user(self.request.user)
+
+    def destroy(self, request, *args, **kwargs):
+        """
+        Delete the car note of the user with the given id: the car is only marked as deleted
+        (see deletion.py), an archived car is moved back to the hot cars first.
+        """
+        if not soft_delete_user_car(request.user, self.kwargs[self.lookup_field]):
+            return Response(
+                {"detail": "Car note with the given car id does not exist"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     lookup_field="id"
 
@@ -247,6 +309,19 @@ class CarListCreateApiViewAdminPriviledge(generics.ListAPIView):
 
     permission_classes=[permissions.IsAuthenticated, permissions.IsAdminUser]
     serializer_class=GetCarSerializer
+    pagination_class = CarNotesPagination
+
+    def list(self, request, *args, **kwargs):
+        """
+        Return all cars, unless the client asks for keyset (cursor) pagination with ?cursor=.
+        """
+        # KEYSET (CURSOR) PAGINATION
+        # every shard reads one page, the pages are merged by (createdAt, id)
+        if CURSOR_QUERY_PARAM in request.query_params:
+            cars = self.paginator.paginate_shards(self.get_shard_queryset, request)
+            return self.get_paginated_response(self.get_serializer(cars, many=True).data)
+
+        return Response(self.get_serializer(self.get_queryset(), many=True).data)
     
     # def __car_contains_filter(self, filter, car):
     #     """
@@ -296,42 +371,41 @@ class CarListCreateApiViewAdminPriviledge(generics.ListAPIView):
         - motor: one or more motor types separated by "-" (OR logic within motor).
                 Example: "Diesel-Electric"
                 → matches cars whose motor is Diesel OR Electric.
+        - q: free text search, words separated by white spaces (AND logic).
+                Example: "audi diesel"
+                → matches cars whose brand, model or motor contain "audi" AND "diesel".
 
         The method filters all cars of all users with the given brands AND the given motors
 
         Filtering logic:
-        - brand group and motor group are each optional.
-        - If both are provided, results must satisfy BOTH (AND logic).
-        - Filtering is case-insensitive (iexact).
+        - brand group, motor group and q are each optional.
+        - If more of them are provided, results must satisfy ALL of them (AND logic).
+        - Filtering is case-insensitive (icontains), backed by the full-text search index when available.
         - Always restricted to cars owned by all users.
         - Results are ordered by createdAt descending.
+        - The cars of all the shards (see sharding.py) are read in parallel and merged by (createdAt, id).
         """
-        brand_queries = Q()
-        motor_queries = Q()
+        return list(heapq.merge(
+            *for_each_shard(lambda alias: list(self.get_shard_queryset(alias))),
+            key=lambda car: (car.createdAt, car.id),
+            reverse=True,
+        ))
 
+    def get_shard_queryset(self, alias):
+        """
+        Return the filtered cars of one shard (see sharding.py).
+        """
         # Filtering based on query parameters
         params = self.request.query_params
+        using = shard_db(alias)
 
-        brand = params.get('brand')
-        if brand:
-            for brand_value in brand.split('-'):
-                brand_value = brand_value.strip() # remove white spaces
-                if brand_value:
-                    # brand_queries |= Q(brand__iexact=brand_value) # OR queries (exact match, case-sensitive)
-                    brand_queries |= Q(brand__icontains=brand_value) # OR queries (substring match, case-sensitive)
-
-        motor = params.get('motor')
-        if motor:
-            for motor_value in motor.split('-'):
-                motor_value = motor_value.strip()  # remove white spaces
-                if motor_value:
-                    # motor_queries |= Q(motor__iexact=motor_value) # OR queries (exact match, case-sensitive)
-                    motor_queries |= Q(motor__icontains=motor_value) # OR queries (substring match, case-sensitive)
+        # brand AND motor AND q filters (see filters.py)
+        car_filters = build_car_filters(params, using=using)
 
         # cars belong to all users
-        filters = brand_queries & motor_queries # AND queries
+        filters = car_filters # AND queries
 
-        return Car.objects.filter(filters).order_by('-createdAt')
+        return Car.objects.using(using).filter(filters).order_by(*CURSOR_ORDERING)
 
 class CarDetailApiViewAdminPriviledge(generics.DestroyAPIView):
     """
@@ -343,6 +417,19 @@ class CarDetailApiViewAdminPriviledge(generics.DestroyAPIView):
     def get_queryset(self):
         return Car.objects.all()
 
+    def destroy(self, request, *args, **kwargs):
+        """
+        Delete the car note with the given car id: the car is only marked as deleted, like the deletes
+        of the users (see deletion.py). The id tells on which shard the car is (see sharding.py).
+        """
+        if not soft_delete_car(self.kwargs[self.lookup_field]):
+            return Response(
+                {"detail": "Car note with the given car id does not exist"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
     lookup_field="id"
 
 
@@ -357,22 +444,14 @@ class ProductFilterOptionsView(APIView):
     def get(self, request):
         """
         Retrieve all distinct car brands and motors when the user makes a GET request to this endpoint.    
-        """
-        brands = (
-            Car.objects
-            .values_list("brand", flat=True)
-            .distinct()
-            .order_by("brand")
-        )
 
-        categories = (
-            Car.objects
-            .values_list("motor", flat=True)
-            .distinct()
-            .order_by("motor")
-        )
+        The values are read from the materialized filter options table (or from its in-process copy),
+        which is updated incrementally when cars change, instead of running SELECT DISTINCT over all cars.
+        See filter_options.py.
+        """
+        options = get_filter_options()
 
         return Response({
-            "brands": list(brands),
-            "motors": list(categories),
+            "brands": options["brands"],
+            "motors": options["motors"],
         }, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -0,0 +1,12 @@
+#!/bin/sh
+# Start the API server with gunicorn (see the Dockerfile).
+# SERVER_MODE: "wsgi" (default, sync workers and views) or "asgi" (uvicorn workers and async views).
+# Extra gunicorn options can be passed with the GUNICORN_CMD_ARGS environment variable (e.g. "--workers 4").
+set -e
+
+if [ "$SERVER_MODE" = "asgi" ]; then
+    export ASYNC_VIEWS=True
+    exec gunicorn car_notes_api.asgi:application --bind 0.0.0.0:8000 --worker-class uvicorn.workers.UvicornWorker
+fi
+
+exec gunicorn car_notes_api.wsgi:application --bind 0.0.0.0:8000
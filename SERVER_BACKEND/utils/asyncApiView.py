@@ -0,0 +1,102 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async, iscoroutinefunction
+from rest_framework.views import APIView
+
+# Async version of DRF's APIView (DRF only supports sync views).
+#
+# Under an ASGI server, Django runs a sync view in a thread (sync_to_async) for every request.
+# The views based on AsyncAPIView run on the event loop instead: their handlers are "async def"
+# and read the database with Django's async ORM (afilter / aget / acount / async for ...),
+# so a request which waits for the database or for an email does not hold a worker thread.
+#
+# The request user is resolved asynchronously (request.auser() of Django's AuthenticationMiddleware)
+# before DRF's authentication runs, so that SessionAuthentication only reads the already loaded user.
+# Authenticators which query the database themselves (BasicAuthentication, with an Authorization header)
+# are run in a thread.
+#
+# Under a WSGI server the async views still work (Django runs them with async_to_sync),
+# but the sync views are faster there: the async views are only routed in the ASGI mode (see settings.ASYNC_VIEWS).
+
+
+
+def async_method_decorator(decorator, name=None):
+    """
+    method_decorator for the coroutine methods of the async views.
+    Django's view decorators (cache_control, condition, csrf_protect, ...) support async views,
+    but method_decorator does not pass the methods to them as coroutine functions (Django 5.0),
+    so the decorators would treat the returned coroutine as the response.
+
+    Like method_decorator, it decorates a method, or the method "name" of a class:
+    @async_method_decorator(csrf_protect, name="dispatch")
+    """
+    def decorate(obj):
+        if name is not None:
+            setattr(obj, name, decorate_method(getattr(obj, name)))
+            return obj
+        return decorate_method(obj)
+
+    def decorate_method(method):
+        @wraps(method)
+        async def _wrapper(self, *args, **kwargs):
+            async def bound_method(*args, **kwargs):
+                return await method(self, *args, **kwargs)
+            return await decorator(bound_method)(*args, **kwargs)
+        return _wrapper
+
+    return decorate
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers (get, post, ...) are coroutines.
+    """
+
+    # Django marks the view function returned by as_view() as a coroutine function.
+    view_is_async = True
+
+    async def initial_async(self, request, *args, **kwargs):
+        """
+        Async version of APIView.initial: authentication, permissions and throttling.
+        """
+        django_request = request._request
+
+        # load the user of the session without blocking the event loop
+        if hasattr(django_request, "auser"):
+            django_request.user = await django_request.auser()
+
+        if "HTTP_AUTHORIZATION" in django_request.META:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+        else:
+            self.initial(request, *args, **kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Same as APIView.dispatch, with the handler awaited.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.initial_async(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            if iscoroutinefunction(handler):
+                response = await handler(request, *args, **kwargs)
+            else:
+                # http_method_not_allowed
+                response = handler(request, *args, **kwargs)
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
@@ -0,0 +1,130 @@
+import zlib
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware, re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+# Response compression (gzip) for the JSON API.
+#
+# The car lists are very repetitive JSON (the same keys, brands and motors in every car),
+# they usually shrink to less than 1/5 with gzip.
+# Compared to Django's GZipMiddleware, this middleware:
+# - only compresses the content types listed in COMPRESSION_CONTENT_TYPES (JSON, NDJSON, text, ...),
+#   already compressed files (images, ...) are sent as they are
+# - skips the responses smaller than COMPRESSION_MIN_SIZE and the paths in COMPRESSION_EXCLUDED_PATHS
+#   (the small auth responses), where compressing only costs CPU
+# - compresses streaming responses chunk by chunk and flushes the compressed data after every chunk,
+#   so the client receives every chunk as soon as it is ready (nothing is buffered until the end)
+#
+# Add it to MIDDLEWARE before the middlewares which read or change the response body (see settings.py).
+
+# responses smaller than this (in bytes) are not compressed (Django's GZipMiddleware uses 200)
+COMPRESSION_MIN_SIZE = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+
+# content types which are compressed (without parameters like "; charset=utf-8")
+COMPRESSION_CONTENT_TYPES = getattr(settings, "COMPRESSION_CONTENT_TYPES", (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/html",
+    "text/css",
+    "text/plain",
+))
+
+# path prefixes whose responses are never compressed
+COMPRESSION_EXCLUDED_PATHS = getattr(settings, "COMPRESSION_EXCLUDED_PATHS", ("/api/auth/",))
+
+# gzip level of the streaming responses: 6 is the default of gzip and of Django (compress_string),
+# a good balance between speed and size
+GZIP_LEVEL = 6
+
+
+def _gzip_compressor():
+    # wbits=31: gzip header and trailer (instead of a raw zlib stream)
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+def compress_stream(chunks):
+    """
+    Compress an iterable of bytes into a gzip stream, yielding the compressed data of every chunk
+    as soon as the chunk is compressed (sync flush).
+    """
+    compressor = _gzip_compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(chunks):
+    """
+    Async version of compress_stream, for the streaming responses of async views.
+    """
+    compressor = _gzip_compressor()
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    gzip compression of the responses, negotiated with the Accept-Encoding header of the request.
+    """
+
+    def should_compress(self, request, response):
+        """
+        Return True if the response is worth compressing (independent of the Accept-Encoding of the request).
+        """
+        if response.has_header("Content-Encoding"):
+            return False
+
+        if request.path.startswith(tuple(COMPRESSION_EXCLUDED_PATHS)):
+            return False
+
+        content_type = response.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type not in COMPRESSION_CONTENT_TYPES:
+            return False
+
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_SIZE:
+            return False
+
+        return True
+
+    def process_response(self, request, response):
+        if not self.should_compress(request, response):
+            return response
+
+        # the response depends on the Accept-Encoding of the request (for the HTTP caches)
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        if not re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content)
+            # the compressed size is not known before the end of the stream
+            del response.headers["Content-Length"]
+        else:
+            # random bytes in the gzip header against BREACH attacks, like Django's GZipMiddleware
+            compressed_content = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            # only send the compressed content if it is actually shorter
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        # a strong ETag must change with the encoding --> weak ETag
+        # (If-None-Match uses the weak comparison, so conditional requests still match, see RFC 9110 8.8.1)
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "gzip"
+
+        return response
@@ -0,0 +1,122 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib json module is used without it
+    orjson = None
+
+# Faster JSON rendering / parsing for the DRF API.
+#
+# DRF's JSONRenderer / JSONParser use the stdlib json module, with the Python JSONEncoder.default
+# called for every datetime (createdAt / updatedAt of every car).
+# With orjson installed, the data is rendered / parsed by orjson instead (written in Rust):
+# datetimes, dicts and lists (also DRF's ReturnDict / ReturnList) are serialized natively, without copies.
+# Without orjson, the stdlib encoder is used, configured once instead of on every response.
+#
+# The output is the same as DRF's JSONRenderer (compact, UTF-8, "Z" for UTC datetimes, datetimes and times
+# with their microseconds, U+2028 / U+2029 escaped for JavaScript). Values which orjson cannot handle
+# (for example integers bigger than 64 bits) are rendered by the stdlib encoder.
+# Differences of the orjson path (the stdlib path has none):
+# - NaN, Infinity and -Infinity are rendered as null (DRF raises a ValueError, STRICT_JSON)
+# - UTC offsets with seconds are rendered without them ("+01:01", DRF: "+01:01:01")
+#
+# Used in settings.py:
+# REST_FRAMEWORK = {
+#     "DEFAULT_RENDERER_CLASSES": ["utils.fastJson.FastJSONRenderer", ...],
+#     "DEFAULT_PARSER_CLASSES": ["utils.fastJson.FastJSONParser", ...],
+# }
+
+if orjson is not None:
+    # OPT_UTC_Z: "2024-01-01T10:00:00Z" instead of "+00:00" (same as DRF)
+    # OPT_NON_STR_KEYS: int keys are rendered as strings (same as the json module)
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+# same settings as DRF's JSONRenderer (UNICODE_JSON, COMPACT_JSON and STRICT_JSON are True by default)
+_stdlib_encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
+def _default(obj):
+    # types not supported by orjson (Decimal, lazy translation strings, QuerySets, ...),
+    # converted like DRF does
+    return _stdlib_encoder.default(obj)
+
+
+def _stdlib_dumps(data):
+    # U+2028 / U+2029 are valid in JSON, but not in JavaScript strings (escaped like DRF does)
+    ret = _stdlib_encoder.encode(data)
+    if "\u2028" in ret or "\u2029" in ret:
+        ret = ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029")
+    return ret.encode()
+
+
+def dumps(data):
+    """
+    Return the compact JSON (bytes) of the data, same output as DRF's JSONRenderer
+    (except NaN / Infinity and UTC offsets with seconds with orjson, see above).
+    """
+    if orjson is not None:
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return _stdlib_dumps(data)
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
+
+    return _stdlib_dumps(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer which renders with orjson (or a preconfigured stdlib encoder).
+    Falls back to DRF's JSONRenderer for the options it does not implement (indent, custom encoder).
+    With orjson, NaN / Infinity are rendered as null instead of raising a ValueError,
+    and UTC offsets lose their seconds (see the module comment).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        if self.encoder_class is not JSONEncoder or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser which parses with orjson if it is installed (UTF-8 request bodies).
+    Accepts and rejects the same documents as DRF's JSONParser: the bodies which orjson rejects
+    (e.g. integers bigger than 64 bits, NaN / Infinity) are parsed again by the stdlib.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8")
+
+        if orjson is None or encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            pass
+
+        # valid JSON which orjson does not accept (for example integers bigger than 64 bits)
+        # or invalid JSON: parsed again by the stdlib, which also builds the error message
+        try:
+            return json.loads(body.decode(encoding), parse_constant=self._reject_constant)
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
+
+    @staticmethod
+    def _reject_constant(constant):
+        # NaN, Infinity and -Infinity are not valid JSON (same as DRF with STRICT_JSON)
+        raise ValueError("Out of range float values are not JSON compliant: %r" % constant)
@@ -0,0 +1,230 @@
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read replicas for the read-only traffic (car lists, filter options, suggestions, "is authenticated" checks).
+#
+# ReadReplicaMiddleware decides for every request whether its reads may go to a replica:
+# - only the GET / HEAD / OPTIONS requests of DATABASE_REPLICA_PATHS, everything else uses the primary
+# - READ-YOUR-WRITES: after a write request (POST / PUT / PATCH / DELETE), the user and the session
+#   stick to the primary for DATABASE_REPLICA_STICKY_SECONDS (longer than the replication delay),
+#   so the user sees his / her own changes at once, even if the replicas are not yet in sync.
+#   The owner of data changed by someone else (an admin, the archive job, ...) is marked sticky the same way,
+#   see bump_user_data_version in cars/caching.py
+#
+# ReadReplicaMiddleware picks ONE random replica per request, ReadReplicaRouter (DATABASE_ROUTERS) sends all the reads
+# of the request there: the queries of a request (e.g. a version number, then the rows it stands for) never mix
+# replicas which are not equally in sync. All the other reads (writes, transactions, management commands, ...)
+# and all the writes go to the primary ("default").
+#
+# A replica may lag up to DATABASE_REPLICA_STICKY_SECONDS behind the primary: the values read from a replica
+# less than that after a change (within_replication_delay) must not be cached under the new data version.
+#
+# The sticky marks are stored in the cache DATABASE_REPLICA_CACHE_ALIAS: with several workers it must be a shared
+# cache (Redis), else a worker does not see the writes made through another worker.
+#
+# Local testing with SQLite: set DATABASE_REPLICA=True (see settings.py) and keep the replica file in sync with
+#   python3 manage.py sync_sqlite_replicas --interval 1
+# which copies the primary file into the replica files with the SQLite online backup API (copy_sqlite_database).
+
+# database aliases of the replicas (empty: every query uses the primary)
+DATABASE_REPLICAS = getattr(settings, "DATABASE_REPLICAS", [])
+
+# path prefixes whose safe requests may read from a replica
+DATABASE_REPLICA_PATHS = getattr(settings, "DATABASE_REPLICA_PATHS", ("/api/cars/", "/api/auth/is_authenticated/"))
+
+# seconds during which a user (and his / her session) reads from the primary after a write
+DATABASE_REPLICA_STICKY_SECONDS = getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 10)
+
+DATABASE_REPLICA_CACHE_ALIAS = getattr(settings, "DATABASE_REPLICA_CACHE_ALIAS", "default")
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# alias of the replica of the current request, None: the reads go to the primary
+# (context variable: one value per request / task)
+_request_replica = ContextVar("request_replica", default=None)
+
+
+def reads_from_replica():
+    """
+    True if the reads of the current request go to a read replica.
+    """
+    return _request_replica.get() is not None
+
+
+def within_replication_delay(changed_at):
+    """
+    True if changed_at (a time.time() timestamp, None: unknown) is less than DATABASE_REPLICA_STICKY_SECONDS ago:
+    the replicas may not have the change yet.
+    """
+    return changed_at is not None and time.time() - changed_at < DATABASE_REPLICA_STICKY_SECONDS
+
+
+def _sticky_key(kind, value):
+    return f"replica:sticky:{kind}:{value}"
+
+
+def mark_sticky(user_id=None, session_key=None):
+    """
+    Send the reads of the user and of the session to the primary for DATABASE_REPLICA_STICKY_SECONDS.
+    """
+    # no replica: nothing to stick to
+    if not DATABASE_REPLICAS:
+        return
+
+    keys = {}
+    if user_id is not None:
+        keys[_sticky_key("user", user_id)] = True
+    if session_key:
+        keys[_sticky_key("session", session_key)] = True
+    if keys:
+        caches[DATABASE_REPLICA_CACHE_ALIAS].set_many(keys, DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def is_sticky(user_id=None, session_key=None):
+    """
+    True if the user or the session wrote less than DATABASE_REPLICA_STICKY_SECONDS ago.
+    """
+    keys = []
+    if user_id is not None:
+        keys.append(_sticky_key("user", user_id))
+    if session_key:
+        keys.append(_sticky_key("session", session_key))
+    return bool(keys) and bool(caches[DATABASE_REPLICA_CACHE_ALIAS].get_many(keys))
+
+
+class ReadReplicaRouter:
+    """
+    Database router: reads from the replica of the current request (see ReadReplicaMiddleware), writes to the primary.
+    """
+
+    def __init__(self, replicas=None):
+        self.replicas = list(DATABASE_REPLICAS if replicas is None else replicas)
+
+    def db_for_read(self, model, **hints):
+        replica = _request_replica.get()
+        if replica not in self.replicas:
+            return DEFAULT_DB_ALIAS
+        # the reads of a transaction must see its own writes
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas contain the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *self.replicas}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas are copies of the primary, they are never migrated
+        if db in self.replicas:
+            return False
+        return None
+
+
+class ReadReplicaMiddleware:
+    """
+    Sends the reads of the safe requests of DATABASE_REPLICA_PATHS to one random replica (see ReadReplicaRouter),
+    and marks the users / sessions which write as sticky to the primary.
+    Add it to MIDDLEWARE after AuthenticationMiddleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def reads_from_replica(self, request):
+        return (
+            bool(DATABASE_REPLICAS)
+            and request.method in SAFE_METHODS
+            and request.path.startswith(DATABASE_REPLICA_PATHS)
+        )
+
+    def session_key(self, request):
+        return request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self.reads_from_replica(request):
+            response = self.get_response(request)
+            if request.method not in SAFE_METHODS:
+                user = getattr(request, "user", None)
+                self.mark_written(request, user.id if user is not None and user.is_authenticated else None)
+            return response
+
+        # a session which wrote recently reads everything (also the session and the user) from the primary
+        token = _request_replica.set(self.choose_replica(request))
+        try:
+            if reads_from_replica() and request.user.is_authenticated and is_sticky(user_id=request.user.id):
+                _request_replica.set(None)
+            return self.get_response(request)
+        finally:
+            _request_replica.reset(token)
+
+    async def __acall__(self, request):
+        if not self.reads_from_replica(request):
+            response = await self.get_response(request)
+            if request.method not in SAFE_METHODS:
+                user = await request.auser() if hasattr(request, "auser") else None
+                self.mark_written(request, user.id if user is not None and user.is_authenticated else None)
+            return response
+
+        token = _request_replica.set(self.choose_replica(request))
+        try:
+            if reads_from_replica():
+                user = await request.auser()
+                if user.is_authenticated and is_sticky(user_id=user.id):
+                    _request_replica.set(None)
+            return await self.get_response(request)
+        finally:
+            _request_replica.reset(token)
+
+    def choose_replica(self, request):
+        """
+        Return the replica of all the reads of the request, None (primary) if its session wrote recently.
+        """
+        if is_sticky(session_key=self.session_key(request)):
+            return None
+        return random.choice(DATABASE_REPLICAS)
+
+    def mark_written(self, request, user_id):
+        """
+        After a write request: stick the user, the session of the request and the new session
+        (login creates a new session key) to the primary.
+        """
+        session = getattr(request, "session", None)
+        mark_sticky(user_id=user_id, session_key=self.session_key(request))
+        if session is not None and session.session_key:
+            mark_sticky(session_key=session.session_key)
+
+
+def copy_sqlite_database(source_path, target_path):
+    """
+    Copy the SQLite database source_path into target_path with the online backup API:
+    the source stays readable and writable during the copy, the readers of the target see
+    either the old or the new copy (the copy is written in one transaction).
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path, timeout=30)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
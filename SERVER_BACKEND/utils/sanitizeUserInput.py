@@ -1,7 +1,58 @@
+import re
+from functools import lru_cache
+
 import nh3
 
-def sanitize_user_input(data):
+# nh3.clean only changes a string if it contains one of these characters:
+# "<" (tags, comments), "&" (entities) and ">" are escaped or removed,
+# NUL characters are removed, "\r" is replaced by "\n", the no-break space (U+00A0) becomes "&nbsp;"
+# and a leading byte order mark (U+FEFF) is removed (a BOM elsewhere is kept, but goes through nh3.clean too).
+# Every other string (like "Diesel" or "Aston Martin") is returned unchanged,
+# so nh3.clean is skipped for it (see SanitizeUserInputTest in cars/tests.py).
+_CHANGED_BY_NH3 = re.compile("[<>&\x00\r\xa0\ufeff]")
+
+# Number of (value, cleaned value) pairs kept in memory, to not clean the same value again and again
+# (for example in a bulk import where most cars have the same brand and motor).
+SANITIZE_CACHE_SIZE = 4096
+
+# Longer values are not kept in the cache (the car fields are at most 255 characters long).
+SANITIZE_CACHE_MAX_LENGTH = 255
+
+
+@lru_cache(maxsize=SANITIZE_CACHE_SIZE)
+def _clean_cached(value):
+    return nh3.clean(value)
+
+
+def sanitize_string(value, memoize=False):
+    """
+    Return the value cleaned by nh3 (HTML sanitization).
+    memoize: keep the result in the LRU cache. Do not use it for secrets (passwords, tokens),
+    the cache keeps the values in memory.
+    """
+    # fast path: nothing to clean
+    if not _CHANGED_BY_NH3.search(value):
+        return value
+
+    if memoize and len(value) <= SANITIZE_CACHE_MAX_LENGTH:
+        return _clean_cached(value)
+    return nh3.clean(value)
+
+
+def sanitize_user_input(data, memoize=False):
+    """
+    Sanitize all the string values of the data (dict) in place and return it.
+    memoize: see sanitize_string.
+    """
     for key in data:
         if type(data[key]) == str:
-            data[key]=nh3.clean(data[key])
-    return data
\ No newline at end of file
+            data[key] = sanitize_string(data[key], memoize=memoize)
+    return data
+
+
+def sanitize_user_inputs(payloads, memoize=True):
+    """
+    Batch version of sanitize_user_input: sanitize a list of payloads (dicts) in one call.
+    The repeated values of the payloads are cleaned only once (memoize=True by default).
+    """
+    return [sanitize_user_input(data, memoize=memoize) for data in payloads]
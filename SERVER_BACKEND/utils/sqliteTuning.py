@@ -0,0 +1,125 @@
+import random
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+# SQLite tuning for several gunicorn workers (processes) writing to the same database file.
+#
+# 1) PRAGMAS, run on every new connection (connection_created signal, connected in cars/apps.py):
+# - journal_mode=WAL: the readers no longer block the writer and the writer no longer blocks the readers,
+#   only one writer at a time remains (stored in the database file, the other pragmas are per connection)
+# - synchronous=NORMAL: in WAL mode the database cannot be corrupted by a crash with NORMAL,
+#   only the last transactions may be lost on a power failure; the commits no longer wait for an fsync
+# - cache_size: page cache of the connection (negative value = size in KiB, here 20 MB instead of 2 MB)
+# - mmap_size: the database file is read through memory mapping (no copy in the page cache of the connection)
+# - temp_store=MEMORY: temporary tables and indexes (ORDER BY / DISTINCT without index, ...) stay in memory
+# - busy_timeout: a connection which finds the database locked waits (and retries) up to this many
+#   milliseconds before failing with "database is locked"
+#
+# 2) RETRY of the write transactions (retry_on_database_locked):
+# the busy timeout does not help a transaction which started reading and then wants to write while another
+# connection is writing (SQLite cannot upgrade its read snapshot, it fails at once with "database is locked").
+# The decorated write (a view handler) runs in ONE transaction; if it fails because the database is locked,
+# the whole transaction is rolled back and run again after a short, growing, random delay (backoff).
+#
+# The persistent connections (CONN_MAX_AGE) are configured in settings.py.
+
+# pragmas run on every new SQLite connection, in this order
+SQLITE_PRAGMAS = getattr(settings, "SQLITE_PRAGMAS", {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -20000,
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+})
+
+# number of times a write transaction is run again after "database is locked"
+DATABASE_LOCKED_RETRIES = getattr(settings, "DATABASE_LOCKED_RETRIES", 5)
+
+# delay (seconds) before the first retry, doubled after every retry (plus a random part, so that
+# the waiting workers don't retry all at the same moment), and the longest delay
+DATABASE_LOCKED_RETRY_DELAY = getattr(settings, "DATABASE_LOCKED_RETRY_DELAY", 0.05)
+DATABASE_LOCKED_RETRY_MAX_DELAY = getattr(settings, "DATABASE_LOCKED_RETRY_MAX_DELAY", 1.0)
+
+# databases whose writes are part of the retried transaction (one transaction per database)
+DATABASE_LOCKED_RETRY_DATABASES = getattr(settings, "DATABASE_LOCKED_RETRY_DATABASES", [DEFAULT_DB_ALIAS])
+
+
+def apply_sqlite_pragmas(cursor, pragmas=None):
+    """
+    Run the pragmas (default: SQLITE_PRAGMAS) with the given DB-API cursor of a SQLite connection.
+    """
+    for name, value in (SQLITE_PRAGMAS if pragmas is None else pragmas).items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Receiver of the connection_created signal: tunes every new SQLite connection (see SQLITE_PRAGMAS).
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        apply_sqlite_pragmas(cursor)
+
+
+def is_database_locked(error):
+    """
+    True if the error is SQLite's "database is locked" / "database table is locked" (SQLITE_BUSY / SQLITE_LOCKED).
+    """
+    message = str(error)
+    return "database is locked" in message or "database table is locked" in message
+
+
+def locked_retry_delays(retries=None):
+    """
+    Yield the delays (seconds) to wait before every retry: exponential backoff with jitter.
+    """
+    delay = DATABASE_LOCKED_RETRY_DELAY
+    for _ in range(DATABASE_LOCKED_RETRIES if retries is None else retries):
+        yield min(delay, DATABASE_LOCKED_RETRY_MAX_DELAY) * random.uniform(0.5, 1.5)
+        delay *= 2
+
+
+def retry_on_database_locked(func=None, using=None):
+    """
+    Decorator which runs the function in a transaction, and runs it again (whole transaction)
+    while it fails with "database is locked" (see DATABASE_LOCKED_RETRIES).
+    using: the database of the transaction, default: a transaction on each of DATABASE_LOCKED_RETRY_DATABASES
+    (the writes of a request may go to the primary database and to a car shard, see cars/sharding.py).
+
+    If the function is called inside a transaction (atomic block), it is not retried:
+    only the outermost transaction can be rolled back and run again.
+
+    @retry_on_database_locked
+    def post(self, request):
+        ...
+    """
+    databases = DATABASE_LOCKED_RETRY_DATABASES if using is None else [using]
+
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if any(connections[alias].in_atomic_block for alias in databases):
+                return func(*args, **kwargs)
+
+            delays = locked_retry_delays()
+            while True:
+                try:
+                    with ExitStack() as transactions:
+                        for alias in databases:
+                            transactions.enter_context(transaction.atomic(using=alias))
+                        return func(*args, **kwargs)
+                except OperationalError as error:
+                    delay = next(delays, None)
+                    if delay is None or not is_database_locked(error):
+                        raise
+                time.sleep(delay)
+        return wrapper
+
+    return decorate(func) if func is not None else decorate